@@ -0,0 +1,72 @@
+import sys
+import time
+import glob
+import argparse
+from main import (
+    BACKENDS,
+    read_in_file,
+    run_tree_walker,
+    run_vm,
+    run_closure_compiled,
+    run_transpiled,
+)
+from scanner import Scanner
+from lox_parser import Parser
+
+
+BACKEND_RUNNERS = {
+    "interpreter": run_tree_walker,
+    "vm": run_vm,
+    "closure": run_closure_compiled,
+    "python": run_transpiled,
+}
+
+BENCH_SCRIPT_PATH = "bench_scripts/"
+
+
+def _parse(file_name: str) -> list:
+    scanner_result = Scanner(read_in_file(file_name)).scan_tokens()
+    if scanner_result.failure:
+        raise Exception(f"Scanner failed on {file_name}")
+
+    parser_result = Parser(scanner_result.value).parse()
+    if parser_result.failure:
+        raise Exception(f"Parser failed on {file_name}")
+
+    return parser_result.value
+
+
+def time_backend(file_name: str, backend: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # Parse fresh each run, some backends annotate or rewrite the tree they're given
+        statements = _parse(file_name)
+        start = time.perf_counter()
+        BACKEND_RUNNERS[backend](statements)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: list):
+    arg_parser = argparse.ArgumentParser(prog=argv[0])
+    arg_parser.add_argument("scripts", nargs="*")
+    arg_parser.add_argument("--backend", choices=BACKENDS, action="append")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv[1:])
+
+    scripts = args.scripts or sorted(glob.glob(BENCH_SCRIPT_PATH + "*.lox"))
+    backends = args.backend or BACKENDS
+
+    for script in scripts:
+        baseline = None
+        for backend in backends:
+            elapsed = time_backend(script, backend, args.repeat)
+            baseline = baseline or elapsed
+            print(
+                f"{script:32} {backend:12} {elapsed * 1000:10.1f} ms"
+                f" {baseline / elapsed:6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,190 @@
+import math
+from array import array
+from typing import Any
+
+# Opcodes are plain ints rather than an Enum so the VM's dispatch loop compares
+# bytes from the code buffer against module level constants with no attribute lookups.
+# Operands follow the opcode in the code buffer, "u8"/"u16" give their widths.
+
+OP_CONSTANT = 0  # u16 constant index
+OP_NIL = 1
+OP_TRUE = 2
+OP_FALSE = 3
+OP_POP = 4
+
+OP_GET_LOCAL = 5  # u8 slot
+OP_SET_LOCAL = 6  # u8 slot
+OP_GET_GLOBAL = 7  # u16 name constant
+OP_DEFINE_GLOBAL = 8  # u16 name constant
+OP_SET_GLOBAL = 9  # u16 name constant
+OP_GET_UPVALUE = 10  # u8 upvalue index
+OP_SET_UPVALUE = 11  # u8 upvalue index
+OP_GET_PROPERTY = 12  # u16 name constant
+OP_SET_PROPERTY = 13  # u16 name constant
+OP_GET_SUPER = 14  # u16 name constant
+
+OP_EQUAL = 15
+OP_NOT_EQUAL = 16
+OP_GREATER = 17
+OP_GREATER_EQUAL = 18
+OP_LESS = 19
+OP_LESS_EQUAL = 20
+OP_ADD = 21
+OP_SUBTRACT = 22
+OP_MULTIPLY = 23
+OP_DIVIDE = 24
+OP_NOT = 25
+OP_NEGATE = 26
+
+OP_PRINT = 27
+OP_JUMP = 28  # u16 forward offset
+OP_JUMP_IF_FALSE = 29  # u16 forward offset, leaves the condition on the stack
+OP_JUMP_IF_TRUE = 30  # u16 forward offset, leaves the condition on the stack
+OP_POP_JUMP_IF_FALSE = 31  # u16 forward offset, pops the condition
+OP_LOOP = 32  # u16 backward offset
+
+OP_CALL = 33  # u8 arg count
+OP_INVOKE = 34  # u16 name constant, u8 arg count
+OP_SUPER_INVOKE = 35  # u16 name constant, u8 arg count
+OP_CLOSURE = 36  # u16 function constant, then (u8 is_local, u8 index) per upvalue
+OP_CLOSE_UPVALUE = 37
+OP_RETURN = 38
+
+OP_CLASS = 39  # u16 name constant
+OP_INHERIT = 40
+OP_METHOD = 41  # u16 name constant
+
+# Calls in return position, they replace the caller's frame instead of pushing one
+OP_TAIL_CALL = 42  # u8 arg count
+OP_TAIL_INVOKE = 43  # u16 name constant, u8 arg count
+
+OP_NAMES = {
+    value: name[3:]
+    for name, value in list(globals().items())
+    if name.startswith("OP_") and isinstance(value, int)
+}
+
+_U16_OPS = {
+    OP_CONSTANT,
+    OP_GET_GLOBAL,
+    OP_DEFINE_GLOBAL,
+    OP_SET_GLOBAL,
+    OP_GET_PROPERTY,
+    OP_SET_PROPERTY,
+    OP_GET_SUPER,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_JUMP_IF_TRUE,
+    OP_POP_JUMP_IF_FALSE,
+    OP_LOOP,
+    OP_CLASS,
+    OP_METHOD,
+}
+_JUMP_OPS = {
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_JUMP_IF_TRUE,
+    OP_POP_JUMP_IF_FALSE,
+    OP_LOOP,
+}
+_U8_OPS = {
+    OP_GET_LOCAL,
+    OP_SET_LOCAL,
+    OP_GET_UPVALUE,
+    OP_SET_UPVALUE,
+    OP_CALL,
+    OP_TAIL_CALL,
+}
+
+
+class Chunk:
+    code: bytearray
+    constants: list[Any]
+    # One entry per byte of code so the VM can map any ip back to a source line
+    lines: array
+    _constant_index: dict[tuple[type, Any], int]
+
+    def __init__(self) -> None:
+        self.code = bytearray()
+        self.constants = []
+        self.lines = array("I")
+        self._constant_index = dict()
+
+    def write(self, byte: int, line: int) -> None:
+        self.code.append(byte)
+        self.lines.append(line)
+
+    def write_u16(self, value: int, line: int) -> None:
+        self.write((value >> 8) & 0xFF, line)
+        self.write(value & 0xFF, line)
+
+    def add_constant(self, value: Any) -> int:
+        # Keyed on type as well since 1.0 == True in python, and on the sign of
+        # floats since 0.0 == -0.0
+        hashable = isinstance(value, (str, float, bool))
+        key = (type(value), value)
+        if type(value) is float:
+            key = (float, value, math.copysign(1.0, value))
+        if hashable and key in self._constant_index:
+            return self._constant_index[key]
+
+        self.constants.append(value)
+        index = len(self.constants) - 1
+        if hashable:
+            self._constant_index[key] = index
+        return index
+
+    def freeze(self) -> None:
+        # bytes indexes a little faster than bytearray and can't be modified after compiling
+        self.code = bytes(self.code)
+        self._constant_index = dict()
+
+    def disassemble(self, name: str) -> str:
+        out = [f"== {name} =="]
+        offset = 0
+        while offset < len(self.code):
+            op = self.code[offset]
+            line = self.lines[offset]
+            text = OP_NAMES.get(op, f"UNKNOWN({op})")
+            offset += 1
+            if op in _U16_OPS:
+                operand = (self.code[offset] << 8) | self.code[offset + 1]
+                offset += 2
+                text += f" {operand}"
+                if op not in _JUMP_OPS:
+                    text += f" ({self.constants[operand]!r})"
+            elif op in _U8_OPS:
+                text += f" {self.code[offset]}"
+                offset += 1
+            elif op in (OP_INVOKE, OP_SUPER_INVOKE, OP_TAIL_INVOKE):
+                name_index = (self.code[offset] << 8) | self.code[offset + 1]
+                arg_count = self.code[offset + 2]
+                text += f" {self.constants[name_index]!r} ({arg_count} args)"
+                offset += 3
+            elif op == OP_CLOSURE:
+                func_index = (self.code[offset] << 8) | self.code[offset + 1]
+                offset += 2
+                func = self.constants[func_index]
+                text += f" {func!r}"
+                for _ in range(func.upvalue_count):
+                    kind = "local" if self.code[offset] else "upvalue"
+                    text += f" [{kind} {self.code[offset + 1]}]"
+                    offset += 2
+            out.append(f"{line:4} {text}")
+        return "\n".join(out)
+
+
+class FunctionProto:
+    name: str
+    arity: int
+    upvalue_count: int
+    chunk: Chunk
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.arity = 0
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __repr__(self) -> str:
+        return f"<fn {self.name}>" if self.name else "<script>"
@@ -0,0 +1,844 @@
+import operator
+from typing import Any, Callable
+from environment import Cell, Environment, Frame
+from expr import (
+    ExprVisitor,
+    Expr,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Expression,
+    Print,
+    Stmt,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+from interpreter import (
+    Interpreter,
+    LoxCallable,
+    LoxFunction,
+    LoxInstance,
+    LoxRuntimeClass,
+    LoxAssertFailedError,
+    MAX_CACHED_CLASSES,
+    BREAK,
+    CONTINUE,
+    TailCall,
+)
+from lox_token import Token, TokenType
+from runtime_errors import LoxRuntimeError, InvalidOperatorError
+
+
+# Compiled expressions take the current environment and return a value.
+# Compiled statements take the current environment and return None, or a 1-tuple
+# holding the value of a return statement so it can unwind without raising.
+CompiledExpr = Callable[[Frame], Any]
+CompiledStmt = Callable[[Frame], Any]
+
+# The comparisons a counted for loop can test its counter with
+_COMPARISONS = {
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+
+
+class CompiledFunction(LoxFunction):
+    _body: CompiledStmt
+
+    def __init__(
+        self,
+        declaration: Fun,
+        body: CompiledStmt,
+        upvalues: tuple,
+        is_init: bool = False,
+    ) -> None:
+        super().__init__(declaration, upvalues, is_init)
+        self._body = body
+
+    def _execute(self, interpreter: "Interpreter", env: Frame) -> Any:
+        return self._body(env)
+
+
+def _local_getter(expr: Expr) -> CompiledExpr:
+    slot = expr.slot
+    if slot == None:
+        upvalue = expr.upvalue
+        return lambda env: env.upvalues[upvalue].value
+    if expr.captured:
+        return lambda env: env.values[slot].value
+    return lambda env: env.values[slot]
+
+
+def _run_stmts(stmts: list[CompiledStmt]) -> CompiledStmt:
+    if len(stmts) == 0:
+        return lambda env: None
+    if len(stmts) == 1:
+        return stmts[0]
+
+    stmts = tuple(stmts)
+
+    def run(env: Frame) -> Any:
+        for stmt in stmts:
+            result = stmt(env)
+            if result is not None:
+                return result
+        return None
+
+    return run
+
+
+def _unchecked_binary(
+    op_type: TokenType, left: CompiledExpr, right: CompiledExpr
+) -> CompiledExpr:
+    # Operands TypeInference proved, the python operator can't get a wrong type
+    if op_type == TokenType.PLUS:
+        return lambda env: left(env) + right(env)
+    if op_type == TokenType.MINUS:
+        return lambda env: left(env) - right(env)
+    if op_type == TokenType.STAR:
+        return lambda env: left(env) * right(env)
+    if op_type == TokenType.SLASH:
+        return lambda env: left(env) / right(env)
+    if op_type == TokenType.GREATER:
+        return lambda env: left(env) > right(env)
+    if op_type == TokenType.GREATER_EQUAL:
+        return lambda env: left(env) >= right(env)
+    if op_type == TokenType.LESS:
+        return lambda env: left(env) < right(env)
+    return lambda env: left(env) <= right(env)
+
+
+def _definer(
+    declaration: "Fun | LoxClass", globals_: Environment
+) -> Callable[[Frame, Any], None]:
+    slot = declaration.slot
+    if slot == None:
+        name = declaration.name.value
+        return lambda env, value: globals_.define(name, value)
+
+    if declaration.captured:
+        # The Cell is made up front so the closure can capture it, see _declarer
+        def define_cell(env: Frame, value: Any) -> None:
+            env.values[slot].value = value
+
+        return define_cell
+
+    def define(env: Frame, value: Any) -> None:
+        env.values[slot] = value
+
+    return define
+
+
+def _declarer(declaration: "Fun | LoxClass") -> Callable[[Frame], None]:
+    slot = declaration.slot
+    if slot == None or not declaration.captured:
+        return lambda env: None
+
+    def declare(env: Frame) -> None:
+        env.values[slot] = Cell()
+
+    return declare
+
+
+def _capturer(declaration: Fun) -> Callable[[Frame], tuple]:
+    upvalues = tuple(declaration.upvalues)
+    if len(upvalues) == 0:
+        return lambda env: ()
+    # Same as capture_upvalues, with the tuple of indexes made once
+    return lambda env: tuple(
+        env.values[index] if is_local else env.upvalues[index]
+        for is_local, index in upvalues
+    )
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """
+    Walks the resolved AST once and turns every node into a python closure specialized
+    for that node, so running the program never goes back through accept() or the
+    interpreter's operator checks and local lookups.
+    """
+
+    _interpreter: Interpreter
+    _globals: Environment
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        super().__init__()
+        self._interpreter = interpreter
+        self._globals = interpreter._globals
+
+    def compile(self, statements: list[Stmt]) -> CompiledStmt:
+        return self._compile_stmts(statements)
+
+    def _compile_stmts(self, statements: list[Stmt]) -> CompiledStmt:
+        return _run_stmts([statement.accept(self) for statement in statements])
+
+    def _compile(self, expr: Expr) -> CompiledExpr:
+        return expr.accept(self)
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> CompiledExpr:
+        value = self._compile(expr.value)
+        slot = expr.slot
+
+        if slot == None and expr.upvalue != None:
+            upvalue = expr.upvalue
+
+            def assign_upvalue(env: Frame) -> Any:
+                val = env.upvalues[upvalue].value = value(env)
+                return val
+
+            return assign_upvalue
+
+        if slot == None:
+            globals_ = self._globals
+            token = expr.name
+
+            def assign_global(env: Frame) -> Any:
+                val = value(env)
+                globals_.assign(token, val)
+                return val
+
+            return assign_global
+
+        if expr.captured:
+
+            def assign_cell(env: Frame) -> Any:
+                val = env.values[slot].value = value(env)
+                return val
+
+            return assign_cell
+
+        def assign_local(env: Frame) -> Any:
+            val = env.values[slot] = value(env)
+            return val
+
+        return assign_local
+
+    def visit_binary_expr(self, expr: "Binary") -> CompiledExpr:
+        left = self._compile(expr.left)
+        right = self._compile(expr.right)
+        operator = expr.operator
+        op_type = operator.token_type
+
+        if expr.operand_type != None:
+            return _unchecked_binary(op_type, left, right)
+
+        if op_type == TokenType.PLUS:
+
+            def add(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                lhs_type = type(lhs)
+                if lhs_type is type(rhs) and (lhs_type is float or lhs_type is str):
+                    return lhs + rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return add
+
+        if op_type == TokenType.EQUAL_EQUAL:
+            return lambda env: left(env) == right(env)
+        if op_type == TokenType.BANG_EQUAL:
+            return lambda env: left(env) != right(env)
+
+        if op_type == TokenType.MINUS:
+
+            def subtract(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs - rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return subtract
+
+        if op_type == TokenType.STAR:
+
+            def multiply(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs * rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return multiply
+
+        if op_type == TokenType.SLASH:
+
+            def divide(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs / rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return divide
+
+        if op_type == TokenType.GREATER:
+
+            def greater(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs > rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return greater
+
+        if op_type == TokenType.GREATER_EQUAL:
+
+            def greater_equal(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs >= rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return greater_equal
+
+        if op_type == TokenType.LESS:
+
+            def less(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs < rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return less
+
+        if op_type == TokenType.LESS_EQUAL:
+
+            def less_equal(env: Frame) -> Any:
+                lhs = left(env)
+                rhs = right(env)
+                if type(lhs) is float and type(rhs) is float:
+                    return lhs <= rhs
+                raise InvalidOperatorError(operator, lhs, rhs)
+
+            return less_equal
+
+        def invalid(env: Frame) -> Any:
+            raise InvalidOperatorError(operator, left(env), right(env))
+
+        return invalid
+
+    def visit_call_expr(self, expr: "Call") -> CompiledExpr:
+        callee = self._compile(expr.callee)
+        arguments = tuple(self._compile(arg) for arg in expr.arguments)
+        arg_count = len(arguments)
+        paren = expr.paren
+        interpreter = self._interpreter
+
+        if expr.is_tail:
+            # Rare enough per call site that sharing the interpreter's checks is fine
+            def tail_call(env: Frame) -> Any:
+                function = callee(env)
+                args = [arg(env) for arg in arguments]
+                return interpreter._call(function, args, paren, True)
+
+            return tail_call
+
+        def call(env: Frame) -> Any:
+            function = callee(env)
+            args = [arg(env) for arg in arguments]
+
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError("Can only call functions and classes", paren)
+
+            arity = function.arity()
+            if arity != arg_count:
+                raise LoxRuntimeError(
+                    f"Wrong number of args, expected {arity} but recieved {arg_count}",
+                    paren,
+                )
+            interpreter._call_site = paren
+            try:
+                return function.call(interpreter, args)
+            except LoxAssertFailedError as err:
+                err.line = paren.line
+                raise err
+
+        return call
+
+    def visit_invoke_expr(self, expr: "Invoke") -> CompiledExpr:
+        obj = self._compile(expr.obj)
+        arguments = tuple(self._compile(arg) for arg in expr.arguments)
+        arg_count = len(arguments)
+        name = expr.name
+        method_name = name.value
+        paren = expr.paren
+        interpreter = self._interpreter
+        method_cache = expr.method_cache
+
+        is_tail = expr.is_tail
+
+        def call_field(env: Frame, function: Any) -> Any:
+            args = [arg(env) for arg in arguments]
+            return interpreter._call(function, args, paren, is_tail)
+
+        def invoke(env: Frame) -> Any:
+            instance = obj(env)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError("Can only call propertes on objects", name)
+
+            slot = instance._shape.slots.get(method_name)
+            if slot != None:
+                return call_field(env, instance._values[slot])
+
+            klass = instance._class
+            method = method_cache.get(klass)
+            if method == None:
+                method = klass.find_method(method_name)
+                if method == None:
+                    raise LoxRuntimeError(f"Undefined property: {method_name}.", name)
+                if len(method_cache) < MAX_CACHED_CLASSES:
+                    method_cache[klass] = method
+
+            args = [arg(env) for arg in arguments]
+            arity = method.arity()
+            if arity != arg_count:
+                raise LoxRuntimeError(
+                    f"Wrong number of args, expected {arity} but recieved {arg_count}",
+                    paren,
+                )
+            if is_tail:
+                return TailCall(method, method._frame(instance, args), instance)
+            interpreter._call_site = paren
+            try:
+                return method.invoke(interpreter, instance, args)
+            except LoxAssertFailedError as err:
+                err.line = paren.line
+                raise err
+
+        return invoke
+
+    def visit_get_expr(self, expr: "Get") -> CompiledExpr:
+        obj = self._compile(expr.obj)
+        name = expr.name
+
+        # Same shape caches as the tree-walker's, kept in the closure instead of the node
+        cached_shape = None
+        cached_slot = None
+
+        def get(env: Frame) -> Any:
+            nonlocal cached_shape, cached_slot
+            instance = obj(env)
+            if isinstance(instance, LoxInstance):
+                shape = instance._shape
+                if shape is cached_shape:
+                    return instance._values[cached_slot]
+
+                slot = shape.slots.get(name.value)
+                if slot != None:
+                    cached_shape = shape
+                    cached_slot = slot
+                    return instance._values[slot]
+                return instance.get(name)
+            raise LoxRuntimeError("Can only call propertes on objects", name)
+
+        return get
+
+    def visit_grouping_expr(self, expr: "Grouping") -> CompiledExpr:
+        return self._compile(expr.expression)
+
+    def visit_literal_expr(self, expr: "Literal") -> CompiledExpr:
+        value = expr.value
+        return lambda env: value
+
+    def visit_logical_expr(self, expr: "Logical") -> CompiledExpr:
+        left = self._compile(expr.left)
+        right = self._compile(expr.right)
+
+        if expr.operator.token_type == TokenType.OR:
+            return lambda env: left(env) or right(env)
+        return lambda env: left(env) and right(env)
+
+    def visit_set_expr(self, expr: "Set") -> CompiledExpr:
+        obj = self._compile(expr.object)
+        value = self._compile(expr.value)
+        name = expr.name
+
+        cached_shape = None
+        cached_slot = None
+        cached_transition = None
+
+        def set(env: Frame) -> Any:
+            nonlocal cached_shape, cached_slot, cached_transition
+            instance = obj(env)
+            if not type(instance) == LoxInstance:
+                raise LoxRuntimeError("Only instances have fields", name)
+
+            val = value(env)
+            shape = instance._shape
+            if shape is cached_shape:
+                values = instance._values
+                if cached_slot == len(values):
+                    values.append(val)
+                else:
+                    values[cached_slot] = val
+                instance._shape = cached_transition
+                return val
+
+            instance.set(name.value, val)
+            if shape.shared and instance._shape.shared:
+                # An unshared Shape belongs to a single instance, see the Interpreter
+                cached_shape = shape
+                cached_slot = instance._shape.slots[name.value]
+                cached_transition = instance._shape
+            return val
+
+        return set
+
+    def visit_super_expr(self, expr: "Super") -> CompiledExpr:
+        get_superclass = _local_getter(expr)
+        get_this = _local_getter(expr.this)
+        method_name = expr.method.value
+        keyword = expr.name
+
+        cached_class = None
+        cached_method = None
+
+        def super_method(env: Frame) -> Any:
+            nonlocal cached_class, cached_method
+            superclass = get_superclass(env)
+            if superclass is cached_class:
+                return cached_method.bind(get_this(env))
+
+            method = superclass.find_method(method_name)
+            if method == None:
+                raise LoxRuntimeError(f"Undefined property {method_name}", keyword)
+            cached_class = superclass
+            cached_method = method
+            return method.bind(get_this(env))
+
+        return super_method
+
+    def visit_this_expr(self, expr: "This") -> CompiledExpr:
+        return self._variable(expr)
+
+    def visit_unary_expr(self, expr: "Unary") -> CompiledExpr:
+        right = self._compile(expr.right)
+        operator = expr.operator
+        op_type = operator.token_type
+
+        if op_type == TokenType.MINUS and expr.operand_type != None:
+            return lambda env: -right(env)
+
+        if op_type == TokenType.MINUS:
+
+            def negate(env: Frame) -> Any:
+                value = right(env)
+                if type(value) is float:
+                    return -value
+                raise InvalidOperatorError(operator, value)
+
+            return negate
+
+        if op_type == TokenType.BANG:
+            return lambda env: not right(env)
+
+        def invalid(env: Frame) -> Any:
+            raise InvalidOperatorError(operator, right(env))
+
+        return invalid
+
+    def visit_variable_expr(self, expr: "Variable") -> CompiledExpr:
+        return self._variable(expr)
+
+    def _variable(self, expr: Expr) -> CompiledExpr:
+        if expr.depth != None:
+            return _local_getter(expr)
+
+        globals_ = self._globals
+        name = expr.name
+        # Same inline cache as the tree-walker's, kept in the closure instead of the node
+        cache_version = None
+        cached_cell = None
+
+        def get_global(env: Frame) -> Any:
+            nonlocal cache_version, cached_cell
+            if cache_version == globals_.version:
+                return cached_cell.value
+
+            cached_cell = globals_.get_cell(name)
+            cache_version = globals_.version
+            return cached_cell.value
+
+        return get_global
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> CompiledStmt:
+        expression = self._compile(stmt.expression)
+
+        def run(env: Frame) -> None:
+            expression(env)
+
+        return run
+
+    def visit_print_stmt(self, stmt: "Print") -> CompiledStmt:
+        expression = self._compile(stmt.expression)
+
+        def run(env: Frame) -> None:
+            print(expression(env))
+
+        return run
+
+    def visit_var_stmt(self, stmt: "Var") -> CompiledStmt:
+        initializer = None
+        if stmt.initializer != None:
+            initializer = self._compile(stmt.initializer)
+
+        if stmt.slot == None:
+            globals_ = self._globals
+            name = stmt.name.value
+            if initializer == None:
+                return lambda env: globals_.define(name, None)
+            return lambda env: globals_.define(name, initializer(env))
+
+        slot = stmt.slot
+        if stmt.captured:
+            # A new Cell each time the declaration runs, like the tree-walker
+            def define_cell(env: Frame) -> None:
+                env.values[slot] = Cell(
+                    initializer(env) if initializer != None else None
+                )
+
+            return define_cell
+
+        if initializer == None:
+
+            def declare(env: Frame) -> None:
+                env.values[slot] = None
+
+            return declare
+
+        def define(env: Frame) -> None:
+            env.values[slot] = initializer(env)
+
+        return define
+
+    def visit_block_stmt(self, stmt: "Block") -> CompiledStmt:
+        body = self._compile_stmts(stmt.statements)
+        if stmt.scope_size == 0:
+            return body
+        size = stmt.scope_size
+        return lambda env: body(Frame(size))
+
+    def visit_if_stmt(self, stmt: "If") -> CompiledStmt:
+        condition = self._compile(stmt.condition)
+        then_branch = stmt.then_branch.accept(self)
+
+        if stmt.else_branch == None:
+
+            def run_if(env: Frame) -> Any:
+                if condition(env):
+                    return then_branch(env)
+                return None
+
+            return run_if
+
+        else_branch = stmt.else_branch.accept(self)
+
+        def run_if_else(env: Frame) -> Any:
+            if condition(env):
+                return then_branch(env)
+            return else_branch(env)
+
+        return run_if_else
+
+    def visit_while_stmt(self, stmt: "While") -> CompiledStmt:
+        condition = self._compile(stmt.condition)
+        body = stmt.body.accept(self)
+
+        def run(env: Frame) -> Any:
+            while condition(env):
+                result = body(env)
+                if result is not None:
+                    if result is BREAK:
+                        break
+                    if result is not CONTINUE:
+                        return result
+            return None
+
+        return run
+
+    def visit_break_stmt(self, stmt: "Break") -> CompiledStmt:
+        return lambda env: BREAK
+
+    def visit_continue_stmt(self, stmt: "Continue") -> CompiledStmt:
+        return lambda env: CONTINUE
+
+    def visit_for_stmt(self, stmt: "For") -> CompiledStmt:
+        initializer = None
+        if stmt.initializer != None:
+            initializer = stmt.initializer.accept(self)
+        condition = self._compile(stmt.condition)
+        increment = None
+        if stmt.increment != None:
+            increment = self._compile(stmt.increment)
+        body = stmt.body.accept(self)
+
+        def loop(env: Frame) -> Any:
+            while condition(env):
+                result = body(env)
+                if result is not None:
+                    if result is BREAK:
+                        break
+                    if result is not CONTINUE:
+                        return result
+                if increment != None:
+                    increment(env)
+            return None
+
+        if stmt.counted and not stmt.condition.left.captured:
+            loop = self._counted_for(stmt, body, loop)
+
+        if initializer != None:
+            run_loop = loop
+
+            def loop(env: Frame) -> Any:
+                initializer(env)
+                return run_loop(env)
+
+        if stmt.scope_size == 0:
+            return loop
+        size = stmt.scope_size
+        return lambda env: loop(Frame(size))
+
+    def _counted_for(
+        self, stmt: "For", body: CompiledStmt, checked_loop: CompiledStmt
+    ) -> CompiledStmt:
+        # Same as the tree-walker's, the counter is a python float the Frame slot
+        # gets a copy of, and the increment and comparison are inline
+        operator_token = stmt.condition.operator
+        compare = _COMPARISONS[operator_token.token_type]
+        bound = self._compile(stmt.condition.right)
+        step = stmt.increment.value
+        delta = step.right.value
+        if step.operator.token_type == TokenType.MINUS:
+            delta = -delta
+        slot = stmt.condition.left.slot
+
+        def counted(env: Frame) -> Any:
+            values = env.values
+            counter = values[slot]
+            if type(counter) is not float:
+                return checked_loop(env)
+            while True:
+                limit = bound(env)
+                if type(limit) is not float:
+                    raise InvalidOperatorError(operator_token, counter, limit)
+                if not compare(counter, limit):
+                    return None
+                result = body(env)
+                if result is not None:
+                    if result is BREAK:
+                        return None
+                    if result is not CONTINUE:
+                        return result
+                counter += delta
+                values[slot] = counter
+
+        return counted
+
+    def visit_fun_stmt(self, stmt: "Fun") -> CompiledStmt:
+        body = self._compile_stmts(stmt.body)
+        declare = _declarer(stmt)
+        define = _definer(stmt, self._globals)
+        capture = _capturer(stmt)
+        memoize = self._interpreter._memoize
+
+        def run(env: Frame) -> None:
+            declare(env)
+            define(env, memoize(CompiledFunction(stmt, body, capture(env))))
+
+        return run
+
+    def visit_return_stmt(self, stmt: "Return") -> CompiledStmt:
+        if stmt.value == None:
+            return lambda env: (None,)
+
+        value = self._compile(stmt.value)
+        return lambda env: (value(env),)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> CompiledStmt:
+        superclass_expr = None
+        if stmt.superclass != None:
+            superclass_expr = self._compile(stmt.superclass)
+
+        methods = [
+            (
+                method,
+                self._compile_stmts(method.body),
+                _capturer(method),
+                method.name.value == "init",
+            )
+            for method in stmt.methods
+        ]
+        name = stmt.name
+        declare_name = _declarer(stmt)
+        define = _definer(stmt, self._globals)
+        super_slot = stmt.super_slot
+        size = stmt.scope_size
+
+        def declare(env: Frame) -> None:
+            superclass = None
+            if superclass_expr != None:
+                superclass = superclass_expr(env)
+                if type(superclass) != LoxRuntimeClass:
+                    raise LoxRuntimeError("Superclass must be a class.", name)
+
+            declare_name(env)
+            define(env, None)
+
+            method_env = env
+            if superclass_expr != None:
+                if size > 0:
+                    method_env = Frame(size)
+                method_env.values[super_slot] = Cell(superclass)
+
+            runtime_methods = dict()
+            for method, body, capture, is_init in methods:
+                runtime_methods[method.name.value] = CompiledFunction(
+                    method, body, capture(method_env), is_init
+                )
+
+            define(env, LoxRuntimeClass(name.value, superclass, runtime_methods))
+
+        return declare
+
+
+class ClosureInterpreter(Interpreter):
+    """
+    Interpreter that compiles the program with ClosureCompiler before running it.
+    It resolves and runs with the same globals, functions and classes as the tree-walker.
+    """
+
+    def interpret(self, statements: list[Stmt]):
+        program = ClosureCompiler(self).compile(statements)
+        program(self._env)
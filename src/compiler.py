@@ -0,0 +1,614 @@
+from typing import Any
+from bytecode import (
+    Chunk,
+    FunctionProto,
+    OP_CONSTANT,
+    OP_NIL,
+    OP_TRUE,
+    OP_FALSE,
+    OP_POP,
+    OP_GET_LOCAL,
+    OP_SET_LOCAL,
+    OP_GET_GLOBAL,
+    OP_DEFINE_GLOBAL,
+    OP_SET_GLOBAL,
+    OP_GET_UPVALUE,
+    OP_SET_UPVALUE,
+    OP_GET_PROPERTY,
+    OP_SET_PROPERTY,
+    OP_GET_SUPER,
+    OP_EQUAL,
+    OP_NOT_EQUAL,
+    OP_GREATER,
+    OP_GREATER_EQUAL,
+    OP_LESS,
+    OP_LESS_EQUAL,
+    OP_ADD,
+    OP_SUBTRACT,
+    OP_MULTIPLY,
+    OP_DIVIDE,
+    OP_NOT,
+    OP_NEGATE,
+    OP_PRINT,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_JUMP_IF_TRUE,
+    OP_POP_JUMP_IF_FALSE,
+    OP_LOOP,
+    OP_CALL,
+    OP_INVOKE,
+    OP_SUPER_INVOKE,
+    OP_TAIL_CALL,
+    OP_TAIL_INVOKE,
+    OP_CLOSURE,
+    OP_CLOSE_UPVALUE,
+    OP_RETURN,
+    OP_CLASS,
+    OP_INHERIT,
+    OP_METHOD,
+)
+from expr import (
+    ExprVisitor,
+    Expr,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Expression,
+    Print,
+    Stmt,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+from lox_token import Token, TokenType
+from resolver import LoxFunctionType
+from runtime_errors import LoxRuntimeError
+
+
+_MAX_LOCALS = 256
+_MAX_UPVALUES = 256
+_MAX_JUMP = 0xFFFF
+
+_BINARY_OPS = {
+    TokenType.PLUS: OP_ADD,
+    TokenType.MINUS: OP_SUBTRACT,
+    TokenType.STAR: OP_MULTIPLY,
+    TokenType.SLASH: OP_DIVIDE,
+    TokenType.EQUAL_EQUAL: OP_EQUAL,
+    TokenType.BANG_EQUAL: OP_NOT_EQUAL,
+    TokenType.GREATER: OP_GREATER,
+    TokenType.GREATER_EQUAL: OP_GREATER_EQUAL,
+    TokenType.LESS: OP_LESS,
+    TokenType.LESS_EQUAL: OP_LESS_EQUAL,
+}
+
+
+class _Local:
+    name: str
+    # -1 until the initializer has been compiled
+    depth: int
+    is_captured: bool
+
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class _Loop:
+    # Scope depth outside the loop body, deeper locals are dropped on the way out
+    scope_depth: int
+    # Forward jumps to patch once the loop's end and the continue target are known
+    breaks: list[int]
+    continues: list[int]
+
+    def __init__(self, scope_depth: int) -> None:
+        self.scope_depth = scope_depth
+        self.breaks = []
+        self.continues = []
+
+
+class _FunctionState:
+    enclosing: "_FunctionState"
+    function: FunctionProto
+    type: LoxFunctionType
+    locals: list[_Local]
+    upvalues: list[tuple[bool, int]]
+    scope_depth: int
+    loops: list[_Loop]
+
+    def __init__(
+        self, enclosing: "_FunctionState", name: str, type: LoxFunctionType
+    ) -> None:
+        self.enclosing = enclosing
+        self.function = FunctionProto(name)
+        self.type = type
+        self.upvalues = []
+        self.scope_depth = 0
+        self.loops = []
+
+        # Slot 0 holds the callee, or the receiver for methods
+        receiver = "this" if type in _METHOD_TYPES else ""
+        self.locals = [_Local(receiver, 0)]
+
+
+_METHOD_TYPES = {LoxFunctionType.METHOD, LoxFunctionType.INITIALIZER}
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+    """
+    Compiles a resolved program into bytecode for the VM.
+    Locals are assigned stack slots here the same way clox does it, the Resolver is still
+    expected to have run first since it's what reports the static scoping errors.
+    """
+
+    _state: _FunctionState
+    _line: int
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._state = None
+        self._line = 0
+
+    def compile(self, statements: list[Stmt]) -> FunctionProto:
+        self._state = _FunctionState(None, "", LoxFunctionType.NONE)
+        for statement in statements:
+            self._compile_stmt(statement)
+        return self._end_function()
+
+    def _compile_stmt(self, stmt: Stmt) -> None:
+        stmt.accept(self)
+
+    def _compile_expr(self, expr: Expr) -> None:
+        expr.accept(self)
+
+    # Emitting
+
+    @property
+    def _chunk(self) -> Chunk:
+        return self._state.function.chunk
+
+    def _set_line(self, token: Token) -> None:
+        self._line = token.line
+
+    def _emit(self, *values: int) -> None:
+        for value in values:
+            self._chunk.write(value, self._line)
+
+    def _emit_u16(self, op: int, operand: int) -> None:
+        self._emit(op)
+        self._chunk.write_u16(operand, self._line)
+
+    def _make_constant(self, value: Any) -> int:
+        index = self._chunk.add_constant(value)
+        if index > 0xFFFF:
+            raise self._error("Too many constants in one chunk")
+        return index
+
+    def _emit_constant(self, value: Any) -> None:
+        self._emit_u16(OP_CONSTANT, self._make_constant(value))
+
+    def _emit_jump(self, op: int) -> int:
+        self._emit_u16(op, 0xFFFF)
+        return len(self._chunk.code) - 2
+
+    def _patch_jump(self, offset: int) -> None:
+        jump = len(self._chunk.code) - offset - 2
+        if jump > _MAX_JUMP:
+            raise self._error("Too much code to jump over")
+
+        self._chunk.code[offset] = (jump >> 8) & 0xFF
+        self._chunk.code[offset + 1] = jump & 0xFF
+
+    def _emit_loop(self, loop_start: int) -> None:
+        offset = len(self._chunk.code) - loop_start + 3
+        if offset > _MAX_JUMP:
+            raise self._error("Loop body too large")
+        self._emit_u16(OP_LOOP, offset)
+
+    def _emit_return(self) -> None:
+        if self._state.type == LoxFunctionType.INITIALIZER:
+            self._emit(OP_GET_LOCAL, 0)
+        else:
+            self._emit(OP_NIL)
+        self._emit(OP_RETURN)
+
+    def _error(self, message: str) -> LoxRuntimeError:
+        return LoxRuntimeError(message, Token(TokenType.EOF, None, self._line))
+
+    # Scopes and variables
+
+    def _begin_scope(self) -> None:
+        self._state.scope_depth += 1
+
+    def _end_scope(self) -> None:
+        state = self._state
+        state.scope_depth -= 1
+
+        while len(state.locals) > 0 and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self._emit(OP_CLOSE_UPVALUE)
+            else:
+                self._emit(OP_POP)
+            state.locals.pop()
+
+    def _discard_loop_locals(self, loop: _Loop) -> None:
+        # Like _end_scope for every scope inside the loop, without forgetting the
+        # locals, the code after a break or continue still belongs to those scopes
+        for local in reversed(self._state.locals):
+            if local.depth <= loop.scope_depth:
+                break
+            self._emit(OP_CLOSE_UPVALUE if local.is_captured else OP_POP)
+
+    def _begin_loop(self) -> _Loop:
+        loop = _Loop(self._state.scope_depth)
+        self._state.loops.append(loop)
+        return loop
+
+    def _patch_continues(self, loop: _Loop) -> None:
+        for jump in loop.continues:
+            self._patch_jump(jump)
+
+    def _end_loop(self, loop: _Loop) -> None:
+        for jump in loop.breaks:
+            self._patch_jump(jump)
+        self._state.loops.pop()
+
+    def _declare_variable(self, name: str) -> None:
+        if self._state.scope_depth == 0:
+            return
+
+        if len(self._state.locals) >= _MAX_LOCALS:
+            raise self._error("Too many local variables in function")
+        self._state.locals.append(_Local(name, -1))
+
+    def _mark_initialized(self) -> None:
+        if self._state.scope_depth == 0:
+            return
+        self._state.locals[-1].depth = self._state.scope_depth
+
+    def _define_variable(self, name: str) -> None:
+        if self._state.scope_depth > 0:
+            self._mark_initialized()
+            return
+
+        self._emit_u16(OP_DEFINE_GLOBAL, self._make_constant(name))
+
+    def _resolve_local(self, state: _FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+        return -1
+
+    def _resolve_upvalue(self, state: _FunctionState, name: str) -> int:
+        if state.enclosing == None:
+            return -1
+
+        local = self._resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self._add_upvalue(state, local, True)
+
+        upvalue = self._resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self._add_upvalue(state, upvalue, False)
+
+        return -1
+
+    def _add_upvalue(self, state: _FunctionState, index: int, is_local: bool) -> int:
+        for i, upvalue in enumerate(state.upvalues):
+            if upvalue == (is_local, index):
+                return i
+
+        if len(state.upvalues) >= _MAX_UPVALUES:
+            raise self._error("Too many closure variables in function")
+
+        state.upvalues.append((is_local, index))
+        state.function.upvalue_count = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def _named_variable(self, name: str, is_set: bool) -> None:
+        slot = self._resolve_local(self._state, name)
+        if slot != -1:
+            self._emit(OP_SET_LOCAL if is_set else OP_GET_LOCAL, slot)
+            return
+
+        slot = self._resolve_upvalue(self._state, name)
+        if slot != -1:
+            self._emit(OP_SET_UPVALUE if is_set else OP_GET_UPVALUE, slot)
+            return
+
+        op = OP_SET_GLOBAL if is_set else OP_GET_GLOBAL
+        self._emit_u16(op, self._make_constant(name))
+
+    # Functions and classes
+
+    def _function(self, stmt: Fun, type: LoxFunctionType) -> None:
+        self._set_line(stmt.name)
+        state = _FunctionState(self._state, stmt.name.value, type)
+        self._state = state
+        self._begin_scope()
+
+        state.function.arity = len(stmt.params)
+        for param in stmt.params:
+            self._declare_variable(param.value)
+            self._mark_initialized()
+
+        for statement in stmt.body:
+            self._compile_stmt(statement)
+
+        function = self._end_function()
+        self._emit_u16(OP_CLOSURE, self._make_constant(function))
+        for is_local, index in state.upvalues:
+            self._emit(1 if is_local else 0, index)
+
+    def _end_function(self) -> FunctionProto:
+        self._emit_return()
+        function = self._state.function
+        function.chunk.freeze()
+        self._state = self._state.enclosing
+        return function
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> None:
+        self._compile_expr(expr.value)
+        self._set_line(expr.name)
+        self._named_variable(expr.name.value, True)
+
+    def visit_binary_expr(self, expr: "Binary") -> None:
+        self._compile_expr(expr.left)
+        self._compile_expr(expr.right)
+        self._set_line(expr.operator)
+
+        op = _BINARY_OPS.get(expr.operator.token_type)
+        if op == None:
+            raise self._error(
+                f"Cannot apply operator {expr.operator.token_type.value} to binary"
+            )
+        self._emit(op)
+
+    def visit_call_expr(self, expr: "Call") -> None:
+        callee = expr.callee
+        if type(callee) == Super:
+            self._named_variable("this", False)
+            self._compile_args(expr)
+            self._named_variable("super", False)
+            self._set_line(callee.name)
+            self._emit_u16(OP_SUPER_INVOKE, self._make_constant(callee.method.value))
+            self._emit(len(expr.arguments))
+            return
+
+        self._compile_expr(callee)
+        self._compile_args(expr)
+        self._emit(OP_TAIL_CALL if expr.is_tail else OP_CALL, len(expr.arguments))
+
+    def visit_invoke_expr(self, expr: "Invoke") -> None:
+        # obj.method(args) skips creating a bound method, the same way clox's OP_INVOKE does
+        self._compile_expr(expr.obj)
+        self._compile_args(expr)
+        op = OP_TAIL_INVOKE if expr.is_tail else OP_INVOKE
+        self._emit_u16(op, self._make_constant(expr.name.value))
+        self._emit(len(expr.arguments))
+
+    def _compile_args(self, expr: "Call") -> None:
+        for arg in expr.arguments:
+            self._compile_expr(arg)
+        self._set_line(expr.paren)
+
+    def visit_get_expr(self, expr: "Get") -> None:
+        self._compile_expr(expr.obj)
+        self._set_line(expr.name)
+        self._emit_u16(OP_GET_PROPERTY, self._make_constant(expr.name.value))
+
+    def visit_grouping_expr(self, expr: "Grouping") -> None:
+        self._compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr: "Literal") -> None:
+        if expr.value is None:
+            self._emit(OP_NIL)
+        elif expr.value is True:
+            self._emit(OP_TRUE)
+        elif expr.value is False:
+            self._emit(OP_FALSE)
+        else:
+            self._emit_constant(expr.value)
+
+    def visit_logical_expr(self, expr: "Logical") -> None:
+        self._compile_expr(expr.left)
+        self._set_line(expr.operator)
+
+        if expr.operator.token_type == TokenType.OR:
+            end_jump = self._emit_jump(OP_JUMP_IF_TRUE)
+        else:
+            end_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+
+        self._emit(OP_POP)
+        self._compile_expr(expr.right)
+        self._patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: "Set") -> None:
+        self._compile_expr(expr.object)
+        self._compile_expr(expr.value)
+        self._set_line(expr.name)
+        self._emit_u16(OP_SET_PROPERTY, self._make_constant(expr.name.value))
+
+    def visit_super_expr(self, expr: "Super") -> None:
+        self._set_line(expr.name)
+        self._named_variable("this", False)
+        self._named_variable("super", False)
+        self._emit_u16(OP_GET_SUPER, self._make_constant(expr.method.value))
+
+    def visit_this_expr(self, expr: "This") -> None:
+        self._set_line(expr.name)
+        self._named_variable("this", False)
+
+    def visit_unary_expr(self, expr: "Unary") -> None:
+        self._compile_expr(expr.right)
+        self._set_line(expr.operator)
+
+        if expr.operator.token_type == TokenType.MINUS:
+            self._emit(OP_NEGATE)
+        elif expr.operator.token_type == TokenType.BANG:
+            self._emit(OP_NOT)
+        else:
+            raise self._error(
+                f"Cannot apply operator {expr.operator.token_type.value} to unary"
+            )
+
+    def visit_variable_expr(self, expr: "Variable") -> None:
+        self._set_line(expr.name)
+        self._named_variable(expr.name.value, False)
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> None:
+        self._compile_expr(stmt.expression)
+        self._emit(OP_POP)
+
+    def visit_print_stmt(self, stmt: "Print") -> None:
+        self._compile_expr(stmt.expression)
+        self._emit(OP_PRINT)
+
+    def visit_var_stmt(self, stmt: "Var") -> None:
+        self._set_line(stmt.name)
+        self._declare_variable(stmt.name.value)
+
+        if stmt.initializer != None:
+            self._compile_expr(stmt.initializer)
+        else:
+            self._emit(OP_NIL)
+
+        self._set_line(stmt.name)
+        self._define_variable(stmt.name.value)
+
+    def visit_block_stmt(self, stmt: "Block") -> None:
+        self._begin_scope()
+        for statement in stmt.statements:
+            self._compile_stmt(statement)
+        self._end_scope()
+
+    def visit_if_stmt(self, stmt: "If") -> None:
+        self._compile_expr(stmt.condition)
+        else_jump = self._emit_jump(OP_POP_JUMP_IF_FALSE)
+        self._compile_stmt(stmt.then_branch)
+
+        if stmt.else_branch == None:
+            self._patch_jump(else_jump)
+            return
+
+        end_jump = self._emit_jump(OP_JUMP)
+        self._patch_jump(else_jump)
+        self._compile_stmt(stmt.else_branch)
+        self._patch_jump(end_jump)
+
+    def visit_while_stmt(self, stmt: "While") -> None:
+        loop_start = len(self._chunk.code)
+        self._compile_expr(stmt.condition)
+        exit_jump = self._emit_jump(OP_POP_JUMP_IF_FALSE)
+
+        loop = self._begin_loop()
+        self._compile_stmt(stmt.body)
+        self._patch_continues(loop)
+        self._emit_loop(loop_start)
+        self._patch_jump(exit_jump)
+        self._end_loop(loop)
+
+    def visit_for_stmt(self, stmt: "For") -> None:
+        self._begin_scope()
+        if stmt.initializer != None:
+            self._compile_stmt(stmt.initializer)
+
+        loop_start = len(self._chunk.code)
+        self._compile_expr(stmt.condition)
+        exit_jump = self._emit_jump(OP_POP_JUMP_IF_FALSE)
+
+        loop = self._begin_loop()
+        self._compile_stmt(stmt.body)
+        self._patch_continues(loop)
+        if stmt.increment != None:
+            self._compile_expr(stmt.increment)
+            self._emit(OP_POP)
+        self._emit_loop(loop_start)
+        self._patch_jump(exit_jump)
+        self._end_loop(loop)
+        self._end_scope()
+
+    def visit_break_stmt(self, stmt: "Break") -> None:
+        self._set_line(stmt.keyword)
+        loop = self._state.loops[-1]
+        self._discard_loop_locals(loop)
+        loop.breaks.append(self._emit_jump(OP_JUMP))
+
+    def visit_continue_stmt(self, stmt: "Continue") -> None:
+        self._set_line(stmt.keyword)
+        loop = self._state.loops[-1]
+        self._discard_loop_locals(loop)
+        loop.continues.append(self._emit_jump(OP_JUMP))
+
+    def visit_fun_stmt(self, stmt: "Fun") -> None:
+        self._set_line(stmt.name)
+        self._declare_variable(stmt.name.value)
+        # Functions can refer to themselves so they're initialized before the body compiles
+        self._mark_initialized()
+        self._function(stmt, LoxFunctionType.FUNCTION)
+        self._define_variable(stmt.name.value)
+
+    def visit_return_stmt(self, stmt: "Return") -> None:
+        self._set_line(stmt.keyword)
+        if stmt.value == None:
+            self._emit_return()
+            return
+
+        self._compile_expr(stmt.value)
+        self._emit(OP_RETURN)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> None:
+        self._set_line(stmt.name)
+        name = stmt.name.value
+        self._declare_variable(name)
+        self._emit_u16(OP_CLASS, self._make_constant(name))
+        self._define_variable(name)
+
+        has_superclass = stmt.superclass != None
+        if has_superclass:
+            self._compile_expr(stmt.superclass)
+            self._begin_scope()
+            self._declare_variable("super")
+            self._mark_initialized()
+
+            self._named_variable(name, False)
+            self._set_line(stmt.name)
+            self._emit(OP_INHERIT)
+
+        self._named_variable(name, False)
+        for method in stmt.methods:
+            type = LoxFunctionType.METHOD
+            if method.name.value == "init":
+                type = LoxFunctionType.INITIALIZER
+            self._function(method, type)
+            self._emit_u16(OP_METHOD, self._make_constant(method.name.value))
+        self._emit(OP_POP)
+
+        if has_superclass:
+            self._end_scope()
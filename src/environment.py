@@ -1,34 +1,56 @@
-from os import name
+import itertools
 from typing import Any
 from lox_token import Token
 from runtime_errors import LoxRuntimeError
 
 
+# Shared by every Environment so a version never means the same thing in two of them
+_versions = itertools.count()
+
+
 class Environment:
-    _values: dict[str, Any]
+    # Every binding is a Cell that stays the same for as long as the name is bound,
+    # so a read can hold on to the Cell and see every later assignment
+    _values: dict[str, "Cell"]
     _enclosing: "Environment"
+    # Changes whenever a new name is defined, which could change the Cell a lookup
+    # finds. A Cell looked up at some version is still the binding while the
+    # version is unchanged, assignments don't change it
+    version: int
 
     def __init__(self, enclosing: "Environment" = None) -> None:
         self._values = dict()
         self._enclosing = enclosing
+        self.version = next(_versions)
 
     def define(self, name: str, val: Any):
-        self._values[name] = val
+        cell = self._values.get(name)
+        if cell != None:
+            cell.value = val
+            return
+
+        self._values[name] = Cell(val)
+        self.version = next(_versions)
 
     def get(self, name_token: Token) -> Any:
+        return self.get_cell(name_token).value
+
+    def get_cell(self, name_token: Token) -> "Cell":
         name = name_token.value
-        if name in self._values:
-            return self._values[name]
+        cell = self._values.get(name)
+        if cell != None:
+            return cell
 
         if self._enclosing != None:
-            return self._enclosing.get(name_token)
+            return self._enclosing.get_cell(name_token)
 
         raise LoxRuntimeError(f"Variable {name} not found", name_token)
 
     def assign(self, name_token: Token, val: Any) -> Any:
         name = name_token.value
-        if name in self._values:
-            self._values[name] = val
+        cell = self._values.get(name)
+        if cell != None:
+            cell.value = val
             return
 
         if self._enclosing != None:
@@ -39,15 +61,35 @@ class Environment:
             f"Variable {name} not initialized before assignment", name_token
         )
 
-    def get_at(self, distance: int, name: str) -> Any:
-        return self._ancestor(distance)._values.get(name)
 
-    def assign_at(self, distance: int, name: str, value: Any) -> None:
-        self._ancestor(distance)._values[name] = value
+class Cell:
+    """
+    A local that a closure captures. The slot of the Frame declaring it and every
+    closure over it hold the same Cell, so they all see each other's assignments.
+    """
+
+    __slots__ = ("value",)
+
+    value: Any
+
+    def __init__(self, value: Any = None) -> None:
+        self.value = value
+
+
+class Frame:
+    """
+    The locals of one call. The Resolver gives every local of a function, whichever
+    block declares it, a slot in one flat list, so a lookup is an index. A captured
+    local holds a Cell in its slot, and upvalues are the Cells the running function
+    closed over. Nothing else is reachable from a closure, so the Frame is garbage
+    as soon as the call returns.
+    """
+
+    __slots__ = ("values", "upvalues")
 
-    def _ancestor(self, distance: int) -> "Environment":
-        env: "Environment" = self
-        for i in range(distance):
-            env = env._enclosing
+    values: list
+    upvalues: tuple
 
-        return env
+    def __init__(self, size: int, upvalues: tuple = ()) -> None:
+        self.values = [None] * size
+        self.upvalues = upvalues
@@ -1,9 +1,26 @@
 import abc
 from typing import Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from lox_token import Token
 
 
+def slotted(cls: type) -> type:
+    """
+    Remakes a dataclass with __slots__ for its fields, what dataclass(slots=True)
+    does on python 3.10 and up. A loaded program holds a lot of nodes and slots
+    keep each one small.
+    """
+    namespace = dict(cls.__dict__)
+    names = tuple(node_field.name for node_field in fields(cls))
+    namespace["__slots__"] = names
+    for name in names:
+        # The defaults already live in the generated __init__
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
 class ExprVisitor(abc.ABC):
     @abc.abstractmethod
     def visit_assign_expr(self, expr: "Assign") -> Any:
@@ -25,6 +42,10 @@ class ExprVisitor(abc.ABC):
     def visit_grouping_expr(self, expr: "Grouping") -> Any:
         pass
 
+    @abc.abstractmethod
+    def visit_invoke_expr(self, expr: "Invoke") -> Any:
+        pass
+
     @abc.abstractmethod
     def visit_literal_expr(self, expr: "Literal") -> Any:
         pass
@@ -53,52 +74,111 @@ class ExprVisitor(abc.ABC):
     def visit_variable_expr(self, expr: "Variable") -> Any:
         pass
 
+    # The Interpreter quickens Binary, Unary and Logical nodes into the specialized
+    # subclasses at the bottom of this file. Every other visitor sees them as the
+    # node they were quickened from.
+
+    def visit_float_binary_expr(self, expr: "FloatBinary") -> Any:
+        return self.visit_binary_expr(expr)
+
+    def visit_string_concat_expr(self, expr: "StringConcat") -> Any:
+        return self.visit_binary_expr(expr)
+
+    def visit_equality_expr(self, expr: "Equality") -> Any:
+        return self.visit_binary_expr(expr)
+
+    def visit_unchecked_binary_expr(self, expr: "UncheckedBinary") -> Any:
+        return self.visit_binary_expr(expr)
+
+    def visit_float_negate_expr(self, expr: "FloatNegate") -> Any:
+        return self.visit_unary_expr(expr)
+
+    def visit_unchecked_negate_expr(self, expr: "UncheckedNegate") -> Any:
+        return self.visit_unary_expr(expr)
+
+    def visit_not_expr(self, expr: "Not") -> Any:
+        return self.visit_unary_expr(expr)
+
+    def visit_and_expr(self, expr: "And") -> Any:
+        return self.visit_logical_expr(expr)
+
+    def visit_or_expr(self, expr: "Or") -> Any:
+        return self.visit_logical_expr(expr)
+
 
 class Expr(abc.ABC):
+    __slots__ = ()
+
     # TODO: See if there's a cleaner way to do this, possibly with a @Visitor decorator on the Visitor class?
     @abc.abstractmethod
     def accept(self, visitor: ExprVisitor) -> Any:
         pass
 
 
+@slotted
 @dataclass
 class Assign(Expr):
     name: Token
     value: Expr
+    # Filled in by the Resolver, None for globals
+    depth: int = field(default=None, compare=False, repr=False)
+    slot: int = field(default=None, compare=False, repr=False)
+    # The Var, Fun or LoxClass statement or the param Token that declared the local
+    declaration: Any = field(default=None, compare=False, repr=False)
+    # Index into the running function's upvalues for a local of an enclosing
+    # function, slot is None then. Otherwise captured is set when the slot holds a Cell
+    upvalue: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_assign_expr(self)
 
 
+@slotted
 @dataclass
 class Binary(Expr):
     left: Expr
     operator: Token
     right: Expr
+    # The python operator a quickened node applies, and whether a failed type guard
+    # already sent the node back to the generic path for good
+    fast_op: Any = field(default=None, compare=False, repr=False)
+    deoptimized: bool = field(default=False, compare=False, repr=False)
+    # float or str when TypeInference proved both operands have the type the
+    # operator needs, so the operation can't fail its type check
+    operand_type: type = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_binary_expr(self)
 
 
+@slotted
 @dataclass
 class Call(Expr):
     callee: Expr
     paren: Token
     arguments: list[Expr]
+    # Set by the Resolver when the call is the value of a return statement
+    is_tail: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_call_expr(self)
 
 
+@slotted
 @dataclass
 class Get(Expr):
     obj: Expr
     name: Token
+    # Monomorphic cache, the slot the field had in the last instance Shape seen here
+    cached_shape: Any = field(default=None, compare=False, repr=False)
+    cached_slot: int = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_get_expr(self)
 
 
+@slotted
 @dataclass
 class Grouping(Expr):
     expression: Expr
@@ -107,6 +187,25 @@ class Grouping(Expr):
         return visitor.visit_grouping_expr(self)
 
 
+# obj.name(arguments), parsed as one node so the method is called with this bound
+# directly instead of going through a bound method made by Get
+@slotted
+@dataclass
+class Invoke(Expr):
+    obj: Expr
+    name: Token
+    paren: Token
+    arguments: list[Expr]
+    # Polymorphic inline cache, the methods this call site has looked up keyed by class
+    method_cache: dict = field(default_factory=dict, compare=False, repr=False)
+    # Set by the Resolver when the call is the value of a return statement
+    is_tail: bool = field(default=False, compare=False, repr=False)
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_invoke_expr(self)
+
+
+@slotted
 @dataclass
 class Literal(Expr):
     value: Any
@@ -115,6 +214,7 @@ class Literal(Expr):
         return visitor.visit_literal_expr(self)
 
 
+@slotted
 @dataclass
 class Logical(Expr):
     left: Expr
@@ -125,45 +225,167 @@ class Logical(Expr):
         return visitor.visit_logical_expr(self)
 
 
+@slotted
 @dataclass
 class Set(Expr):
     object: Expr
     name: Token
     value: Expr
+    # Monomorphic cache, the field's slot in the last instance Shape seen here and
+    # the Shape the instance has after the set
+    cached_shape: Any = field(default=None, compare=False, repr=False)
+    cached_slot: int = field(default=None, compare=False, repr=False)
+    cached_transition: Any = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_set_expr(self)
 
 
+@slotted
 @dataclass
 class Super(Expr):
     name: Token
     method: Token
+    # Filled in by the Resolver, None for globals
+    depth: int = field(default=None, compare=False, repr=False)
+    slot: int = field(default=None, compare=False, repr=False)
+    upvalue: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
+    # Resolved like any this, the instance the method gets bound to
+    this: "This" = field(default=None, compare=False, repr=False)
+    # The method super resolved to for the last superclass seen here, a class
+    # declaration only gets a new superclass when it runs again
+    cached_class: Any = field(default=None, compare=False, repr=False)
+    cached_method: Any = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_super_expr(self)
 
 
+@slotted
 @dataclass
 class This(Expr):
     name: Token
+    # Filled in by the Resolver, None for globals
+    depth: int = field(default=None, compare=False, repr=False)
+    slot: int = field(default=None, compare=False, repr=False)
+    upvalue: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_this_expr(self)
 
 
+@slotted
 @dataclass
 class Unary(Expr):
     operator: Token
     right: Expr
+    deoptimized: bool = field(default=False, compare=False, repr=False)
+    # float when TypeInference proved the operand of - is a number
+    operand_type: type = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_unary_expr(self)
 
 
+@slotted
 @dataclass
 class Variable(Expr):
     name: Token
+    # Filled in by the Resolver, None for globals
+    depth: int = field(default=None, compare=False, repr=False)
+    slot: int = field(default=None, compare=False, repr=False)
+    # The Var, Fun or LoxClass statement or the param Token that declared the local
+    declaration: Any = field(default=None, compare=False, repr=False)
+    # Index into the running function's upvalues for a local of an enclosing
+    # function, slot is None then. Otherwise captured is set when the slot holds a Cell
+    upvalue: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
+    # Inline cache of a global read, the binding's Cell while the globals' version
+    # matches
+    cache_version: int = field(default=None, compare=False, repr=False)
+    cached_cell: Any = field(default=None, compare=False, repr=False)
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_variable_expr(self)
+
+
+# Quickened nodes. The Interpreter swaps a node's __class__ to one of these once it
+# has seen the node's operand types, and back to the generic class with deoptimized
+# set if a later evaluation fails the type guard.
+
+
+class FloatBinary(Binary):
+    """Arithmetic or comparison guarded on both operands being numbers."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_float_binary_expr(self)
+
+
+class StringConcat(Binary):
+    """+ guarded on both operands being strings."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_string_concat_expr(self)
+
+
+class Equality(Binary):
+    """== or !=, which take any operand types so need no guard."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_equality_expr(self)
+
+
+class UncheckedBinary(Binary):
+    """Arithmetic, comparison or + whose operand types TypeInference proved."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_unchecked_binary_expr(self)
+
+
+class FloatNegate(Unary):
+    """- guarded on the operand being a number."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_float_negate_expr(self)
+
+
+class UncheckedNegate(Unary):
+    """- on an operand TypeInference proved is a number."""
+
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_unchecked_negate_expr(self)
+
+
+class Not(Unary):
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_not_expr(self)
+
+
+class And(Logical):
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_and_expr(self)
+
+
+class Or(Logical):
+    __slots__ = ()
+
+    def accept(self, visitor: ExprVisitor) -> Any:
+        return visitor.visit_or_expr(self)
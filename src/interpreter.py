@@ -1,5 +1,5 @@
-from environment import Environment
-from typing import Any
+from environment import Cell, Environment, Frame
+from typing import Any, Callable
 from expr import (
     ExprVisitor,
     Expr,
@@ -9,12 +9,22 @@ from expr import (
     Call,
     Get,
     Grouping,
+    Invoke,
     Literal,
     Logical,
     Set,
     Super,
     This,
     Variable,
+    FloatBinary,
+    StringConcat,
+    Equality,
+    FloatNegate,
+    UncheckedBinary,
+    UncheckedNegate,
+    Not,
+    And,
+    Or,
 )
 from stmt import (
     StmtVisitor,
@@ -25,72 +35,287 @@ from stmt import (
     Block,
     If,
     While,
+    For,
+    Break,
+    Continue,
     Fun,
     Return,
     LoxClass,
 )
 from lox_token import Token, TokenType
 from runtime_errors import LoxRuntimeError, InvalidOperatorError
-import time, abc
-
-
-class ReturnErr(Exception):
-    value: Any
-
-    def __init__(self, val: Any) -> None:
-        super().__init__()
-        self.value = val
-
-
-class LoxCallable(abc.ABC):
-    @abc.abstractmethod
+from collections import OrderedDict
+import math
+import operator
+import sys, time, threading
+
+
+# Deepest Lox call stack allowed before a "Stack overflow." error
+DEFAULT_MAX_CALL_DEPTH = 10000
+# Upper bound on the Python frames one Lox call takes in the tree-walker, used to
+# size the recursion limit for run_with_deep_stack
+PY_FRAMES_PER_CALL = 20
+# Python frames run_with_deep_stack leaves for whatever runs below the first Lox call
+PY_FRAMES_HEADROOM = 200
+# Bytes of C stack to reserve for each Python frame on the deep stack thread
+STACK_BYTES_PER_PY_FRAME = 1024
+
+# Results each pure function keeps memoized, 0 turns memoization off
+DEFAULT_MEMO_SIZE = 1024
+# lru evicts the least recently used result, fifo the oldest one
+MEMO_POLICIES = ["lru", "fifo"]
+
+# Most classes an Invoke call site caches methods for
+MAX_CACHED_CLASSES = 4
+# Instances with more fields than this stop sharing shapes
+MAX_SHAPE_FIELDS = 64
+
+# Statements evaluate to None, or to a 1-tuple holding the value of a return
+# statement which every enclosing statement passes straight up to the call.
+ExecResult = tuple
+# What break and continue evaluate to, passed up the same way to the innermost
+# loop. Loops tell them from a returned value by identity.
+BREAK = ("break",)
+CONTINUE = ("continue",)
+
+
+class LoxCallable:
+    # A plain base class rather than an ABC, isinstance against an ABC goes through
+    # ABCMeta.__instancecheck__ and this check happens on every call
     def call(self, interpreter: "Interpreter", arguments: list[Any]) -> Any:
-        pass
+        raise NotImplementedError()
 
-    @abc.abstractmethod
-    def arity(
-        self,
-    ) -> int:
-        pass
+    def arity(self) -> int:
+        raise NotImplementedError()
 
 
 class LoxFunction(LoxCallable):
     _declaration: Fun
-    _closure: Environment
+    # The Cells of the enclosing locals the function uses, in Fun.upvalues order
+    _upvalues: tuple
     _is_init: bool
+    # Set by the Interpreter for functions the PurityAnalyzer marked pure
+    _memo: "MemoCache"
 
-    def __init__(
-        self, declaration: Fun, closure: Environment, is_init: bool = False
-    ) -> None:
+    def __init__(self, declaration: Fun, upvalues: tuple, is_init: bool = False) -> None:
         super().__init__()
         self._declaration = declaration
-        self._closure = closure
+        self._upvalues = upvalues
         self._is_init = is_init
+        self._memo = None
 
     def call(self, interpreter: "Interpreter", arguments: list[Any]):
-        env = Environment(self._closure)
-        for i in range(len(self._declaration.params)):
-            param_name = self._declaration.params[i].value
-            param_val = arguments[i]
-            env.define(param_name, param_val)
+        if self._memo is not None:
+            return self._memo.call(self, interpreter, arguments)
+        return self._run(interpreter, self._frame(None, arguments), None)
+
+    def invoke(self, interpreter: "Interpreter", this: Any, arguments: list[Any]):
+        return self._run(interpreter, self._frame(this, arguments), this)
+
+    def _frame(self, this: Any, arguments: list[Any]) -> Frame:
+        declaration = self._declaration
+        env = Frame(declaration.scope_size, self._upvalues)
+        values = env.values
+        if this is None:
+            # Params take the first slots of the function's frame
+            values[: len(arguments)] = arguments
+        else:
+            # Methods have this in slot 0 and the params after it
+            values[0] = this
+            values[1 : len(arguments) + 1] = arguments
+        for slot in declaration.cell_slots:
+            values[slot] = Cell(values[slot])
+        return env
+
+    def _execute(self, interpreter: "Interpreter", env: Frame) -> "ExecResult":
+        return interpreter._execute_block(self._declaration.body, env)
+
+    def _run(self, interpreter: "Interpreter", env: Frame, this: Any) -> Any:
+        if interpreter._call_depth >= interpreter._max_call_depth:
+            raise LoxRuntimeError("Stack overflow.", interpreter._call_site)
+
+        interpreter._call_depth += 1
         try:
-            interpreter._execute_block(self._declaration.body, env)
-        except ReturnErr as ret:
-            if self._is_init:
-                return self._closure.get_at(0, "this")
-            return ret.value
-
-        if self._is_init:
-            return self._closure.get_at(0, "this")
-        return None
+            # Calls in tail position come back as a TailCall and run in this loop,
+            # so they take no Python stack and don't count towards the depth
+            function = self
+            while True:
+                result = function._execute(interpreter, env)
+                if function._is_init:
+                    return this
+                if result is None:
+                    return None
+
+                value = result[0]
+                if type(value) is not TailCall:
+                    return value
+                function = value.function
+                env = value.env
+                this = value.this
+        finally:
+            interpreter._call_depth -= 1
 
     def arity(self) -> int:
         return len(self._declaration.params)
 
-    def bind(self, instance: "LoxInstance"):
-        env = Environment(self._closure)
-        env.define("this", instance)
-        return LoxFunction(self._declaration, env, self._is_init)
+    def bind(self, instance: "LoxInstance") -> "LoxBoundMethod":
+        return LoxBoundMethod(self, instance)
+
+
+def capture_upvalues(declaration: Fun, env: Frame) -> tuple:
+    """
+    The Cells a closure over declaration made while env runs keeps, from env's own
+    slots or from the upvalues of the function env belongs to.
+    """
+    values = env.values
+    upvalues = env.upvalues
+    return tuple(
+        values[index] if is_local else upvalues[index]
+        for is_local, index in declaration.upvalues
+    )
+
+
+class TailCall:
+    """
+    What a call in tail position evaluates to instead of making the call. It only
+    ever travels up through the return statement to LoxFunction._run, which then
+    runs the callee's body in place of the caller's.
+    """
+
+    __slots__ = ("function", "env", "this")
+
+    function: LoxFunction
+    env: Frame
+    this: Any
+
+    def __init__(self, function: LoxFunction, env: Frame, this: Any) -> None:
+        self.function = function
+        self.env = env
+        self.this = this
+
+
+_FLOAT_OPERATORS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+_EQUALITY_OPERATORS = {
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+}
+
+
+def _quicken_binary(expr: Binary, left: Any, right: Any) -> None:
+    """
+    Specializes expr for the operand types it just saw. Operands that would raise
+    an error leave it generic, the error is reported by the generic path.
+    """
+    op_type = expr.operator.token_type
+    if op_type in _EQUALITY_OPERATORS:
+        expr.fast_op = _EQUALITY_OPERATORS[op_type]
+        expr.__class__ = Equality
+    elif expr.operand_type != None:
+        # The operands can't have other types, no guard needed
+        expr.fast_op = _FLOAT_OPERATORS[op_type]
+        expr.__class__ = UncheckedBinary
+    elif type(left) is float and type(right) is float:
+        expr.fast_op = _FLOAT_OPERATORS.get(op_type)
+        if expr.fast_op != None:
+            expr.__class__ = FloatBinary
+    elif op_type == TokenType.PLUS and type(left) is str and type(right) is str:
+        expr.__class__ = StringConcat
+
+
+def _quicken_unary(expr: Unary, right: Any) -> None:
+    op_type = expr.operator.token_type
+    if op_type == TokenType.BANG:
+        expr.__class__ = Not
+    elif op_type == TokenType.MINUS and expr.operand_type != None:
+        expr.__class__ = UncheckedNegate
+    elif op_type == TokenType.MINUS and type(right) is float:
+        expr.__class__ = FloatNegate
+
+
+class MemoCache:
+    """
+    Bounded cache of a pure function's results keyed by its arguments. Calls with
+    anything but numbers, strings and bools as arguments always run the function.
+    """
+
+    __slots__ = ("name", "size", "policy", "hits", "misses", "_results")
+
+    def __init__(self, name: str, size: int, policy: str = "lru") -> None:
+        self.name = name
+        self.size = size
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def call(self, function: LoxFunction, interpreter: "Interpreter", arguments: list):
+        key = self._key(arguments)
+        if key is None:
+            return function._run(interpreter, function._frame(None, arguments), None)
+
+        results = self._results
+        if key in results:
+            self.hits += 1
+            if self.policy == "lru":
+                results.move_to_end(key)
+            return results[key]
+
+        self.misses += 1
+        value = function._run(interpreter, function._frame(None, arguments), None)
+        results[key] = value
+        if len(results) > self.size:
+            results.popitem(last=False)
+        return value
+
+    def _key(self, arguments: list) -> tuple:
+        has_bool = False
+        has_zero = False
+        for arg in arguments:
+            arg_type = type(arg)
+            if arg_type is bool:
+                has_bool = True
+            elif arg_type is float:
+                if arg == 0.0:
+                    has_zero = True
+            elif arg_type is not str:
+                return None
+
+        # True == 1.0 and 0.0 == -0.0 in python, so bools need their types and
+        # zeros their signs in the key
+        if has_bool or has_zero:
+            return tuple(
+                (float, arg, math.copysign(1.0, arg))
+                if type(arg) is float
+                else (type(arg), arg)
+                for arg in arguments
+            )
+        return tuple(arguments)
+
+
+class LoxBoundMethod(LoxCallable):
+    """A method read off an instance as a value, calling it invokes the method on that instance."""
+
+    _method: LoxFunction
+    _this: "LoxInstance"
+
+    def __init__(self, method: LoxFunction, this: "LoxInstance") -> None:
+        self._method = method
+        self._this = this
+
+    def call(self, interpreter: "Interpreter", arguments: list[Any]):
+        return self._method.invoke(interpreter, self._this, arguments)
+
+    def arity(self) -> int:
+        return self._method.arity()
 
 
 class ClockFn(LoxCallable):
@@ -127,21 +352,62 @@ class AssertFalseFn(LoxCallable):
             raise LoxAssertFailedError()
 
 
+class Shape:
+    """
+    Hidden class describing where an instance keeps each of its fields. Instances of
+    a class that get the same fields in the same order, as anything built by the same
+    init does, share one Shape and keep their values in a plain list.
+    """
+
+    __slots__ = ("slots", "shared", "_transitions")
+
+    slots: dict[str, int]
+    # Unshared shapes belong to a single instance that outgrew MAX_SHAPE_FIELDS,
+    # they grow in place and work like the instance's own field dict
+    shared: bool
+    _transitions: dict[str, "Shape"]
+
+    def __init__(self, slots: dict[str, int], shared: bool = True) -> None:
+        self.slots = slots
+        self.shared = shared
+        self._transitions = dict()
+
+    def with_field(self, name: str) -> "Shape":
+        if not self.shared:
+            self.slots[name] = len(self.slots)
+            return self
+
+        shape = self._transitions.get(name)
+        if shape == None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(slots, len(slots) <= MAX_SHAPE_FIELDS)
+            if shape.shared:
+                self._transitions[name] = shape
+        return shape
+
+
 class LoxInstance:
+    __slots__ = ("_class", "_shape", "_values")
+
     _class: "LoxRuntimeClass"
-    _fields: dict
+    _shape: Shape
+    # Field values, indexed by the slots in _shape
+    _values: list
 
     def __init__(self, lox_class: "LoxRuntimeClass") -> None:
         self._class = lox_class
-        self._fields = dict()
+        self._shape = lox_class._shape
+        self._values = []
 
     def __str__(self) -> str:
         return self._class._name
 
     def get(self, name: Token):
         name_str = name.value
-        if name_str in self._fields:
-            return self._fields[name_str]
+        slot = self._shape.slots.get(name_str)
+        if slot != None:
+            return self._values[slot]
 
         method = self._class.find_method(name_str)
         if method != None:
@@ -150,53 +416,80 @@ class LoxInstance:
         raise LoxRuntimeError(f"Undefined property: {name_str}.", name)
 
     def set(self, name: str, value: Any):
-        self._fields[name] = value
+        slot = self._shape.slots.get(name)
+        if slot != None:
+            self._values[slot] = value
+        else:
+            self._shape = self._shape.with_field(name)
+            self._values.append(value)
 
 
 class LoxRuntimeClass(LoxCallable):
     _name: str
     _superclass: "LoxRuntimeClass"
+    # Own methods merged over a copy of the superclass's table, so a lookup is a
+    # single dict access however deep the hierarchy is
     _methods: dict
+    _initializer: LoxFunction
+    _arity: int
+    # Shape every new instance starts out with
+    _shape: Shape
 
     def __init__(self, name, superclass: "LoxRuntimeClass", methods: dict) -> None:
         self._name = name
         self._superclass = superclass
-        self._methods = methods
+        self._methods = dict(superclass._methods) if superclass != None else dict()
+        self._methods.update(methods)
+        self._initializer = self._methods.get("init")
+        self._arity = self._initializer.arity() if self._initializer != None else 0
+        self._shape = Shape(dict())
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        if initializer != None:
-            return initializer.arity()
-
-        return 0
+        return self._arity
 
     def call(self, interpreter: "Interpreter", arguments: list[Any]) -> Any:
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
-        if initializer != None:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self._initializer != None:
+            self._initializer.invoke(interpreter, instance, arguments)
         return instance
 
     def find_method(self, name: str) -> LoxFunction:
-        if name in self._methods:
-            return self._methods[name]
-
-        if self._superclass != None:
-            return self._superclass.find_method(name)
+        return self._methods.get(name)
 
 
 class Interpreter(ExprVisitor, StmtVisitor):
     _globals: Environment
-    _env: Environment
+    # The Frame of the running call, or of the top level block it's in
+    _env: Frame
     # The book has this as <Expr, int>
     # I think Token is probably fine for this with it's default hash method, but might need to revisit
     _locals: dict[Token, int]
+    _call_depth: int
+    _max_call_depth: int
+    # The paren of the call being made, so a function that can't start for lack of
+    # stack reports the line of the call rather than of its declaration
+    _call_site: Token
+    _memo_size: int
+    _memo_policy: str
+    # The cache of every memoized function made so far, to report hits and misses
+    memo_caches: list[MemoCache]
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        max_call_depth: int = DEFAULT_MAX_CALL_DEPTH,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+        memo_policy: str = "lru",
+    ) -> None:
         super().__init__()
         self._globals = Environment()
-        self._env = self._globals
+        self._env = Frame(0)
         self._locals = dict()
+        self._call_depth = 0
+        self._max_call_depth = max_call_depth
+        self._call_site = None
+        self._memo_size = memo_size
+        self._memo_policy = memo_policy
+        self.memo_caches = []
 
         self._globals.define("clock", ClockFn())
         self._globals.define("assert", AssertFn())
@@ -206,8 +499,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
         for statement in statements:
             self.execute(statement)
 
-    def execute(self, statement: Stmt):
-        statement.accept(self)
+    def execute(self, statement: Stmt) -> ExecResult:
+        return statement.accept(self)
 
     def _evaluate(self, expr: "Expr") -> Any:
         return expr.accept(self)
@@ -215,9 +508,14 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_assign_expr(self, expr: "Assign") -> Any:
         value = self._evaluate(expr.value)
 
-        distance = self._locals.get(expr.name)
-        if distance != None:
-            self._env.assign_at(distance, expr.name.value, value)
+        slot = expr.slot
+        if slot != None:
+            if expr.captured:
+                self._env.values[slot].value = value
+            else:
+                self._env.values[slot] = value
+        elif expr.upvalue != None:
+            self._env.upvalues[expr.upvalue].value = value
         else:
             self._globals.assign(expr.name, value)
 
@@ -226,6 +524,11 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_binary_expr(self, expr: "Binary") -> Any:
         left = self._evaluate(expr.left)
         right = self._evaluate(expr.right)
+        if not expr.deoptimized:
+            _quicken_binary(expr, left, right)
+        return self._binary(expr, left, right)
+
+    def _binary(self, expr: "Binary", left: Any, right: Any) -> Any:
         op_type = expr.operator.token_type
 
         # Arithmetic
@@ -265,23 +568,106 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         raise InvalidOperatorError(expr.operator, left, right)
 
+    # Quickened nodes evaluate their operands with accept directly, saving the
+    # _evaluate call on the hottest paths
+
+    def visit_float_binary_expr(self, expr: "FloatBinary") -> Any:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return expr.fast_op(left, right)
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_string_concat_expr(self, expr: "StringConcat") -> Any:
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is str and type(right) is str:
+            return left + right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_equality_expr(self, expr: "Equality") -> Any:
+        return expr.fast_op(expr.left.accept(self), expr.right.accept(self))
+
+    def visit_unchecked_binary_expr(self, expr: "UncheckedBinary") -> Any:
+        return expr.fast_op(expr.left.accept(self), expr.right.accept(self))
+
+    def _deoptimize_binary(self, expr: "Binary", left: Any, right: Any) -> Any:
+        expr.__class__ = Binary
+        expr.deoptimized = True
+        return self._binary(expr, left, right)
+
     def visit_call_expr(self, expr: "Call") -> Any:
         callee = self._evaluate(expr.callee)
 
         arguments = [self._evaluate(arg) for arg in expr.arguments]
 
+        return self._call(callee, arguments, expr.paren, expr.is_tail)
+
+    def _call(
+        self, callee: Any, arguments: list[Any], paren: Token, is_tail: bool = False
+    ) -> Any:
         if not isinstance(callee, LoxCallable):
-            raise LoxRuntimeError("Can only call functions and classes", expr.paren)
+            raise LoxRuntimeError("Can only call functions and classes", paren)
 
         function: LoxCallable = callee
 
-        if function.arity() != len(arguments):
+        arity = function.arity()
+        if arity != len(arguments):
             raise LoxRuntimeError(
-                f"Wrong number of args, expected {function.arity()} but recieved {len(arguments)}",
-                expr.paren,
+                f"Wrong number of args, expected {arity} but recieved {len(arguments)}",
+                paren,
             )
+
+        if is_tail:
+            if type(function) is LoxBoundMethod:
+                method = function._method
+                this = function._this
+                return TailCall(method, method._frame(this, arguments), this)
+            # Memoized functions too, only the call that started a chain of tail
+            # calls gets its result cached since the rest never return on their own
+            if isinstance(function, LoxFunction):
+                return TailCall(function, function._frame(None, arguments), None)
+
+        self._call_site = paren
         try:
             return function.call(self, arguments)
+        except (LoxAssertFailedError) as err:
+            err.line = paren.line
+            raise err
+
+    def visit_invoke_expr(self, expr: "Invoke") -> Any:
+        obj = self._evaluate(expr.obj)
+        if not isinstance(obj, LoxInstance):
+            raise LoxRuntimeError("Can only call propertes on objects", expr.name)
+
+        name = expr.name.value
+        slot = obj._shape.slots.get(name)
+        if slot != None:
+            arguments = [self._evaluate(arg) for arg in expr.arguments]
+            return self._call(obj._values[slot], arguments, expr.paren, expr.is_tail)
+
+        klass = obj._class
+        method = expr.method_cache.get(klass)
+        if method == None:
+            method = klass.find_method(name)
+            if method == None:
+                raise LoxRuntimeError(f"Undefined property: {name}.", expr.name)
+            # Past a few classes the site is megamorphic and just does the lookup
+            if len(expr.method_cache) < MAX_CACHED_CLASSES:
+                expr.method_cache[klass] = method
+
+        arguments = [self._evaluate(arg) for arg in expr.arguments]
+        arity = method.arity()
+        if arity != len(arguments):
+            raise LoxRuntimeError(
+                f"Wrong number of args, expected {arity} but recieved {len(arguments)}",
+                expr.paren,
+            )
+        if expr.is_tail:
+            return TailCall(method, method._frame(obj, arguments), obj)
+        self._call_site = expr.paren
+        try:
+            return method.invoke(self, obj, arguments)
         except (LoxAssertFailedError) as err:
             err.line = expr.paren.line
             raise err
@@ -289,6 +675,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_get_expr(self, expr: "Get") -> Any:
         obj = self._evaluate(expr.obj)
         if isinstance(obj, LoxInstance):
+            shape = obj._shape
+            if shape is expr.cached_shape:
+                return obj._values[expr.cached_slot]
+
+            slot = shape.slots.get(expr.name.value)
+            if slot != None:
+                expr.cached_shape = shape
+                expr.cached_slot = slot
+                return obj._values[slot]
             return obj.get(expr.name)
 
         raise LoxRuntimeError("Can only call propertes on objects", expr.name)
@@ -300,15 +695,24 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return expr.value
 
     def visit_logical_expr(self, expr: "Logical") -> Any:
-        left_val = self._evaluate(expr.left)
+        # The operator is all that matters, so quicken straight away
         if expr.operator.token_type == TokenType.OR:
-            if left_val:
-                return left_val
+            expr.__class__ = Or
         elif expr.operator.token_type == TokenType.AND:
-            if not left_val:
-                return left_val
+            expr.__class__ = And
+        return expr.accept(self)
 
-        return self._evaluate(expr.right)
+    def visit_and_expr(self, expr: "And") -> Any:
+        left_val = expr.left.accept(self)
+        if not left_val:
+            return left_val
+        return expr.right.accept(self)
+
+    def visit_or_expr(self, expr: "Or") -> Any:
+        left_val = expr.left.accept(self)
+        if left_val:
+            return left_val
+        return expr.right.accept(self)
 
     def visit_set_expr(self, expr: "Set") -> Any:
         obj = self._evaluate(expr.object)
@@ -316,17 +720,38 @@ class Interpreter(ExprVisitor, StmtVisitor):
             raise LoxRuntimeError("Only instances have fields", expr.name)
 
         val = self._evaluate(expr.value)
+        shape = obj._shape
+        if shape is expr.cached_shape:
+            # Either overwrites a field or adds the next one and moves to the new shape
+            values = obj._values
+            if expr.cached_slot == len(values):
+                values.append(val)
+            else:
+                values[expr.cached_slot] = val
+            obj._shape = expr.cached_transition
+            return val
+
         obj.set(expr.name.value, val)
+        if shape.shared and obj._shape.shared:
+            # An unshared Shape belongs to one instance, handing it to another
+            # instance that reaches the same shape here would merge their fields
+            expr.cached_shape = shape
+            expr.cached_slot = obj._shape.slots[expr.name.value]
+            expr.cached_transition = obj._shape
         return val
 
     def visit_super_expr(self, expr: "Super") -> Any:
-        dist = self._locals.get(expr.name)
-        superclass: LoxRuntimeClass = self._env.get_at(dist, "super")
-        obj = self._env.get_at(dist - 1, "this")
+        superclass: LoxRuntimeClass = self._lookup_variable(expr.name, expr)
+        obj = self._lookup_variable(expr.this.name, expr.this)
+
+        if superclass is expr.cached_class:
+            return expr.cached_method.bind(obj)
 
         method = superclass.find_method(expr.method.value)
         if method == None:
             raise LoxRuntimeError(f"Undefined property {expr.method.value}", expr.name)
+        expr.cached_class = superclass
+        expr.cached_method = method
         return method.bind(obj)
 
     def visit_this_expr(self, expr: "This") -> Any:
@@ -334,6 +759,11 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visit_unary_expr(self, expr: "Unary") -> Any:
         right = self._evaluate(expr.right)
+        if not expr.deoptimized:
+            _quicken_unary(expr, right)
+        return self._unary(expr, right)
+
+    def _unary(self, expr: "Unary", right: Any) -> Any:
         op_type = expr.operator.token_type
 
         if op_type == TokenType.MINUS:
@@ -344,21 +774,45 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         raise InvalidOperatorError(expr.operator, right)
 
+    def visit_float_negate_expr(self, expr: "FloatNegate") -> Any:
+        right = expr.right.accept(self)
+        if type(right) is float:
+            return -right
+        expr.__class__ = Unary
+        expr.deoptimized = True
+        return self._unary(expr, right)
+
+    def visit_unchecked_negate_expr(self, expr: "UncheckedNegate") -> Any:
+        return -expr.right.accept(self)
+
+    def visit_not_expr(self, expr: "Not") -> Any:
+        return not expr.right.accept(self)
+
     def visit_variable_expr(self, expr: "Variable") -> Any:
         return self._lookup_variable(expr.name, expr)
 
     def _lookup_variable(self, name: Token, expr: Variable):
-        dist = self._locals.get(expr.name)
-        if dist != None:
-            return self._env.get_at(dist, name.value)
-
-        return self._globals.get(name)
+        slot = expr.slot
+        if slot != None:
+            if expr.captured:
+                return self._env.values[slot].value
+            return self._env.values[slot]
+        if expr.upvalue != None:
+            return self._env.upvalues[expr.upvalue].value
+
+        globals_ = self._globals
+        if expr.cache_version == globals_.version:
+            return expr.cached_cell.value
+
+        cell = globals_.get_cell(name)
+        expr.cache_version = globals_.version
+        expr.cached_cell = cell
+        return cell.value
 
     def _check_num_operands(self, operator: Token, *operands: Any):
-        not_nums = [num for num in operands if not isinstance(num, float)]
-
-        if len(not_nums) > 0:
-            raise InvalidOperatorError(operator, *operands)
+        for operand in operands:
+            if type(operand) is not float:
+                raise InvalidOperatorError(operator, *operands)
 
     # Stmt
 
@@ -374,41 +828,163 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if stmt.initializer != None:
             val = self._evaluate(stmt.initializer)
 
-        self._env.define(stmt.name.value, val)
+        slot = stmt.slot
+        if slot == None:
+            self._globals.define(stmt.name.value, val)
+        elif stmt.captured:
+            # A new Cell every time, a closure made in an earlier loop iteration
+            # keeps the variable it saw
+            self._env.values[slot] = Cell(val)
+        else:
+            self._env.values[slot] = val
+
+    def _declare(self, stmt: "Fun | LoxClass") -> None:
+        # Closures made before _define, the function itself, need the Cell already
+        if stmt.slot != None and stmt.captured:
+            self._env.values[stmt.slot] = Cell()
+
+    def _define(self, stmt: "Fun | LoxClass", val: Any) -> None:
+        slot = stmt.slot
+        if slot == None:
+            self._globals.define(stmt.name.value, val)
+        elif stmt.captured:
+            self._env.values[slot].value = val
+        else:
+            self._env.values[slot] = val
 
-    def visit_block_stmt(self, stmt: "Block") -> None:
-        self._execute_block(stmt.statements, Environment(self._env))
+    def visit_block_stmt(self, stmt: "Block") -> ExecResult:
+        if stmt.scope_size == 0:
+            # Nothing declared or its locals are in the Frame of the function it's in
+            for statement in stmt.statements:
+                result = statement.accept(self)
+                if result is not None:
+                    return result
+            return None
+        return self._execute_block(stmt.statements, Frame(stmt.scope_size))
 
-    def _execute_block(self, statements: list[Stmt], env: Environment) -> None:
+    def _execute_block(self, statements: list[Stmt], env: Frame) -> ExecResult:
 
         prev = self._env
         try:
             self._env = env
             for statement in statements:
-                self.execute(statement)
+                result = statement.accept(self)
+                if result is not None:
+                    return result
+            return None
         finally:
             self._env = prev
 
-    def visit_if_stmt(self, stmt: "If") -> None:
+    def visit_if_stmt(self, stmt: "If") -> ExecResult:
         if self._evaluate(stmt.condition):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch != None:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
+        return None
 
-    def visit_while_stmt(self, stmt: "While") -> Any:
+    def visit_while_stmt(self, stmt: "While") -> ExecResult:
         while self._evaluate(stmt.condition):
-            self.execute(stmt.body)
+            result = self.execute(stmt.body)
+            if result is not None:
+                if result is BREAK:
+                    break
+                if result is not CONTINUE:
+                    return result
+        return None
+
+    def visit_break_stmt(self, stmt: "Break") -> ExecResult:
+        return BREAK
+
+    def visit_continue_stmt(self, stmt: "Continue") -> ExecResult:
+        return CONTINUE
+
+    def visit_for_stmt(self, stmt: "For") -> ExecResult:
+        if stmt.scope_size == 0:
+            return self._for(stmt)
+
+        prev = self._env
+        try:
+            self._env = Frame(stmt.scope_size)
+            return self._for(stmt)
+        finally:
+            self._env = prev
+
+    def _for(self, stmt: "For") -> ExecResult:
+        if stmt.initializer != None:
+            self.execute(stmt.initializer)
+
+        counter = stmt.condition.left if stmt.counted else None
+        if (
+            counter != None
+            and not counter.captured
+            and type(self._env.values[counter.slot]) is float
+        ):
+            return self._counted_for(stmt)
+
+        condition = stmt.condition
+        increment = stmt.increment
+        body = stmt.body
+        while self._evaluate(condition):
+            result = self.execute(body)
+            if result is not None:
+                if result is BREAK:
+                    break
+                if result is not CONTINUE:
+                    return result
+            if increment != None:
+                self._evaluate(increment)
+        return None
+
+    def _counted_for(self, stmt: "For") -> ExecResult:
+        # The counter lives in a python float, the Frame slot only gets a copy for
+        # the body to read, and the increment and comparison skip the AST
+        condition = stmt.condition
+        compare = _FLOAT_OPERATORS[condition.operator.token_type]
+        bound = condition.right
+        step = stmt.increment.value
+        delta = step.right.value
+        if step.operator.token_type == TokenType.MINUS:
+            delta = -delta
+        body = stmt.body
+        values = self._env.values
+        slot = condition.left.slot
+
+        counter = values[slot]
+        while True:
+            limit = bound.accept(self)
+            if type(limit) is not float:
+                raise InvalidOperatorError(condition.operator, counter, limit)
+            if not compare(counter, limit):
+                return None
+            result = body.accept(self)
+            if result is not None:
+                if result is BREAK:
+                    return None
+                if result is not CONTINUE:
+                    return result
+            counter += delta
+            values[slot] = counter
 
     def visit_fun_stmt(self, stmt: "Fun") -> Any:
-        func = LoxFunction(stmt, self._env)
-        self._env.define(stmt.name.value, func)
+        self._declare(stmt)
+        func = self._memoize(LoxFunction(stmt, capture_upvalues(stmt, self._env)))
+        self._define(stmt, func)
+
+    def _memoize(self, function: LoxFunction) -> LoxFunction:
+        declaration = function._declaration
+        if declaration.is_pure and self._memo_size > 0:
+            function._memo = MemoCache(
+                declaration.name.value, self._memo_size, self._memo_policy
+            )
+            self.memo_caches.append(function._memo)
+        return function
 
-    def visit_return_stmt(self, stmt: "Return") -> Any:
+    def visit_return_stmt(self, stmt: "Return") -> ExecResult:
         value = None
         if stmt.value != None:
             value = self._evaluate(stmt.value)
 
-        raise ReturnErr(value)
+        return (value,)
 
     def resolve(self, expr: Expr, depth: int) -> None:
         self._locals[expr.name] = depth
@@ -421,21 +997,58 @@ class Interpreter(ExprVisitor, StmtVisitor):
             if type(superclass) != LoxRuntimeClass:
                 raise LoxRuntimeError("Superclass must be a class.", stmt.name)
 
-        self._env.define(stmt.name.value, None)
+        self._declare(stmt)
+        self._define(stmt, None)
 
+        env = self._env
         if stmt.superclass != None:
-            self._env = Environment(self._env)
-            self._env.define("super", superclass)
+            if stmt.scope_size > 0:
+                env = Frame(stmt.scope_size)
+            env.values[stmt.super_slot] = Cell(superclass)
 
         methods = dict()
         for method in stmt.methods:
             is_init = method.name.value == "init"
-            func = LoxFunction(method, self._env, is_init)
+            func = LoxFunction(method, capture_upvalues(method, env), is_init)
             methods[method.name.value] = func
 
         klass = LoxRuntimeClass(stmt.name.value, superclass, methods)
 
-        if superclass != None:
-            self._env = self._env._enclosing
+        self._define(stmt, klass)
 
-        self._env.assign(stmt.name, klass)
+
+def run_with_deep_stack(
+    function: Callable[[], Any],
+    max_call_depth: int,
+    frames_per_call: int = PY_FRAMES_PER_CALL,
+) -> Any:
+    """
+    Runs function on a thread with a C stack and recursion limit big enough for
+    max_call_depth nested Lox calls, so the depth limit is the only one that applies.
+    """
+    py_frames = max_call_depth * frames_per_call + PY_FRAMES_HEADROOM
+    result = []
+    errors = []
+
+    def run() -> None:
+        try:
+            result.append(function())
+        except BaseException as err:
+            errors.append(err)
+
+    old_limit = sys.getrecursionlimit()
+    old_stack_size = threading.stack_size(
+        max(py_frames * STACK_BYTES_PER_PY_FRAME, threading.stack_size())
+    )
+    sys.setrecursionlimit(py_frames)
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(old_stack_size)
+        sys.setrecursionlimit(old_limit)
+
+    if len(errors) > 0:
+        raise errors[0]
+    return result[0]
@@ -1,5 +1,18 @@
-from stmt import Print, Stmt, Expression, Var, Block, If, While, Fun, Return, LoxClass
-from types import FunctionType
+from stmt import (
+    Print,
+    Stmt,
+    Expression,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
 from lox_token import Token, TokenType
 from expr import (
     Binary,
@@ -12,11 +25,13 @@ from expr import (
     Logical,
     Call,
     Get,
+    Invoke,
     Set,
     This,
     Super,
 )
 from result import Result
+from typing import Any, Iterable
 
 
 class ParseError(Exception):
@@ -31,16 +46,44 @@ class ParseError(Exception):
 
 _MAX_NUM_ARGS = 255
 
+# How tightly each infix operator binds, everything of precedence _AND_PRECEDENCE
+# or lower builds a Logical and everything above it a Binary
+_LOWEST_PRECEDENCE = 1
+_AND_PRECEDENCE = 2
+_PRECEDENCES = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.BANG_EQUAL: 3,
+    TokenType.EQUAL_EQUAL: 3,
+    TokenType.GREATER: 4,
+    TokenType.GREATER_EQUAL: 4,
+    TokenType.LESS: 4,
+    TokenType.LESS_EQUAL: 4,
+    TokenType.MINUS: 5,
+    TokenType.PLUS: 5,
+    TokenType.SLASH: 6,
+    TokenType.STAR: 6,
+}
+_KEYWORD_LITERALS = {TokenType.FALSE: False, TokenType.TRUE: True, TokenType.NIL: None}
+
 
 class Parser:
-    tokens: list[Token]
-    curr_index: int
+    # The parser only ever looks at the current and previous token, so it pulls
+    # the rest from the stream as it goes instead of holding them all
+    tokens: Iterable[Token]
+    current: Token
+    previous: Token
     errors: list[ParseError]
-
-    def __init__(self, tokens: list[Token]) -> None:
-        self.curr_index = 0
-        self.tokens = tokens
+    # Nothing changes a Literal once it's parsed, so every use of a value in the
+    # program shares one node, keyed by type too since 1 == 1.0 == True
+    constants: dict[tuple[type, Any], Literal]
+
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        self.tokens = iter(tokens)
+        self.current = next(self.tokens)
+        self.previous = None
         self.errors = []
+        self.constants = dict()
 
     def parse(self) -> Result[list[Stmt], list[ParseError]]:
 
@@ -134,6 +177,12 @@ class Parser:
         if self._match(TokenType.WHILE):
             return self._while_statement()
 
+        if self._match(TokenType.BREAK):
+            return self._break_statement()
+
+        if self._match(TokenType.CONTINUE):
+            return self._continue_statement()
+
         if self._match(TokenType.LEFT_BRACE):
             return Block(self._block())
 
@@ -161,17 +210,9 @@ class Parser:
         self._consume(TokenType.RIGHT_PAREN, "Expected ) after for clauses")
 
         body = self._statement()
-        if increment != None:
-            body = Block([body, Expression(increment)])
-
         if condition == None:
-            condition = Literal(True)
-        body = While(condition, body)
-
-        if initializer != None:
-            body = Block([initializer, body])
-
-        return body
+            condition = self._literal(True)
+        return For(initializer, condition, increment, body)
 
     def _if_statement(self) -> Stmt:
         self._consume(TokenType.LEFT_PAREN, "Expected ( after if")
@@ -212,6 +253,16 @@ class Parser:
         self._consume(TokenType.SEMICOLON, "Expected ';' after return value")
         return Return(keyword, value)
 
+    def _break_statement(self) -> Stmt:
+        keyword = self._previous()
+        self._consume(TokenType.SEMICOLON, "Expected ';' after break")
+        return Break(keyword)
+
+    def _continue_statement(self) -> Stmt:
+        keyword = self._previous()
+        self._consume(TokenType.SEMICOLON, "Expected ';' after continue")
+        return Continue(keyword)
+
     def _expression_statement(self) -> Stmt:
         value = self._expression()
         self._consume(TokenType.SEMICOLON, "Expected ';' after expression")
@@ -221,9 +272,9 @@ class Parser:
         return self._assignment()
 
     def _assignment(self) -> Expr:
-        expr = self._or()
-        if self._match(TokenType.EQUAL):
-            equals = self._previous()
+        expr = self._infix(_LOWEST_PRECEDENCE)
+        if self.current.token_type == TokenType.EQUAL:
+            equals = self._advance()
             value = self._assignment()
 
             if type(expr) == Variable:
@@ -235,63 +286,26 @@ class Parser:
             raise self._error(equals, "Invalid assignment")
         return expr
 
-    def _or(self) -> Expr:
-        return self._match_left_associate_logical(self._and, TokenType.OR)
-
-    def _and(self) -> Expr:
-        return self._match_left_associate_logical(self._equality, TokenType.AND)
-
-    def _match_left_associate_logical(
-        self, operand_method: FunctionType, *types: TokenType
-    ):
-        expr = operand_method()
-
-        while self._match(*types):
-            operator = self._previous()
-            right = operand_method()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def _equality(self) -> Expr:
-        return self._match_left_associate_binary(
-            self._comparison, TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL
-        )
-
-    def _match_left_associate_binary(
-        self, operand_method: FunctionType, *types: TokenType
-    ):
-        expr = operand_method()
-
-        while self._match(*types):
-            operator = self._previous()
-            right = operand_method()
-            expr = Binary(expr, operator, right)
+    def _infix(self, min_precedence: int) -> Expr:
+        # Precedence climbing, the right operand only takes operators that bind
+        # tighter than this one so operators of the same precedence associate left
+        expr = self._unary()
+        precedence = _PRECEDENCES.get(self.current.token_type, 0)
+        while precedence >= min_precedence:
+            operator = self._advance()
+            right = self._infix(precedence + 1)
+            if precedence <= _AND_PRECEDENCE:
+                expr = Logical(expr, operator, right)
+            else:
+                expr = Binary(expr, operator, right)
+            precedence = _PRECEDENCES.get(self.current.token_type, 0)
 
         return expr
 
-    def _comparison(self) -> Expr:
-        return self._match_left_associate_binary(
-            self._term,
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-        )
-
-    def _term(self) -> Expr:
-        return self._match_left_associate_binary(
-            self._factor, TokenType.MINUS, TokenType.PLUS
-        )
-
-    def _factor(self) -> Expr:
-        return self._match_left_associate_binary(
-            self._unary, TokenType.SLASH, TokenType.STAR
-        )
-
     def _unary(self) -> Expr:
-        if self._match(TokenType.BANG, TokenType.MINUS):
-            operator = self._previous()
+        token_type = self.current.token_type
+        if token_type == TokenType.BANG or token_type == TokenType.MINUS:
+            operator = self._advance()
             right = self._unary()
             return Unary(operator, right)
 
@@ -300,9 +314,12 @@ class Parser:
     def _call(self) -> Expr:
         expr = self._primary()
         while True:
-            if self._match(TokenType.LEFT_PAREN):
+            token_type = self.current.token_type
+            if token_type == TokenType.LEFT_PAREN:
+                self._advance()
                 expr = self._finish_call(expr)
-            elif self._match(TokenType.DOT):
+            elif token_type == TokenType.DOT:
+                self._advance()
                 name = self._consume(
                     TokenType.IDENTIFIER, "Expected property named after ."
                 )
@@ -328,39 +345,52 @@ class Parser:
             TokenType.RIGHT_PAREN, "Expected closing ) after function call"
         )
 
+        if type(callee) == Get:
+            return Invoke(callee.obj, callee.name, paren, arguments)
         return Call(callee, paren, arguments)
 
     def _primary(self) -> Expr:
-        if self._match(TokenType.FALSE):
-            return Literal(False)
-        if self._match(TokenType.TRUE):
-            return Literal(True)
-        if self._match(TokenType.NIL):
-            return Literal(None)
-
-        if self._match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self._previous().value)
-
-        if self._match(TokenType.SUPER):
-            name = self._previous()
+        token = self.current
+        token_type = token.token_type
+        if token_type == TokenType.NUMBER or token_type == TokenType.STRING:
+            self._advance()
+            return self._literal(token.value)
+
+        if token_type == TokenType.IDENTIFIER:
+            self._advance()
+            return Variable(token)
+
+        if token_type in _KEYWORD_LITERALS:
+            self._advance()
+            return self._literal(_KEYWORD_LITERALS[token_type])
+
+        if token_type == TokenType.SUPER:
+            self._advance()
             self._consume(TokenType.DOT, "Expected '.' after 'super'.")
             method = self._consume(
                 TokenType.IDENTIFIER, "Expected superclass method name"
             )
-            return Super(name, method)
-
-        if self._match(TokenType.THIS):
-            return This(self._previous())
+            return Super(token, method)
 
-        if self._match(TokenType.IDENTIFIER):
-            return Variable(self._previous())
+        if token_type == TokenType.THIS:
+            self._advance()
+            return This(token)
 
-        if self._match(TokenType.LEFT_PAREN):
+        if token_type == TokenType.LEFT_PAREN:
+            self._advance()
             expr = self._expression()
             self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression")
             return Grouping(expr)
 
-        raise self._error(self._peek(), "Expect expression.")
+        raise self._error(token, "Expect expression.")
+
+    def _literal(self, value: Any) -> Literal:
+        key = (type(value), value)
+        literal = self.constants.get(key)
+        if literal == None:
+            literal = Literal(value)
+            self.constants[key] = literal
+        return literal
 
     def _consume(self, type: TokenType, err_msg: str) -> Token:
         if self._check(type):
@@ -389,6 +419,8 @@ class Parser:
                 TokenType.WHILE,
                 TokenType.PRINT,
                 TokenType.RETURN,
+                TokenType.BREAK,
+                TokenType.CONTINUE,
             ]:
                 return
 
@@ -409,15 +441,16 @@ class Parser:
         return self._peek().token_type == type
 
     def _is_at_end(self) -> bool:
-        return self._peek().token_type == TokenType.EOF
+        return self.current.token_type == TokenType.EOF
 
     def _peek(self) -> Token:
-        return self.tokens[self.curr_index]
+        return self.current
 
     def _previous(self) -> Token:
-        return self.tokens[self.curr_index - 1]
+        return self.previous
 
     def _advance(self) -> Token:
-        if not self._is_at_end():
-            self.curr_index += 1
-        return self._previous()
+        if self.current.token_type != TokenType.EOF:
+            self.previous = self.current
+            self.current = next(self.tokens)
+        return self.previous
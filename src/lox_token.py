@@ -41,7 +41,9 @@ class TokenType(Enum):
 
     # Keywords
     AND = "and"
+    BREAK = "break"
     CLASS = "class"
+    CONTINUE = "continue"
     ELSE = "else"
     FALSE = "false"
     FUN = "fun"
@@ -61,52 +63,66 @@ class TokenType(Enum):
     EOF = auto()
 
     def is_one_char_token(char: str) -> bool:
-        single_char_tokens = {
-            TokenType.LEFT_PAREN.value,
-            TokenType.RIGHT_PAREN.value,
-            TokenType.LEFT_BRACE.value,
-            TokenType.RIGHT_BRACE.value,
-            TokenType.COMMA.value,
-            TokenType.DOT.value,
-            TokenType.MINUS.value,
-            TokenType.PLUS.value,
-            TokenType.SEMICOLON.value,
-            TokenType.STAR.value,
-        }
-        return char in single_char_tokens
+        return char in _ONE_CHAR_TOKENS
 
     def is_token_combinable_with_equal(char: str) -> bool:
-        tokens_combinable_with_equal = {
-            TokenType.BANG.value,
-            TokenType.EQUAL.value,
-            TokenType.GREATER.value,
-            TokenType.LESS.value,
-        }
-        return char in tokens_combinable_with_equal
+        return char in _TOKENS_COMBINABLE_WITH_EQUAL
 
     def is_keyword_token(char: str) -> bool:
-        keyword_tokens = {
-            TokenType.AND.value,
-            TokenType.CLASS.value,
-            TokenType.ELSE.value,
-            TokenType.FALSE.value,
-            TokenType.FUN.value,
-            TokenType.FOR.value,
-            TokenType.IF.value,
-            TokenType.NIL.value,
-            TokenType.OR.value,
-            TokenType.PRINT.value,
-            TokenType.RETURN.value,
-            TokenType.SUPER.value,
-            TokenType.THIS.value,
-            TokenType.TRUE.value,
-            TokenType.VAR.value,
-            TokenType.WHILE.value,
-        }
-        return char in keyword_tokens
+        return char in _KEYWORD_TOKENS
+
+
+# Built once, the scanner checks every character against these
+_ONE_CHAR_TOKENS = frozenset(
+    {
+        TokenType.LEFT_PAREN.value,
+        TokenType.RIGHT_PAREN.value,
+        TokenType.LEFT_BRACE.value,
+        TokenType.RIGHT_BRACE.value,
+        TokenType.COMMA.value,
+        TokenType.DOT.value,
+        TokenType.MINUS.value,
+        TokenType.PLUS.value,
+        TokenType.SEMICOLON.value,
+        TokenType.STAR.value,
+    }
+)
+_TOKENS_COMBINABLE_WITH_EQUAL = frozenset(
+    {
+        TokenType.BANG.value,
+        TokenType.EQUAL.value,
+        TokenType.GREATER.value,
+        TokenType.LESS.value,
+    }
+)
+_KEYWORD_TOKENS = frozenset(
+    {
+        TokenType.AND.value,
+        TokenType.BREAK.value,
+        TokenType.CLASS.value,
+        TokenType.CONTINUE.value,
+        TokenType.ELSE.value,
+        TokenType.FALSE.value,
+        TokenType.FUN.value,
+        TokenType.FOR.value,
+        TokenType.IF.value,
+        TokenType.NIL.value,
+        TokenType.OR.value,
+        TokenType.PRINT.value,
+        TokenType.RETURN.value,
+        TokenType.SUPER.value,
+        TokenType.THIS.value,
+        TokenType.TRUE.value,
+        TokenType.VAR.value,
+        TokenType.WHILE.value,
+    }
+)
 
 
 class Token:
+    # The AST keeps tokens alive for the whole run, slots keep each one small
+    __slots__ = ("token_type", "value", "line")
+
     token_type: TokenType
     value: Any
     line: int
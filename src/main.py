@@ -1,8 +1,36 @@
+import os
 import sys
-from scanner import Scanner
+import argparse
+from typing import TextIO, Union
+from scanner import Scanner, SCANNER_MODES
 from lox_parser import Parser
-from interpreter import Interpreter
+from result import Result
+from interpreter import (
+    Interpreter,
+    DEFAULT_MAX_CALL_DEPTH,
+    DEFAULT_MEMO_SIZE,
+    MEMO_POLICIES,
+    run_with_deep_stack,
+)
 from resolver import Resolver
+from purity import PurityAnalyzer
+from type_inference import TypeInference
+from optimizer import (
+    optimize,
+    Inliner,
+    DEFAULT_INLINE_SIZE,
+    DEFAULT_INLINE_SITES,
+)
+from compiler import Compiler
+from vm import VM
+from closure_compiler import ClosureInterpreter
+from transpiler import Transpiler, TranspiledProgram, CodeCache
+
+
+BACKENDS = ["interpreter", "vm", "closure", "python"]
+# Transpiled Lox calls are plain python calls, plus _lox_call for anything dynamic
+TRANSPILED_FRAMES_PER_CALL = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "loxo")
 
 
 def read_in_file(file_name: str) -> str:
@@ -10,42 +38,254 @@ def read_in_file(file_name: str) -> str:
         return file.read()
 
 
+def parse_source(
+    source: Union[str, TextIO], scanner_mode: str = "regex"
+) -> tuple[Scanner, Result]:
+    # The parser pulls tokens from the scanner as it needs them, so the token list
+    # and, for a file, the source are never held whole
+    scanner = Scanner(source, scanner_mode)
+    return scanner, Parser(scanner.stream()).parse()
+
+
 def print_error(err: str):
     print(f"\033[91m{err}\033[0m")
 
 
+def resolve(
+    interpreter: Interpreter, statements: list, inliner: Inliner = None
+) -> list:
+    """
+    Resolves and optimizes statements, then resolves the optimized tree again so
+    scope depths and slots match where the optimizer left every node. Type
+    inference runs last, on the tree the backends will run.
+    """
+    Resolver(interpreter)._resolve_stmts(statements)
+    statements = optimize(statements, inliner)
+    Resolver(interpreter)._resolve_stmts(statements)
+    TypeInference().infer(statements)
+    return statements
+
+
+def run_tree_walker(
+    statements: list,
+    max_depth: int = DEFAULT_MAX_CALL_DEPTH,
+    memo_size: int = DEFAULT_MEMO_SIZE,
+    memo_policy: str = "lru",
+    inliner: Inliner = None,
+) -> Interpreter:
+    interpreter = Interpreter(max_depth, memo_size, memo_policy)
+    return _run_interpreter(interpreter, statements, max_depth, inliner)
+
+
+def run_closure_compiled(
+    statements: list,
+    max_depth: int = DEFAULT_MAX_CALL_DEPTH,
+    memo_size: int = DEFAULT_MEMO_SIZE,
+    memo_policy: str = "lru",
+    inliner: Inliner = None,
+) -> Interpreter:
+    interpreter = ClosureInterpreter(max_depth, memo_size, memo_policy)
+    return _run_interpreter(interpreter, statements, max_depth, inliner)
+
+
+def _run_interpreter(
+    interpreter: Interpreter, statements: list, max_depth: int, inliner: Inliner
+) -> Interpreter:
+    statements = resolve(interpreter, statements, inliner)
+    PurityAnalyzer().analyze(statements)
+    run_with_deep_stack(lambda: interpreter.interpret(statements), max_depth)
+    return interpreter
+
+
+def print_memo_stats(interpreter: Interpreter):
+    for cache in interpreter.memo_caches:
+        print(f"{cache.name}: {cache.hits} hits, {cache.misses} misses")
+
+
+def run_vm(
+    statements: list,
+    max_depth: int = DEFAULT_MAX_CALL_DEPTH,
+    inliner: Inliner = None,
+):
+    # The resolver still runs first so both backends report the same static errors
+    statements = resolve(Interpreter(), statements, inliner)
+    script = Compiler().compile(statements)
+    VM(max_frames=max_depth).interpret(script)
+
+
+def transpile(statements: list, inliner: Inliner = None) -> TranspiledProgram:
+    interpreter = Interpreter()
+    statements = resolve(interpreter, statements, inliner)
+    return Transpiler(interpreter._locals).transpile(statements)
+
+
+def run_program(program: TranspiledProgram, max_depth: int = DEFAULT_MAX_CALL_DEPTH):
+    run_with_deep_stack(program.run, max_depth, TRANSPILED_FRAMES_PER_CALL)
+
+
+def run_transpiled(
+    statements: list,
+    max_depth: int = DEFAULT_MAX_CALL_DEPTH,
+    inliner: Inliner = None,
+):
+    run_program(transpile(statements, inliner), max_depth)
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(prog=argv[0])
+    arg_parser.add_argument("lox_file")
+    arg_parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="interpreter",
+        help="tree-walking interpreter, bytecode VM, closure compiled tree"
+        " or transpiled to python",
+    )
+    arg_parser.add_argument(
+        "--scanner",
+        choices=SCANNER_MODES,
+        default="regex",
+        help="scan with one compiled pattern over the whole file or a character"
+        " at a time",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="where the python backend caches compiled programs",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't read or write the python backend's cache",
+    )
+    arg_parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=DEFAULT_MAX_CALL_DEPTH,
+        help="most nested Lox calls before a stack overflow error, tail calls"
+        " don't count",
+    )
+    arg_parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=DEFAULT_MEMO_SIZE,
+        help="results each pure function memoizes on the interpreter and closure"
+        " backends, 0 turns memoization off",
+    )
+    arg_parser.add_argument(
+        "--memo-policy",
+        choices=MEMO_POLICIES,
+        default="lru",
+        help="which memoized result to evict once a function's cache is full",
+    )
+    arg_parser.add_argument(
+        "--memo-stats",
+        action="store_true",
+        help="print each memoized function's cache hits and misses after running",
+    )
+    arg_parser.add_argument(
+        "--inline-size",
+        type=int,
+        default=DEFAULT_INLINE_SIZE,
+        help="most nodes in the return value of a function inlined into its calls,"
+        " 0 only inlines functions with an empty body",
+    )
+    arg_parser.add_argument(
+        "--inline-sites",
+        type=int,
+        default=DEFAULT_INLINE_SITES,
+        help="most calls each function is inlined into, 0 turns inlining off",
+    )
+    arg_parser.add_argument(
+        "--inline-report",
+        action="store_true",
+        help="print every call that was inlined after running",
+    )
+    return arg_parser.parse_args(argv[1:])
+
+
+def optimizer_settings(args: argparse.Namespace) -> tuple:
+    # Every switch that changes what the optimizer does to a program, the python
+    # backend's cache keeps apart programs compiled with different ones
+    return (args.inline_size, args.inline_sites)
+
+
 def main(argv: list):
-    if len(argv) != 2:
+    if len(argv) < 2:
         print("File not provided")
         return
 
-    source_code = read_in_file(argv[1])
-    scanner = Scanner(source_code)
-    scanner_result = scanner.scan_tokens()
+    args = parse_args(argv)
+
+    cache = None
+    # A cached program has no record of what was inlined into it
+    if args.backend == "python" and not args.no_cache and not args.inline_report:
+        # The cache is keyed by the whole source, everything else streams the file
+        source_code = read_in_file(args.lox_file)
+        cache = CodeCache(args.cache_dir, optimizer_settings(args))
+        program = cache.get(source_code)
+        if program != None:
+            try:
+                run_program(program, args.max_depth)
+            except Exception as err:
+                print(err)
+            return
+
+    if cache != None:
+        scanner, parser_result = parse_source(source_code, args.scanner)
+    else:
+        with open(args.lox_file) as file:
+            scanner, parser_result = parse_source(file, args.scanner)
 
-    if scanner_result.failure:
+    # A scanner error can throw the parser off, so it's reported on its own
+    if len(scanner.errors) > 0:
         print_error("Scanner failed!")
-        for err in scanner_result.error:
+        for err in scanner.errors:
             print(err.message)
         return
 
-    parser = Parser(scanner_result.value)
-    parser_result = parser.parse()
-
     if parser_result.failure:
         print_error("Parser failed!")
         for err in parser_result.error:
             print(err.message)
         return
 
+    interpreter = None
+    inliner = Inliner(args.inline_size, args.inline_sites)
     try:
-        interpreter = Interpreter()
-        resolver = Resolver(interpreter)
-        resolver._resolve_stmts(parser_result.value)
-        interpreter.interpret(parser_result.value)
+        if args.backend == "vm":
+            run_vm(parser_result.value, args.max_depth, inliner)
+        elif args.backend == "closure":
+            interpreter = run_closure_compiled(
+                parser_result.value,
+                args.max_depth,
+                args.memo_size,
+                args.memo_policy,
+                inliner,
+            )
+        elif args.backend == "python":
+            program = transpile(parser_result.value, inliner)
+            if cache != None:
+                cache.put(source_code, program)
+            run_program(program, args.max_depth)
+        else:
+            interpreter = run_tree_walker(
+                parser_result.value,
+                args.max_depth,
+                args.memo_size,
+                args.memo_policy,
+                inliner,
+            )
     except Exception as err:
         print(err)
 
+    if args.inline_report:
+        for line in inliner.report():
+            print(line)
+
+    if args.memo_stats and interpreter != None:
+        print_memo_stats(interpreter)
+
 
 if __name__ == "__main__":
     main(sys.argv)
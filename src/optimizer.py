@@ -0,0 +1,903 @@
+import copy
+import math
+from typing import Any
+from expr import (
+    ExprVisitor,
+    Expr,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Stmt,
+    Expression,
+    Print,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+from interpreter import Interpreter
+from lox_token import Token, TokenType
+from runtime_errors import LoxRuntimeError
+
+
+# Most nodes in an inlined function's return value, and most calls each function
+# is inlined into
+DEFAULT_INLINE_SIZE = 16
+DEFAULT_INLINE_SITES = 64
+# Most expression nodes in a loop LoopInvariantCodeMotion peels, the peeled
+# iteration is a second copy of the loop
+MAX_PEELED_SIZE = 256
+
+
+def _literal(value: Any, expr: Expr) -> Expr:
+    # Only values a literal in the source could have, so every backend can emit it
+    if type(value) is float and not math.isfinite(value):
+        return expr
+    return Literal(value)
+
+
+class ASTTransformer(ExprVisitor, StmtVisitor):
+    """
+    Base for passes that rewrite a resolved tree. Every visit returns the node to
+    use in place of the one visited, by default the same node with its children
+    transformed. A statement visit can return None to remove the statement.
+    """
+
+    def transform(self, statements: list[Stmt]) -> list[Stmt]:
+        return self._stmts(statements)
+
+    def _expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def _stmt(self, stmt: Stmt) -> Stmt:
+        return stmt.accept(self)
+
+    def _stmts(self, statements: list[Stmt]) -> list[Stmt]:
+        transformed = []
+        for statement in statements:
+            statement = self._stmt(statement)
+            if statement != None:
+                transformed.append(statement)
+        return transformed
+
+    def _branch(self, stmt: Stmt) -> Stmt:
+        # If, While and For hold exactly one statement, a removed one becomes an
+        # empty block
+        stmt = self._stmt(stmt)
+        return Block([]) if stmt == None else stmt
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> Expr:
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: "Binary") -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_call_expr(self, expr: "Call") -> Expr:
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = [self._expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: "Get") -> Expr:
+        expr.obj = self._expr(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: "Grouping") -> Expr:
+        expr.expression = self._expr(expr.expression)
+        return expr
+
+    def visit_invoke_expr(self, expr: "Invoke") -> Expr:
+        expr.obj = self._expr(expr.obj)
+        expr.arguments = [self._expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visit_literal_expr(self, expr: "Literal") -> Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: "Logical") -> Expr:
+        expr.left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_set_expr(self, expr: "Set") -> Expr:
+        expr.object = self._expr(expr.object)
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_super_expr(self, expr: "Super") -> Expr:
+        return expr
+
+    def visit_this_expr(self, expr: "This") -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: "Unary") -> Expr:
+        expr.right = self._expr(expr.right)
+        return expr
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        return expr
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> Stmt:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visit_print_stmt(self, stmt: "Print") -> Stmt:
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visit_var_stmt(self, stmt: "Var") -> Stmt:
+        if stmt.initializer != None:
+            stmt.initializer = self._expr(stmt.initializer)
+        return stmt
+
+    def visit_block_stmt(self, stmt: "Block") -> Stmt:
+        stmt.statements = self._stmts(stmt.statements)
+        return stmt
+
+    def visit_if_stmt(self, stmt: "If") -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        stmt.then_branch = self._branch(stmt.then_branch)
+        if stmt.else_branch != None:
+            stmt.else_branch = self._branch(stmt.else_branch)
+        return stmt
+
+    def visit_while_stmt(self, stmt: "While") -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    def visit_for_stmt(self, stmt: "For") -> Stmt:
+        if stmt.initializer != None:
+            stmt.initializer = self._stmt(stmt.initializer)
+        stmt.condition = self._expr(stmt.condition)
+        stmt.body = self._branch(stmt.body)
+        if stmt.increment != None:
+            stmt.increment = self._expr(stmt.increment)
+        return stmt
+
+    def visit_break_stmt(self, stmt: "Break") -> Stmt:
+        return stmt
+
+    def visit_continue_stmt(self, stmt: "Continue") -> Stmt:
+        return stmt
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        stmt.body = self._stmts(stmt.body)
+        return stmt
+
+    def visit_return_stmt(self, stmt: "Return") -> Stmt:
+        if stmt.value != None:
+            stmt.value = self._expr(stmt.value)
+        return stmt
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        for method in stmt.methods:
+            self._stmt(method)
+        return stmt
+
+
+class _LocalUses(ASTTransformer):
+    """
+    Collects the declarations of the locals a tree assigns, the ones it declares
+    itself and every one its variables refer to.
+    """
+
+    assigned: set[int]
+    declared: set[int]
+    referenced: dict[int, Any]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.assigned = set()
+        self.declared = set()
+        self.referenced = dict()
+
+    def visit_assign_expr(self, expr: "Assign") -> Expr:
+        if expr.declaration != None:
+            self.assigned.add(id(expr.declaration))
+            self.referenced[id(expr.declaration)] = expr.declaration
+        return super().visit_assign_expr(expr)
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        if expr.declaration != None:
+            self.referenced[id(expr.declaration)] = expr.declaration
+        return expr
+
+    def visit_var_stmt(self, stmt: "Var") -> Stmt:
+        self.declared.add(id(stmt))
+        return super().visit_var_stmt(stmt)
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        self.declared.add(id(stmt))
+        self.declared.update(id(param) for param in stmt.params)
+        return super().visit_fun_stmt(stmt)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        self.declared.add(id(stmt))
+        return super().visit_class_stmt(stmt)
+
+
+class _LoopExits(ASTTransformer):
+    """
+    Finds out whether a loop body has a break or continue for the loop itself,
+    leaving out the ones in nested loops.
+    """
+
+    found: bool
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.found = False
+
+    def visit_break_stmt(self, stmt: "Break") -> Stmt:
+        self.found = True
+        return stmt
+
+    def visit_continue_stmt(self, stmt: "Continue") -> Stmt:
+        self.found = True
+        return stmt
+
+    def visit_while_stmt(self, stmt: "While") -> Stmt:
+        return stmt
+
+    def visit_for_stmt(self, stmt: "For") -> Stmt:
+        return stmt
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        return stmt
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        return stmt
+
+
+class ClosureAssigned(ASTTransformer):
+    """
+    Collects the declarations of the locals assigned from inside a function other
+    than the one declaring them, any call could change those.
+    """
+
+    assigned: set[int]
+    # Declaration to the function declaring it, None at the top level
+    _owners: dict[int, int]
+    _function: int
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.assigned = set()
+        self._owners = dict()
+        self._function = None
+
+    def visit_assign_expr(self, expr: "Assign") -> Expr:
+        declaration = expr.declaration
+        if declaration != None and self._owners.get(id(declaration)) != self._function:
+            self.assigned.add(id(declaration))
+        return super().visit_assign_expr(expr)
+
+    def visit_var_stmt(self, stmt: "Var") -> Stmt:
+        self._owners[id(stmt)] = self._function
+        return super().visit_var_stmt(stmt)
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        self._owners[id(stmt)] = self._function
+        enclosing = self._function
+        self._function = id(stmt)
+        for param in stmt.params:
+            self._owners[id(param)] = self._function
+        super().visit_fun_stmt(stmt)
+        self._function = enclosing
+        return stmt
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        self._owners[id(stmt)] = self._function
+        return super().visit_class_stmt(stmt)
+
+
+class _Names(ASTTransformer):
+    """
+    Collects the globals assigned anywhere and the name of every local, a global
+    copied into another scope must not end up read as a local of the same name.
+    """
+
+    assigned_globals: set[str]
+    local_names: set[str]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.assigned_globals = set()
+        self.local_names = set()
+
+    def visit_assign_expr(self, expr: "Assign") -> Expr:
+        if expr.depth == None:
+            self.assigned_globals.add(expr.name.value)
+        return super().visit_assign_expr(expr)
+
+    def visit_var_stmt(self, stmt: "Var") -> Stmt:
+        if stmt.slot != None:
+            self.local_names.add(stmt.name.value)
+        return super().visit_var_stmt(stmt)
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        if stmt.slot != None:
+            self.local_names.add(stmt.name.value)
+        self.local_names.update(param.value for param in stmt.params)
+        return super().visit_fun_stmt(stmt)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        if stmt.slot != None:
+            self.local_names.add(stmt.name.value)
+        return super().visit_class_stmt(stmt)
+
+
+class _Size(ASTTransformer):
+    """Counts the nodes of an expression and the globals it reads."""
+
+    nodes: int
+    assigns: bool
+    globals: set[str]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.nodes = 0
+        self.assigns = False
+        self.globals = set()
+
+    def _expr(self, expr: Expr) -> Expr:
+        self.nodes += 1
+        return expr.accept(self)
+
+    def visit_assign_expr(self, expr: "Assign") -> Expr:
+        self.assigns = True
+        return super().visit_assign_expr(expr)
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        if expr.depth == None:
+            self.globals.add(expr.name.value)
+        return expr
+
+
+class _EvaluationOrder(ASTTransformer):
+    """
+    Lists what evaluating an inlined body does, in order. An entry is the index of
+    the parameter read, or None for anything else that could be observed: an
+    operator applied, a call, a field access or a global read.
+    """
+
+    _params: dict[int, int]
+    events: list
+
+    def __init__(self, params: list[Token]) -> None:
+        super().__init__()
+        self._params = {id(param): index for index, param in enumerate(params)}
+        self.events = []
+
+    def _expr(self, expr: Expr) -> Expr:
+        expr = expr.accept(self)
+        if type(expr) not in (Literal, Variable, Grouping, Logical):
+            self.events.append(None)
+        return expr
+
+    def visit_logical_expr(self, expr: "Logical") -> Expr:
+        # The right operand might not run at all
+        self._expr(expr.left)
+        self.events.append(None)
+        self._expr(expr.right)
+        return expr
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        self.events.append(self._params.get(id(expr.declaration)))
+        return expr
+
+
+class _Substitution(ASTTransformer):
+    """Replaces the parameter reads in a copied body with the call's arguments."""
+
+    _arguments: dict[int, Expr]
+
+    def __init__(self, params: list[Token], arguments: list[Expr]) -> None:
+        super().__init__()
+        self._arguments = {id(param): arg for param, arg in zip(params, arguments)}
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        arg = self._arguments.get(id(expr.declaration))
+        if arg == None:
+            return expr
+        if type(arg) == Literal:
+            return Literal(arg.value)
+        if type(arg) == Variable:
+            return Variable(arg.name, arg.depth, arg.slot, arg.declaration)
+        if type(arg) == This:
+            return This(arg.name, arg.depth, arg.slot)
+        # Only used once
+        return arg
+
+
+class Inliner(ASTTransformer):
+    """
+    Replaces calls to small top level functions with the expression they return.
+    A function is inlined when it's declared once and never reassigned, its body is
+    a single return of an expression with at most max_size nodes that assigns
+    nothing and only calls functions declared before it, so it can't recurse. The
+    call has to come after the declaration at the top level, so the function is
+    always defined when the call runs. Each function is inlined into at most
+    max_sites calls.
+
+    Arguments that are literals, this or locals no closure assigns are copied to
+    every use of their parameter. Any other argument has to be used exactly once,
+    and the body has to read those arguments in order before it does anything
+    else, so they run in the same order as the call would have run them.
+    """
+
+    max_size: int
+    max_sites: int
+    # The name of every function inlined and the line of the call it replaced
+    inlined: list[tuple[str, int]]
+    _candidates: dict[str, Fun]
+    _sites: dict[str, int]
+    _declared: dict[str, int]
+    # Every top level function and the ones declared before the current statement
+    _functions: set[str]
+    _earlier: set[str]
+    _names: _Names
+    _closure_assigned: set[int]
+
+    def __init__(
+        self, max_size: int = DEFAULT_INLINE_SIZE, max_sites: int = DEFAULT_INLINE_SITES
+    ) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self.max_sites = max_sites
+        self.inlined = []
+        self._candidates = dict()
+        self._sites = dict()
+        self._declared = dict()
+        self._functions = set()
+        self._earlier = set()
+        self._names = _Names()
+        self._closure_assigned = set()
+
+    def transform(self, statements: list[Stmt]) -> list[Stmt]:
+        self._names.transform(statements)
+        closure_assigned = ClosureAssigned()
+        closure_assigned.transform(statements)
+        self._closure_assigned = closure_assigned.assigned
+        for statement in statements:
+            if type(statement) in (Var, Fun, LoxClass):
+                name = statement.name.value
+                self._declared[name] = self._declared.get(name, 0) + 1
+            if type(statement) == Fun:
+                self._functions.add(statement.name.value)
+
+        transformed = []
+        for statement in statements:
+            statement = self._stmt(statement)
+            if statement == None:
+                continue
+            transformed.append(statement)
+            # Calls in later statements can't run before the function is declared
+            if type(statement) == Fun:
+                if self._can_inline(statement):
+                    self._candidates[statement.name.value] = statement
+                self._earlier.add(statement.name.value)
+        return transformed
+
+    def report(self) -> list[str]:
+        return [f"inlined {name} at line {line}" for name, line in self.inlined]
+
+    def _can_inline(self, fun: Fun) -> bool:
+        name = fun.name.value
+        if self._declared[name] != 1 or name in self._names.assigned_globals:
+            return False
+        if len(fun.body) > 1 or (len(fun.body) == 1 and type(fun.body[0]) != Return):
+            return False
+
+        value = self._returned(fun)
+        if value == None:
+            return True
+        size = _Size()
+        size._expr(value)
+        if size.assigns or size.nodes > self.max_size:
+            return False
+        # A global the body reads could be shadowed by a local where it's inlined
+        if not size.globals.isdisjoint(self._names.local_names):
+            return False
+        # Only calls to functions declared earlier, so the function can't recurse
+        later = self._functions - self._earlier
+        return size.globals.isdisjoint(later)
+
+    def _returned(self, fun: Fun) -> Expr:
+        if len(fun.body) == 0:
+            return None
+        return fun.body[0].value
+
+    def _is_simple(self, arg: Expr) -> bool:
+        # Reads the same value wherever it's copied, and can't fail
+        if type(arg) == Literal or type(arg) == This:
+            return True
+        return (
+            type(arg) == Variable
+            and arg.declaration != None
+            and id(arg.declaration) not in self._closure_assigned
+        )
+
+    def visit_call_expr(self, expr: "Call") -> Expr:
+        expr = super().visit_call_expr(expr)
+        callee = expr.callee
+        if type(callee) != Variable or callee.depth != None:
+            return expr
+        name = callee.name.value
+        fun = self._candidates.get(name)
+        if fun == None or len(fun.params) != len(expr.arguments):
+            return expr
+        if self._sites.get(name, 0) >= self.max_sites:
+            return expr
+
+        inlined = self._inline(fun, expr.arguments)
+        if inlined == None:
+            return expr
+        self._sites[name] = self._sites.get(name, 0) + 1
+        self.inlined.append((name, expr.paren.line))
+        return inlined
+
+    def _inline(self, fun: Fun, arguments: list[Expr]) -> Expr:
+        complex_args = [
+            i for i, arg in enumerate(arguments) if not self._is_simple(arg)
+        ]
+        if len(complex_args) > 0:
+            # A later simple argument would read the local after the assignment
+            uses = _LocalUses()
+            for i in complex_args:
+                uses._expr(arguments[i])
+            for arg in arguments:
+                if type(arg) == Variable and id(arg.declaration) in uses.assigned:
+                    return None
+
+        value = self._returned(fun)
+        if value == None:
+            return Literal(None) if len(complex_args) == 0 else None
+
+        order = _EvaluationOrder(fun.params)
+        order._expr(value)
+        reads = [event for event in order.events if event in complex_args]
+        if reads != complex_args:
+            return None
+        if len(reads) > 0 and None in order.events[: order.events.index(reads[-1])]:
+            return None
+
+        # Share the parameter tokens so the copied reads still point at them
+        body = copy.deepcopy(value, {id(param): param for param in fun.params})
+        return _Substitution(fun.params, arguments)._expr(body)
+
+
+class ConstantFolder(ASTTransformer):
+    """
+    Folds operators over literals, replaces reads of locals that are never
+    assigned after a constant initializer with the constant, and drops the
+    branches of if and while statements whose condition folded to a constant.
+
+    Folding goes through the Interpreter's own operator code, an operation that
+    would raise is left alone so the error still happens at run time.
+    """
+
+    _evaluator: Interpreter
+    _assigned: set[int]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._evaluator = Interpreter()
+        self._assigned = set()
+
+    def transform(self, statements: list[Stmt]) -> list[Stmt]:
+        uses = _LocalUses()
+        uses.transform(statements)
+        self._assigned = uses.assigned
+        return super().transform(statements)
+
+    def visit_binary_expr(self, expr: "Binary") -> Expr:
+        expr = super().visit_binary_expr(expr)
+        if type(expr.left) == Literal and type(expr.right) == Literal:
+            try:
+                value = self._evaluator._binary(expr, expr.left.value, expr.right.value)
+            except (LoxRuntimeError, ZeroDivisionError):
+                return expr
+            return _literal(value, expr)
+        return expr
+
+    def visit_unary_expr(self, expr: "Unary") -> Expr:
+        expr = super().visit_unary_expr(expr)
+        if type(expr.right) == Literal:
+            try:
+                value = self._evaluator._unary(expr, expr.right.value)
+            except LoxRuntimeError:
+                return expr
+            return _literal(value, expr)
+        return expr
+
+    def visit_logical_expr(self, expr: "Logical") -> Expr:
+        expr = super().visit_logical_expr(expr)
+        if type(expr.left) != Literal:
+            return expr
+
+        # Same short circuit as the Interpreter, the left value or the right operand
+        left = expr.left.value
+        if expr.operator.token_type == TokenType.OR:
+            return expr.left if left else expr.right
+        return expr.right if left else expr.left
+
+    def visit_grouping_expr(self, expr: "Grouping") -> Expr:
+        # Parentheses only matter to the parser
+        return self._expr(expr.expression)
+
+    def visit_variable_expr(self, expr: "Variable") -> Expr:
+        declaration = expr.declaration
+        if type(declaration) != Var or id(declaration) in self._assigned:
+            return expr
+
+        initializer = declaration.initializer
+        if initializer == None:
+            return Literal(None)
+        if type(initializer) == Literal:
+            return Literal(initializer.value)
+        return expr
+
+    def visit_if_stmt(self, stmt: "If") -> Stmt:
+        stmt = super().visit_if_stmt(stmt)
+        if type(stmt.condition) != Literal:
+            return stmt
+        if stmt.condition.value:
+            return stmt.then_branch
+        return stmt.else_branch
+
+    def visit_while_stmt(self, stmt: "While") -> Stmt:
+        stmt = super().visit_while_stmt(stmt)
+        if type(stmt.condition) == Literal and not stmt.condition.value:
+            return None
+        return stmt
+
+    def visit_for_stmt(self, stmt: "For") -> Stmt:
+        stmt = super().visit_for_stmt(stmt)
+        if type(stmt.condition) != Literal or stmt.condition.value:
+            return stmt
+        # Only the initializer runs, in a block so a counter stays out of scope
+        if stmt.initializer == None:
+            return None
+        return Block([stmt.initializer])
+
+
+class _Hoister(ASTTransformer):
+    """
+    Replaces the invariant expressions in the parts of a loop that run on every
+    iteration with reads of new temporaries, collecting a Var for each one.
+    """
+
+    _variant: set[int]
+    _next: int
+    temps: list[Var]
+
+    def __init__(self, variant: set[int], next_temp: int) -> None:
+        super().__init__()
+        self._variant = variant
+        self._next = next_temp
+        self.temps = []
+
+    def _expr(self, expr: Expr) -> Expr:
+        if type(expr) in (Binary, Unary, Logical) and self._is_invariant(expr):
+            name = Token(TokenType.IDENTIFIER, f"$licm{self._next}", expr.operator.line)
+            self._next += 1
+            self.temps.append(Var(name, expr))
+            return Variable(name)
+        return expr.accept(self)
+
+    def _is_invariant(self, expr: Expr) -> bool:
+        expr_type = type(expr)
+        if expr_type == Literal:
+            return True
+        if expr_type == Variable:
+            # Globals can be changed by any call
+            declaration = expr.declaration
+            return declaration != None and id(declaration) not in self._variant
+        if expr_type == Grouping:
+            return self._is_invariant(expr.expression)
+        if expr_type == Unary:
+            return self._is_invariant(expr.right)
+        if expr_type == Binary or expr_type == Logical:
+            return self._is_invariant(expr.left) and self._is_invariant(expr.right)
+        return False
+
+    # Everything below might not run on some iteration, hoisting out of it could
+    # raise an error the loop would never have hit
+
+    def visit_logical_expr(self, expr: "Logical") -> Expr:
+        expr.left = self._expr(expr.left)
+        return expr
+
+    def visit_if_stmt(self, stmt: "If") -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        return stmt
+
+    def visit_while_stmt(self, stmt: "While") -> Stmt:
+        stmt.condition = self._expr(stmt.condition)
+        return stmt
+
+    def visit_for_stmt(self, stmt: "For") -> Stmt:
+        if stmt.initializer != None:
+            stmt.initializer = self._stmt(stmt.initializer)
+        stmt.condition = self._expr(stmt.condition)
+        return stmt
+
+    def visit_fun_stmt(self, stmt: "Fun") -> Stmt:
+        return stmt
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> Stmt:
+        return stmt
+
+
+class LoopInvariantCodeMotion(ASTTransformer):
+    """
+    Hoists expressions that give the same value on every iteration of a while or
+    for loop into temporaries evaluated once. An expression is invariant when it's only
+    operators over literals and locals the loop neither declares nor assigns, and
+    no closure assigns either.
+
+    The first iteration is peeled off and runs the original code, so
+
+        while (c) body
+
+    becomes
+
+        if (c) { body; var $licm0 = e; while (c') body' }
+
+    where c' and body' read $licm0 in place of e. A for loop peels the same way
+    after its initializer, with the increment ending the peeled iteration:
+
+        { init; if (c) { body; incr; var $licm0 = e; for (; c'; incr') body' } }
+
+    Only expressions that run on every iteration are hoisted, so once the peeled
+    iteration has finished every hoisted expression has been evaluated once
+    without raising an error. Loops with a break or continue of their own are
+    left alone, the peeled iteration isn't a loop they could leave.
+
+    Peeling copies the loop, so a loop is only peeled when nothing inside it was
+    peeled already and it has at most MAX_PEELED_SIZE expression nodes. That
+    keeps the output within twice the size of the input however deep loops nest,
+    the innermost loop that hoists anything gets to.
+    """
+
+    _closure_assigned: set[int]
+    _next_temp: int
+    # Loops peeled so far, to tell whether a loop's body had one peeled
+    _peeled: int
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._closure_assigned = set()
+        self._next_temp = 0
+        self._peeled = 0
+
+    def transform(self, statements: list[Stmt]) -> list[Stmt]:
+        closure_assigned = ClosureAssigned()
+        closure_assigned.transform(statements)
+        self._closure_assigned = closure_assigned.assigned
+        return super().transform(statements)
+
+    def visit_while_stmt(self, stmt: "While") -> Stmt:
+        # Inner loops first, their temporaries then count as declared in this loop
+        peeled_before = self._peeled
+        stmt = super().visit_while_stmt(stmt)
+        if not self._peelable(stmt, peeled_before):
+            return stmt
+
+        uses = _LocalUses()
+        uses.transform([stmt])
+        # The peeled copy shares declarations from outside the loop rather than
+        # copying them, everything inside is copied
+        memo = {
+            key: declaration
+            for key, declaration in uses.referenced.items()
+            if key not in uses.declared
+        }
+        peeled = copy.deepcopy(stmt, memo)
+
+        variant = uses.assigned | uses.declared | self._closure_assigned
+        hoister = _Hoister(variant, self._next_temp)
+        stmt.condition = hoister._expr(stmt.condition)
+        stmt.body = hoister._branch(stmt.body)
+        if len(hoister.temps) == 0:
+            return stmt
+
+        self._next_temp += len(hoister.temps)
+        self._peeled += 1
+        return If(
+            peeled.condition, Block([peeled.body] + hoister.temps + [stmt]), None
+        )
+
+    def visit_for_stmt(self, stmt: "For") -> Stmt:
+        peeled_before = self._peeled
+        stmt = super().visit_for_stmt(stmt)
+        if not self._peelable(stmt, peeled_before):
+            return stmt
+
+        uses = _LocalUses()
+        uses.transform([stmt])
+        memo = {
+            key: declaration
+            for key, declaration in uses.referenced.items()
+            if key not in uses.declared
+        }
+        # The initializer stays where it is, the peeled copy reads its counter
+        initializer = stmt.initializer
+        if initializer != None:
+            memo[id(initializer)] = initializer
+        peeled = copy.deepcopy(stmt, memo)
+
+        variant = uses.assigned | uses.declared | self._closure_assigned
+        hoister = _Hoister(variant, self._next_temp)
+        stmt.condition = hoister._expr(stmt.condition)
+        stmt.body = hoister._branch(stmt.body)
+        if stmt.increment != None:
+            stmt.increment = hoister._expr(stmt.increment)
+        if len(hoister.temps) == 0:
+            return stmt
+
+        self._next_temp += len(hoister.temps)
+        self._peeled += 1
+        first_iteration = [peeled.body]
+        if peeled.increment != None:
+            first_iteration.append(Expression(peeled.increment))
+        stmt.initializer = None
+        loop = If(
+            peeled.condition, Block(first_iteration + hoister.temps + [stmt]), None
+        )
+        if initializer == None:
+            return loop
+        return Block([initializer, loop])
+
+    def _exits(self, body: Stmt) -> bool:
+        exits = _LoopExits()
+        exits._stmt(body)
+        return exits.found
+
+    def _peelable(self, stmt: Stmt, peeled_before: int) -> bool:
+        if self._peeled != peeled_before or self._exits(stmt.body):
+            return False
+
+        size = _Size()
+        size._stmt(stmt)
+        return size.nodes <= MAX_PEELED_SIZE
+
+
+def optimize(statements: list[Stmt], inliner: Inliner = None) -> list[Stmt]:
+    """
+    Runs every optimization pass over a resolved tree. The result has to be
+    resolved again before running it, passes may move nodes between scopes.
+    Pass an inliner to set its thresholds or read what it inlined afterwards.
+    """
+    if inliner == None:
+        inliner = Inliner()
+    statements = inliner.transform(statements)
+    statements = ConstantFolder().transform(statements)
+    return LoopInvariantCodeMotion().transform(statements)
@@ -7,6 +7,7 @@ from expr import (
     Call,
     Get,
     Grouping,
+    Invoke,
     Literal,
     Logical,
     Set,
@@ -39,6 +40,9 @@ class ASTPrinter(ExprVisitor):
     def visit_grouping_expr(self, expr: "Grouping") -> str:
         return self._parenthesize("group", expr.expression)
 
+    def visit_invoke_expr(self, expr: "Invoke") -> str:
+        print("Implement me please!")
+
     def visit_literal_expr(self, expr: "Literal") -> str:
         if expr.value is None:
             return "nil"
@@ -0,0 +1,221 @@
+from typing import Any
+from expr import (
+    ExprVisitor,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Stmt,
+    Expression,
+    Print,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+
+
+class _FunctionInfo:
+    __slots__ = ("stmt", "impure", "reads")
+
+    def __init__(self, stmt: Fun) -> None:
+        self.stmt = stmt
+        self.impure = False
+        # Globals the body reads, they all have to be pure functions too
+        self.reads = set()
+
+
+class PurityAnalyzer(ExprVisitor, StmtVisitor):
+    """
+    Marks the top level functions whose result depends only on their arguments, so
+    the interpreter can memoize them. Runs after the Resolver since it relies on
+    depth being None for exactly the global variables.
+
+    A function is pure when its body has no print, no field get or set, no this or
+    super, declares no functions or classes, assigns no globals, and the only
+    globals it reads are other pure functions declared once and never reassigned.
+    The interpreter checks at call time that the arguments are numbers, strings or
+    bools, so nothing mutable can reach the body.
+    """
+
+    _functions: dict[str, _FunctionInfo]
+    # How many times each global is declared and the globals assigned anywhere
+    _declared: dict[str, int]
+    _assigned: set[str]
+    _current: _FunctionInfo
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._functions = dict()
+        self._declared = dict()
+        self._assigned = set()
+        self._current = None
+
+    def analyze(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            if type(statement) in (Var, Fun, LoxClass):
+                name = statement.name.value
+                self._declared[name] = self._declared.get(name, 0) + 1
+            if type(statement) == Fun:
+                self._current = _FunctionInfo(statement)
+                self._functions[statement.name.value] = self._current
+                self._visit_stmts(statement.body)
+                self._current = None
+            else:
+                self._visit(statement)
+
+        pure = {
+            name: info
+            for name, info in self._functions.items()
+            if not info.impure
+            and self._declared[name] == 1
+            and name not in self._assigned
+        }
+        # Drop functions reading anything but a pure function until nothing changes,
+        # recursive functions stay pure as long as the whole cycle is
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pure):
+                if not pure[name].reads.issubset(pure):
+                    del pure[name]
+                    changed = True
+
+        for info in pure.values():
+            info.stmt.is_pure = True
+
+    def _visit(self, node: Any) -> None:
+        node.accept(self)
+
+    def _visit_stmts(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def _impure(self) -> None:
+        if self._current != None:
+            self._current.impure = True
+
+    def visit_expression_stmt(self, stmt: "Expression") -> None:
+        self._visit(stmt.expression)
+
+    def visit_print_stmt(self, stmt: "Print") -> None:
+        self._impure()
+        self._visit(stmt.expression)
+
+    def visit_var_stmt(self, stmt: "Var") -> None:
+        if stmt.initializer != None:
+            self._visit(stmt.initializer)
+
+    def visit_block_stmt(self, stmt: "Block") -> None:
+        self._visit_stmts(stmt.statements)
+
+    def visit_if_stmt(self, stmt: "If") -> None:
+        self._visit(stmt.condition)
+        self._visit(stmt.then_branch)
+        if stmt.else_branch != None:
+            self._visit(stmt.else_branch)
+
+    def visit_while_stmt(self, stmt: "While") -> None:
+        self._visit(stmt.condition)
+        self._visit(stmt.body)
+
+    def visit_for_stmt(self, stmt: "For") -> None:
+        if stmt.initializer != None:
+            self._visit(stmt.initializer)
+        self._visit(stmt.condition)
+        self._visit(stmt.body)
+        if stmt.increment != None:
+            self._visit(stmt.increment)
+
+    def visit_break_stmt(self, stmt: "Break") -> None:
+        pass
+
+    def visit_continue_stmt(self, stmt: "Continue") -> None:
+        pass
+
+    def visit_fun_stmt(self, stmt: "Fun") -> None:
+        # A nested function is a new object on every call, memoizing would share it
+        self._impure()
+        self._visit_stmts(stmt.body)
+
+    def visit_return_stmt(self, stmt: "Return") -> None:
+        if stmt.value != None:
+            self._visit(stmt.value)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> None:
+        self._impure()
+        if stmt.superclass != None:
+            self._visit(stmt.superclass)
+        for method in stmt.methods:
+            self._visit_stmts(method.body)
+
+    def visit_assign_expr(self, expr: "Assign") -> None:
+        if expr.depth == None:
+            self._assigned.add(expr.name.value)
+            self._impure()
+        self._visit(expr.value)
+
+    def visit_binary_expr(self, expr: "Binary") -> None:
+        self._visit(expr.left)
+        self._visit(expr.right)
+
+    def visit_call_expr(self, expr: "Call") -> None:
+        self._visit(expr.callee)
+        for arg in expr.arguments:
+            self._visit(arg)
+
+    def visit_get_expr(self, expr: "Get") -> None:
+        self._impure()
+        self._visit(expr.obj)
+
+    def visit_grouping_expr(self, expr: "Grouping") -> None:
+        self._visit(expr.expression)
+
+    def visit_invoke_expr(self, expr: "Invoke") -> None:
+        self._impure()
+        self._visit(expr.obj)
+        for arg in expr.arguments:
+            self._visit(arg)
+
+    def visit_literal_expr(self, expr: "Literal") -> None:
+        pass
+
+    def visit_logical_expr(self, expr: "Logical") -> None:
+        self._visit(expr.left)
+        self._visit(expr.right)
+
+    def visit_set_expr(self, expr: "Set") -> None:
+        self._impure()
+        self._visit(expr.object)
+        self._visit(expr.value)
+
+    def visit_super_expr(self, expr: "Super") -> None:
+        self._impure()
+
+    def visit_this_expr(self, expr: "This") -> None:
+        self._impure()
+
+    def visit_unary_expr(self, expr: "Unary") -> None:
+        self._visit(expr.right)
+
+    def visit_variable_expr(self, expr: "Variable") -> None:
+        if expr.depth == None and self._current != None:
+            self._current.reads.add(expr.name.value)
@@ -1,5 +1,5 @@
 import enum
-from lox_token import Token
+from lox_token import Token, TokenType
 from expr import (
     ExprVisitor,
     Assign,
@@ -8,6 +8,7 @@ from expr import (
     Call,
     Get,
     Grouping,
+    Invoke,
     Literal,
     Logical,
     Set,
@@ -24,6 +25,9 @@ from stmt import (
     Block,
     If,
     While,
+    For,
+    Break,
+    Continue,
     Fun,
     Return,
     LoxClass,
@@ -46,29 +50,132 @@ class LoxClassType(enum.Enum):
     SUBCLASS = enum.auto()
 
 
+_COUNTED_COMPARISONS = {
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+}
+
+
+class _FrameLayout:
+    """
+    The Frame a function runs in while the Resolver is inside it. Top level blocks
+    and classes with a superclass get one too when they aren't inside a function.
+    """
+
+    __slots__ = ("next_slot", "size", "upvalues", "upvalue_indexes")
+
+    next_slot: int
+    size: int
+    # (True, slot) for the Cell in a slot of the enclosing Frame, (False, index)
+    # for one of the enclosing function's own upvalues
+    upvalues: list[tuple[bool, int]]
+    upvalue_indexes: dict[tuple[int, str], int]
+
+    def __init__(self) -> None:
+        self.next_slot = 0
+        self.size = 0
+        self.upvalues = []
+        self.upvalue_indexes = dict()
+
+
 class Resolver(ExprVisitor, StmtVisitor):
     _interpreter: Interpreter
     _scopes: list[dict]
+    # Parallel to _scopes, the slot of each name in its function's Frame, the
+    # statement or param that declared it, the names a closure captures, the
+    # local reads and writes of each name and the layout the scope is part of
+    _slots: list[dict[str, int]]
+    _declarations: list[dict[str, Any]]
+    _captured: list[set[str]]
+    _uses: list[dict[str, list]]
+    _scope_layouts: list[int]
+    _layouts: list[_FrameLayout]
+    # The declaration of every local assigned so far, in order
+    _assigned: list[Any]
     _currFunc: LoxFunctionType
     _currClass: LoxClassType
+    # Loops around the statement being resolved, in the current function only
+    _loop_depth: int
 
     def __init__(self, interpreter: Interpreter) -> None:
         super().__init__()
         self._interpreter = interpreter
         self._scopes = []
+        self._slots = []
+        self._declarations = []
+        self._captured = []
+        self._uses = []
+        self._scope_layouts = []
+        self._layouts = []
+        self._assigned = []
         self._currFunc = LoxFunctionType.NONE
         self._currClass = LoxClassType.NONE
+        self._loop_depth = 0
 
     def visit_block_stmt(self, stmt: "Block") -> Any:
+        # Nothing can be captured from a scope with no names in it, so variables
+        # inside resolve straight to the enclosing scopes
+        stmt.needs_scope = any(
+            type(statement) in (Var, Fun, LoxClass) for statement in stmt.statements
+        )
+        if not stmt.needs_scope:
+            stmt.scope_size = 0
+            self._resolve_stmts(stmt.statements)
+            return
+
+        owns_frame = self._begin_frame()
         self._begin_scope()
         self._resolve_stmts(stmt.statements)
         self._end_scope()
+        stmt.scope_size = self._end_frame(owns_frame)
+
+    def _begin_frame(self) -> bool:
+        # Inside a function every block's locals live in the function's Frame
+        if len(self._layouts) > 0:
+            return False
+        self._layouts.append(_FrameLayout())
+        return True
+
+    def _end_frame(self, owns_frame: bool) -> int:
+        if not owns_frame:
+            return 0
+        return self._layouts.pop().size
 
     def _begin_scope(self):
         self._scopes.append(dict())
-
-    def _end_scope(self):
+        self._slots.append(dict())
+        self._declarations.append(dict())
+        self._captured.append(set())
+        self._uses.append(dict())
+        self._scope_layouts.append(len(self._layouts) - 1)
+
+    def _end_scope(self) -> list[int]:
+        """
+        Pops the scope and returns the slots of the captured params, this and super,
+        which the caller has to put in Cells. The Var, Fun and LoxClass statements
+        of captured locals get marked directly.
+        """
         self._scopes.pop()
+        self._scope_layouts.pop()
+        slots = self._slots.pop()
+        declarations = self._declarations.pop()
+        uses = self._uses.pop()
+        cells = []
+        for name in self._captured.pop():
+            # Reads resolved before the closure was have to go through the Cell too
+            for expr in uses.get(name, []):
+                expr.captured = True
+            declaration = declarations[name]
+            if type(declaration) in (Var, Fun, LoxClass):
+                declaration.captured = True
+            else:
+                cells.append(slots[name])
+
+        # The slots are free again once the scope is gone
+        self._layouts[-1].next_slot -= len(slots)
+        return sorted(cells)
 
     def _resolve_stmts(self, statements: list[Stmt]) -> None:
         for statement in statements:
@@ -79,14 +186,15 @@ class Resolver(ExprVisitor, StmtVisitor):
         stmt.accept(self)
 
     def visit_var_stmt(self, stmt: Var) -> None:
-        self._declare(stmt.name)
+        stmt.captured = False
+        stmt.slot = self._declare(stmt.name, stmt)
         if stmt.initializer != None:
             self._resolve(stmt.initializer)
         self._define(stmt.name)
 
-    def _declare(self, name: Token) -> None:
+    def _declare(self, name: Token, declaration: Any) -> int:
         if len(self._scopes) == 0:
-            return
+            return None
 
         scope = self._scopes[-1]
         if name.value in scope:
@@ -94,6 +202,16 @@ class Resolver(ExprVisitor, StmtVisitor):
                 "Already a variable with this name in this scope.", name
             )
         scope[name.value] = False
+        return self._add_slot(name.value, declaration)
+
+    def _add_slot(self, name: str, declaration: Any = None) -> int:
+        self._declarations[-1][name] = declaration
+        layout = self._layouts[-1]
+        slot = layout.next_slot
+        layout.next_slot += 1
+        layout.size = max(layout.size, layout.next_slot)
+        self._slots[-1][name] = slot
+        return slot
 
     def _define(self, name: Token) -> None:
         if len(self._scopes) == 0:
@@ -110,16 +228,60 @@ class Resolver(ExprVisitor, StmtVisitor):
         self._resolve_local(expr, expr.name)
 
     def _resolve_local(self, expr: Variable, name: Token) -> None:
+        # Clear whatever an earlier resolve of a rewritten tree left here
+        expr.upvalue = None
+        expr.captured = False
         for i in range(len(self._scopes) - 1, -1, -1):
             if name.value in self._scopes[i]:
-                self._interpreter.resolve(expr, len(self._scopes) - 1 - i)
+                # Lexical distance, the Frame layout is only in slot and upvalue
+                expr.depth = len(self._scopes) - 1 - i
+                if type(expr) in (Variable, Assign):
+                    expr.declaration = self._declarations[i][name.value]
+                self._interpreter.resolve(expr, expr.depth)
+
+                level = len(self._layouts) - 1
+                if self._scope_layouts[i] == level:
+                    expr.slot = self._slots[i][name.value]
+                    self._uses[i].setdefault(name.value, []).append(expr)
+                else:
+                    expr.slot = None
+                    expr.upvalue = self._upvalue(level, i, name.value)
+                    self._captured[i].add(name.value)
+                return
+
+        expr.depth = None
+        expr.slot = None
+        if type(expr) in (Variable, Assign):
+            expr.declaration = None
+
+    def _upvalue(self, level: int, scope: int, name: str) -> int:
+        """
+        The index of the upvalue the function at level reads a local of an enclosing
+        function through, adding one to every function in between as needed.
+        """
+        layout = self._layouts[level]
+        index = layout.upvalue_indexes.get((scope, name))
+        if index != None:
+            return index
+
+        if self._scope_layouts[scope] == level - 1:
+            upvalue = (True, self._slots[scope][name])
+        else:
+            upvalue = (False, self._upvalue(level - 1, scope, name))
+        layout.upvalues.append(upvalue)
+        index = len(layout.upvalues) - 1
+        layout.upvalue_indexes[(scope, name)] = index
+        return index
 
     def visit_assign_expr(self, expr: Assign) -> None:
         self._resolve(expr.value)
         self._resolve_local(expr, expr.name)
+        if expr.declaration != None:
+            self._assigned.append(expr.declaration)
 
     def visit_fun_stmt(self, stmt: Fun) -> None:
-        self._declare(stmt.name)
+        stmt.captured = False
+        stmt.slot = self._declare(stmt.name, stmt)
         self._define(stmt.name)
 
         self._resolve_function(stmt, LoxFunctionType.FUNCTION)
@@ -127,15 +289,28 @@ class Resolver(ExprVisitor, StmtVisitor):
     def _resolve_function(self, stmt: Fun, type: LoxFunctionType) -> None:
         enclosing = self._currFunc
         self._currFunc = type
+        # break and continue can't reach a loop outside the function
+        enclosing_loop_depth = self._loop_depth
+        self._loop_depth = 0
 
+        self._layouts.append(_FrameLayout())
         self._begin_scope()
+        # Methods get this in slot 0 of their own frame, ahead of the params
+        if type == LoxFunctionType.METHOD or type == LoxFunctionType.INITIALIZER:
+            self._scopes[-1]["this"] = True
+            self._add_slot("this")
+
         for param in stmt.params:
-            self._declare(param)
+            self._declare(param, param)
             self._define(param)
 
         self._resolve_stmts(stmt.body)
-        self._end_scope()
+        stmt.cell_slots = self._end_scope()
+        layout = self._layouts.pop()
+        stmt.scope_size = layout.size
+        stmt.upvalues = layout.upvalues
         self._currFunc = enclosing
+        self._loop_depth = enclosing_loop_depth
 
     def visit_expression_stmt(self, stmt: Expression) -> None:
         self._resolve(stmt.expression)
@@ -159,16 +334,87 @@ class Resolver(ExprVisitor, StmtVisitor):
                     "Can't return a value from initializer", stmt.keyword
                 )
             self._resolve(stmt.value)
+            if type(stmt.value) == Call or type(stmt.value) == Invoke:
+                stmt.value.is_tail = True
 
     def visit_while_stmt(self, stmt: While) -> Any:
         self._resolve(stmt.condition)
+        self._loop_depth += 1
         self._resolve(stmt.body)
+        self._loop_depth -= 1
+
+    def visit_for_stmt(self, stmt: For) -> Any:
+        # Scoped like a block holding the initializer and the loop
+        needs_scope = type(stmt.initializer) == Var
+        if needs_scope:
+            owns_frame = self._begin_frame()
+            self._begin_scope()
+
+        if stmt.initializer != None:
+            self._resolve(stmt.initializer)
+        assigned = len(self._assigned)
+        self._resolve(stmt.condition)
+        self._loop_depth += 1
+        self._resolve(stmt.body)
+        self._loop_depth -= 1
+        assigned_in_loop = self._assigned[assigned:]
+        if stmt.increment != None:
+            self._resolve(stmt.increment)
+        stmt.counted = self._is_counted(stmt, assigned_in_loop)
+
+        stmt.scope_size = 0
+        if needs_scope:
+            self._end_scope()
+            stmt.scope_size = self._end_frame(owns_frame)
+
+    def visit_break_stmt(self, stmt: Break) -> Any:
+        if self._loop_depth == 0:
+            raise LoxRuntimeError("Can't break outside of a loop", stmt.keyword)
+
+    def visit_continue_stmt(self, stmt: Continue) -> Any:
+        if self._loop_depth == 0:
+            raise LoxRuntimeError("Can't continue outside of a loop", stmt.keyword)
+
+    def _is_counted(self, stmt: For, assigned_in_loop: list[Any]) -> bool:
+        """
+        Whether the loop is for (...; i < bound; i = i + step) over a local i of the
+        running function, with a number literal step and no other assignment to i
+        in the condition or the body. The backends still check i isn't captured.
+        """
+        condition = stmt.condition
+        if (
+            type(condition) != Binary
+            or condition.operator.token_type not in _COUNTED_COMPARISONS
+            or type(condition.left) != Variable
+            or condition.left.slot == None
+        ):
+            return False
+        declaration = condition.left.declaration
+
+        increment = stmt.increment
+        if type(increment) != Assign or increment.declaration is not declaration:
+            return False
+        step = increment.value
+        if (
+            type(step) != Binary
+            or step.operator.token_type not in (TokenType.PLUS, TokenType.MINUS)
+            or type(step.left) != Variable
+            or step.left.declaration is not declaration
+            or type(step.right) != Literal
+            or type(step.right.value) is not float
+        ):
+            return False
+
+        # The backends keep the counter's Frame slot up to date for the body to read
+        return all(other is not declaration for other in assigned_in_loop)
 
     def visit_binary_expr(self, expr: "Binary") -> Any:
         self._resolve(expr.left)
         self._resolve(expr.right)
 
     def visit_call_expr(self, expr: "Call") -> Any:
+        # Only a return statement marks a call as a tail call, after resolving it
+        expr.is_tail = False
         self._resolve(expr.callee)
 
         for arg in expr.arguments:
@@ -177,6 +423,13 @@ class Resolver(ExprVisitor, StmtVisitor):
     def visit_grouping_expr(self, expr: "Grouping") -> Any:
         self._resolve(expr.expression)
 
+    def visit_invoke_expr(self, expr: "Invoke") -> Any:
+        expr.is_tail = False
+        self._resolve(expr.obj)
+
+        for arg in expr.arguments:
+            self._resolve(arg)
+
     def visit_literal_expr(self, expr: "Literal") -> Any:
         pass
 
@@ -191,7 +444,8 @@ class Resolver(ExprVisitor, StmtVisitor):
         enclosingClass = self._currClass
         self._currClass = LoxClassType.CLASS
 
-        self._declare(stmt.name)
+        stmt.captured = False
+        stmt.slot = self._declare(stmt.name, stmt)
         self._define(stmt.name)
 
         if stmt.superclass != None and stmt.name.value == stmt.superclass.name.value:
@@ -200,11 +454,11 @@ class Resolver(ExprVisitor, StmtVisitor):
         if stmt.superclass != None:
             self._currClass = LoxClassType.SUBCLASS
             self._resolve(stmt.superclass)
+            owns_frame = self._begin_frame()
             self._begin_scope()
             self._scopes[-1]["super"] = True
-
-        self._begin_scope()
-        self._scopes[-1]["this"] = True
+            # Always a Cell, only the methods ever read it
+            stmt.super_slot = self._add_slot("super")
 
         for method in stmt.methods:
             func_type = LoxFunctionType.METHOD
@@ -212,9 +466,10 @@ class Resolver(ExprVisitor, StmtVisitor):
                 func_type = LoxFunctionType.INITIALIZER
             self._resolve_function(method, func_type)
 
-        self._end_scope()
+        stmt.scope_size = 0
         if stmt.superclass != None:
             self._end_scope()
+            stmt.scope_size = self._end_frame(owns_frame)
         self._currClass = enclosingClass
 
     def visit_get_expr(self, expr: "Get") -> Any:
@@ -228,6 +483,10 @@ class Resolver(ExprVisitor, StmtVisitor):
         if self._currClass != LoxClassType.SUBCLASS:
             raise LoxRuntimeError("Can't use super outside of a subclass", expr.name)
         self._resolve_local(expr, expr.name)
+        # The method is bound to this, which might be an upvalue here as well
+        if expr.this == None:
+            expr.this = This(Token(TokenType.THIS, "this", expr.name.line))
+        self._resolve_local(expr.this, expr.this.name)
 
     def visit_this_expr(self, expr: "This") -> Any:
         if self._currClass == LoxClassType.NONE:
@@ -1,6 +1,42 @@
+import re
+import sys
 from lox_token import Token, TokenType
 from result import Result
-from typing import Any
+from typing import Any, Iterator, TextIO, Union
+
+SCANNER_MODES = ["regex", "chars"]
+# Characters read from a file at a time when streaming it
+CHUNK_SIZE = 1 << 16
+
+_NOT_ASCII = "\x80-\U0010ffff"
+# One pass of a compiled pattern over the source, the alternatives are tried in
+# order so a comment wins over a slash. Outside strings and comments only ASCII is
+# matched, an identifier or number running into any other character is left
+# whole to the fallback group, which the chars mode scans
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>[ \t\n\r\x0b\x0c\x1c-\x1f]+)
+    | (?P<identifier>[A-Za-z][A-Za-z0-9_]*(?![A-Za-z0-9_{0}]))
+    | (?P<comment>//[^\n]*)
+    | (?P<operator>[!=<>]=?|[(){{}},.\-+;*/])
+    | (?P<number>[0-9]+(?:\.[0-9]+(?![0-9{0}])|(?![0-9{0}]|\.[0-9{0}])))
+    | (?P<string>"[^"]*")
+    | (?P<unterminated>"[^"]*)
+    | (?P<fallback>[A-Za-z0-9_.{0}]+)
+    | (?P<other>.)
+    """.format(_NOT_ASCII),
+    re.VERBOSE | re.DOTALL,
+)
+_OPERATOR_TYPES = {
+    token_type.value: token_type
+    for token_type in TokenType
+    if type(token_type.value) == str and not token_type.value.isalpha()
+}
+_KEYWORD_TYPES = {
+    token_type.value: token_type
+    for token_type in TokenType
+    if type(token_type.value) == str and token_type.value.isalpha()
+}
 
 
 class BaseScannerError(Exception):
@@ -37,13 +73,24 @@ class UnexpectedCharError(BaseScannerError):
 
 class Scanner:
     source_code: str
+    # Read a chunk at a time instead of source_code when scanning a file
+    _file: TextIO
+    # regex matches whole tokens with one compiled pattern, chars looks at a
+    # character at a time
+    mode: str
     curr_index: int
     line_num: int
     tokens: list[Token]
     errors: list[BaseScannerError]
 
-    def __init__(self, source: str) -> None:
-        self.source_code = source
+    def __init__(self, source: Union[str, TextIO], mode: str = "regex") -> None:
+        if type(source) == str:
+            self.source_code = source
+            self._file = None
+        else:
+            self.source_code = ""
+            self._file = source
+        self.mode = mode
         self.line_num = 1
         self.curr_index = 0
         self.tokens = []
@@ -121,7 +168,8 @@ class Scanner:
         while (self._peek().isalnum()) or (self._peek() == "_"):
             self._advance()
 
-        name = self.source_code[lex_start : self.curr_index]
+        # Interned so every lookup of the name compares by identity
+        name = sys.intern(self.source_code[lex_start : self.curr_index])
         self._add_token(
             TokenType(name)
             if TokenType.is_keyword_token(name)
@@ -130,6 +178,89 @@ class Scanner:
         )
 
     def scan_tokens(self) -> Result[list[Token], list[BaseScannerError]]:
+        tokens = list(self.stream())
+        if len(self.errors) > 0:
+            return Result.Fail(self.errors)
+
+        self.tokens = tokens
+        return Result.Ok(tokens)
+
+    def stream(self) -> Iterator[Token]:
+        """
+        Yields the tokens one at a time ending with EOF, errors are collected in
+        errors as they're found and the tokens around them are still yielded.
+        """
+        if self.mode == "regex":
+            yield from self._stream_regex()
+            return
+
+        if self._file != None:
+            self.source_code = self._file.read()
+        self._scan_chars()
+        self._add_token(TokenType.EOF)
+        yield from self.tokens
+
+    def _stream_regex(self) -> Iterator[Token]:
+        # A match that reaches the last character of the buffer could go on in
+        # the next chunk, it's matched again once that's read
+        buffer = self.source_code
+        pos = 0
+        more = self._file != None
+        line = 1
+        while True:
+            if more:
+                chunk = self._file.read(CHUNK_SIZE)
+                more = chunk != ""
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            limit = len(buffer) - 1 if more else len(buffer) + 1
+
+            for match in _TOKEN_PATTERN.finditer(buffer, pos):
+                start, end = match.span()
+                if end >= limit:
+                    pos = start
+                    break
+
+                kind = match.lastgroup
+                if kind == "space":
+                    line += buffer.count("\n", start, end)
+                elif kind == "identifier":
+                    name = match.group()
+                    keyword = _KEYWORD_TYPES.get(name)
+                    if keyword != None:
+                        yield Token(keyword, keyword.value, line)
+                    else:
+                        yield Token(TokenType.IDENTIFIER, sys.intern(name), line)
+                elif kind == "operator":
+                    yield Token(_OPERATOR_TYPES[match.group()], None, line)
+                elif kind == "number":
+                    yield Token(TokenType.NUMBER, float(match.group()), line)
+                elif kind == "string":
+                    line += buffer.count("\n", start, end)
+                    yield Token(TokenType.STRING, buffer[start + 1 : end - 1], line)
+                elif kind == "comment":
+                    pass
+                elif kind == "unterminated":
+                    line += buffer.count("\n", start, end)
+                    self._add_error(UnterminatedStringError(line))
+                elif kind == "fallback":
+                    # No newlines or quotes in here, so it scans the same alone
+                    chars = Scanner(match.group(), "chars")
+                    chars.line_num = line
+                    chars._scan_chars()
+                    self.errors.extend(chars.errors)
+                    yield from chars.tokens
+                else:
+                    self._add_error(UnexpectedCharError(line, match.group()))
+            else:
+                pos = len(buffer)
+                if not more:
+                    break
+
+        self.line_num = line
+        yield Token(TokenType.EOF, None, line)
+
+    def _scan_chars(self) -> None:
         while not self._is_at_end():
             char = self._advance()
 
@@ -161,9 +292,3 @@ class Scanner:
                     self._handle_identifier_or_keyword()
                 else:
                     self._add_error(UnexpectedCharError(self.line_num, char))
-
-        if len(self.errors) > 0:
-            return Result.Fail(self.errors)
-
-        self._add_token(TokenType.EOF)
-        return Result.Ok(self.tokens)
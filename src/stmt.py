@@ -1,8 +1,8 @@
 import abc
 from lox_token import Token
-from expr import Expr
+from expr import Expr, slotted
 from typing import Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from expr import Variable
 
@@ -32,6 +32,18 @@ class StmtVisitor(abc.ABC):
     def visit_while_stmt(self, stmt: "While") -> Any:
         pass
 
+    @abc.abstractmethod
+    def visit_for_stmt(self, stmt: "For") -> Any:
+        pass
+
+    @abc.abstractmethod
+    def visit_break_stmt(self, stmt: "Break") -> Any:
+        pass
+
+    @abc.abstractmethod
+    def visit_continue_stmt(self, stmt: "Continue") -> Any:
+        pass
+
     @abc.abstractmethod
     def visit_fun_stmt(self, stmt: "Fun") -> Any:
         pass
@@ -46,11 +58,14 @@ class StmtVisitor(abc.ABC):
 
 
 class Stmt(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def accept(self, visitor: StmtVisitor) -> Any:
         pass
 
 
+@slotted
 @dataclass
 class Expression(Stmt):
     expression: Expr
@@ -59,6 +74,7 @@ class Expression(Stmt):
         return visitor.visit_expression_stmt(self)
 
 
+@slotted
 @dataclass
 class Print(Stmt):
     expression: Expr
@@ -67,23 +83,36 @@ class Print(Stmt):
         return visitor.visit_print_stmt(self)
 
 
+@slotted
 @dataclass
 class Var(Stmt):
     name: Token
     initializer: Expr
+    # Slot the Resolver gave the declared name, None for globals
+    slot: int = field(default=None, compare=False, repr=False)
+    # Set by the Resolver when a closure captures the local, its slot holds a Cell
+    captured: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_var_stmt(self)
 
 
+@slotted
 @dataclass
 class Block(Stmt):
     statements: list[Stmt]
+    # Slots of the Frame the block runs in, only a top level block outside any
+    # function gets a Frame of its own, every other block has 0
+    scope_size: int = field(default=0, compare=False, repr=False)
+    # Cleared by the Resolver when the block declares nothing, it then runs in the
+    # enclosing scope without a Frame of its own
+    needs_scope: bool = field(default=True, compare=False, repr=False)
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_block_stmt(self)
 
 
+@slotted
 @dataclass
 class If(Stmt):
     condition: Expr
@@ -94,6 +123,7 @@ class If(Stmt):
         return visitor.visit_if_stmt(self)
 
 
+@slotted
 @dataclass
 class While(Stmt):
     condition: Expr
@@ -103,16 +133,71 @@ class While(Stmt):
         return visitor.visit_while_stmt(self)
 
 
+@slotted
+@dataclass
+class For(Stmt):
+    # A Var, an Expression or None
+    initializer: Stmt
+    # Literal(True) when the source leaves it out
+    condition: Expr
+    increment: Expr
+    body: Stmt
+    # Slots of the Frame the loop runs in, like Block's, non-zero only for a loop
+    # declaring its counter outside any function and block
+    scope_size: int = field(default=0, compare=False, repr=False)
+    # Set by the Resolver when the loop counts a local up or down by a constant,
+    # the condition compares it and nothing else in the loop assigns it
+    counted: bool = field(default=False, compare=False, repr=False)
+
+    def accept(self, visitor: StmtVisitor) -> Any:
+        return visitor.visit_for_stmt(self)
+
+
+@slotted
+@dataclass
+class Break(Stmt):
+    keyword: Token
+
+    def accept(self, visitor: StmtVisitor) -> Any:
+        return visitor.visit_break_stmt(self)
+
+
+@slotted
+@dataclass
+class Continue(Stmt):
+    keyword: Token
+
+    def accept(self, visitor: StmtVisitor) -> Any:
+        return visitor.visit_continue_stmt(self)
+
+
+@slotted
 @dataclass
 class Fun(Stmt):
     name: Token
     params: list[Token]
     body: list[Stmt]
+    # Slot the Resolver gave the declared name, None for globals
+    slot: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
+    # Slots of the Frame a call runs in, this, the params and the locals of every
+    # block in the body, set by the Resolver
+    scope_size: int = field(default=0, compare=False, repr=False)
+    # The slots of captured params and this, put in Cells when the call starts
+    cell_slots: list[int] = field(default_factory=list, compare=False, repr=False)
+    # What a closure captures when it's made, (True, slot) for the Cell in a slot
+    # of the enclosing Frame, (False, index) for an upvalue of the enclosing function
+    upvalues: list[tuple[bool, int]] = field(
+        default_factory=list, compare=False, repr=False
+    )
+    # Set by the PurityAnalyzer when calls can be memoized
+    is_pure: bool = field(default=False, compare=False, repr=False)
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_fun_stmt(self)
 
 
+@slotted
 @dataclass
 class Return(Stmt):
     keyword: Token
@@ -122,11 +207,19 @@ class Return(Stmt):
         return visitor.visit_return_stmt(self)
 
 
+@slotted
 @dataclass
 class LoxClass(Stmt):
     name: Token
     superclass: Variable
     methods: list[Fun]
+    # Slot the Resolver gave the declared name, None for globals
+    slot: int = field(default=None, compare=False, repr=False)
+    captured: bool = field(default=False, compare=False, repr=False)
+    # Slot of the Cell holding the superclass for the methods' super, and the size
+    # of the Frame it's in when the class isn't inside a function or block
+    super_slot: int = field(default=None, compare=False, repr=False)
+    scope_size: int = field(default=0, compare=False, repr=False)
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_class_stmt(self)
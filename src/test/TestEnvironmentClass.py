@@ -1,7 +1,11 @@
-from environment import Environment
+from environment import Cell, Environment, Frame
 import unittest
 from lox_token import Token, TokenType
 from runtime_errors import LoxRuntimeError
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
 
 
 class TestEnvironmentClass(unittest.TestCase):
@@ -52,3 +56,85 @@ class TestEnvironmentClass(unittest.TestCase):
             parent_env = Environment()
             child_env = Environment(parent_env)
             child_env.assign(self._create_var_token("UNDEFINED"), 3)
+
+    def test_frame_shares_cells(self):
+        cell = Cell("Howdy")
+        parent = Frame(2)
+        parent.values[1] = cell
+        child = Frame(1, (parent.values[1],))
+
+        self.assertEqual(child.upvalues[0].value, "Howdy")
+
+        child.upvalues[0].value = 123.0
+        child.values[0] = "World"
+        self.assertEqual(parent.values[1].value, 123.0)
+        self.assertEqual(child.values, ["World"])
+
+    def test_resolver_assigns_slots(self):
+        source = "fun f(a, b) { var c = a; { var d = c; print d; } }"
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+
+        fun = statements[0]
+        self.assertEqual(fun.slot, None)
+        # Every local of the function, the block's too, has a slot in its Frame
+        self.assertEqual(fun.scope_size, 4)
+        self.assertEqual(fun.body[0].slot, 2)
+        var_c = fun.body[0]
+        self.assertEqual(var_c.slot, 2)
+        self.assertEqual((var_c.initializer.depth, var_c.initializer.slot), (0, 0))
+
+        block = fun.body[1]
+        var_d = block.statements[0]
+        self.assertEqual(block.scope_size, 0)
+        self.assertEqual(var_d.slot, 3)
+        self.assertEqual((var_d.initializer.depth, var_d.initializer.slot), (1, 2))
+
+    def test_resolver_finds_captured_locals(self):
+        source = """
+            fun f(a, b) {
+                var c = a;
+                var d = b;
+                fun g() { fun h() { return c + a; } return h; }
+                { var e = d; }
+                return g;
+            }
+        """
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+
+        (f,) = statements
+        var_c, var_d, g, block, _ = f.body
+        self.assertEqual(f.cell_slots, [0])
+        self.assertTrue(var_c.captured)
+        self.assertFalse(var_d.captured)
+        self.assertFalse(g.captured)
+        self.assertEqual(block.statements[0].slot, 5)
+
+        # g only passes c and a on to h
+        self.assertEqual(g.upvalues, [(True, 2), (True, 0)])
+        h = g.body[0]
+        self.assertEqual(h.upvalues, [(False, 0), (False, 1)])
+        total = h.body[0].value
+        self.assertEqual((total.left.slot, total.left.upvalue), (None, 0))
+        self.assertEqual((total.right.slot, total.right.upvalue), (None, 1))
+
+    def test_version_changes_with_new_bindings(self):
+        var_name = self._create_var_token("test")
+        env = Environment()
+
+        version = env.version
+        env.define(var_name.value, 1.0)
+        self.assertNotEqual(env.version, version)
+
+        # Assigning or redefining a name keeps its Cell, a cached Cell stays valid
+        version = env.version
+        cell = env.get_cell(var_name)
+        env.assign(var_name, 2.0)
+        env.define(var_name.value, 3.0)
+        self.assertEqual(env.version, version)
+        self.assertIs(env.get_cell(var_name), cell)
+        self.assertEqual(cell.value, 3.0)
+
+        env.define("other", 4.0)
+        self.assertNotEqual(env.version, version)
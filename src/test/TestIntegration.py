@@ -1,19 +1,27 @@
 import unittest
 
-from main import read_in_file
+from main import (
+    read_in_file,
+    run_tree_walker,
+    run_vm,
+    run_closure_compiled,
+    run_transpiled,
+)
 from scanner import Scanner
 from lox_parser import Parser
-from interpreter import Interpreter
-from resolver import Resolver
+from interpreter import DEFAULT_MAX_CALL_DEPTH, MAX_SHAPE_FIELDS
+from runtime_errors import LoxRuntimeError
 
 
 class TestIntegration(unittest.TestCase):
 
     TEST_SCRIPT_PATH = "test/test_scripts/"
 
-    def _exec(self, fileName: str):
+    def _exec(self, fileName: str, max_depth: int = DEFAULT_MAX_CALL_DEPTH):
         source_code = read_in_file(self.TEST_SCRIPT_PATH + fileName)
+        self._exec_source(source_code, max_depth)
 
+    def _exec_source(self, source_code: str, max_depth: int = DEFAULT_MAX_CALL_DEPTH):
         scanner = Scanner(source_code)
         scanner_result = scanner.scan_tokens()
         self.assertTrue(scanner_result.success)
@@ -22,11 +30,10 @@ class TestIntegration(unittest.TestCase):
         parser_result = parser.parse()
         self.assertTrue(parser_result.success)
 
-        interpreter = Interpreter()
-        resolver = Resolver(interpreter)
-        resolver._resolve_stmts(parser_result.value)
+        self._run(parser_result.value, max_depth)
 
-        interpreter.interpret(parser_result.value)
+    def _run(self, statements: list, max_depth: int):
+        run_tree_walker(statements, max_depth)
 
     def test_primitives(self):
         self._exec("math.lox")
@@ -44,3 +51,56 @@ class TestIntegration(unittest.TestCase):
 
     def test_edge_cases(self):
         self._exec("scopes.lox")
+
+    def test_optimizations(self):
+        self._exec("optimizer.lox")
+
+    def test_deep_recursion(self):
+        self._exec("recursion.lox")
+
+    def test_tail_calls(self):
+        self._exec("tail_calls.lox")
+
+    def test_instances_past_the_field_limit(self):
+        # Both instances outgrow the shared shapes through the same Set nodes
+        fields = " ".join(f"this.f{i} = {i};" for i in range(MAX_SHAPE_FIELDS + 1))
+        klass = f"class A {{ init() {{ {fields} }} }}"
+        self._exec_source(
+            klass + "var a = A(); var b = A(); b.f3 = 99; a.extra = 1; b.extra = 2;"
+            "assert(a.f3 == 3); assert(a.extra == 1); assert(b.extra == 2);"
+        )
+        with self.assertRaises(LoxRuntimeError) as ctx:
+            self._exec_source(
+                klass + "var a = A(); var b = A(); b.extra = 1; print a.extra;"
+            )
+        self.assertIn("Undefined property", ctx.exception.message)
+
+    def test_stack_overflow(self):
+        with self.assertRaises(LoxRuntimeError) as ctx:
+            self._exec_source(
+                "fun count(n) {\n  if (n == 0) return 0;\n  return 1 + count(n - 1);\n}"
+                "\ncount(1000);",
+                max_depth=100,
+            )
+        self.assertEqual(ctx.exception.message, "Stack overflow.")
+        # Reported at the recursing call, not at the declaration
+        self.assertEqual(ctx.exception.line, 3)
+
+
+class TestVMIntegration(TestIntegration):
+    def _run(self, statements: list, max_depth: int):
+        run_vm(statements, max_depth)
+
+
+class TestClosureIntegration(TestIntegration):
+    def _run(self, statements: list, max_depth: int):
+        run_closure_compiled(statements, max_depth)
+
+
+class TestTranspilerIntegration(TestIntegration):
+    def _run(self, statements: list, max_depth: int):
+        run_transpiled(statements, max_depth)
+
+    @unittest.skip("transpiled calls are plain python calls, without tail calls")
+    def test_tail_calls(self):
+        pass
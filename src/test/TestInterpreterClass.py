@@ -1,8 +1,28 @@
 import unittest
-from expr import Binary, Unary, Literal
+from expr import (
+    Binary,
+    Unary,
+    Literal,
+    Logical,
+    FloatBinary,
+    StringConcat,
+    FloatNegate,
+    Not,
+    And,
+)
 from lox_token import Token, TokenType
+from scanner import Scanner
+from lox_parser import Parser
+from resolver import Resolver
 
-from interpreter import Interpreter, InvalidOperatorError, LoxRuntimeError
+from interpreter import (
+    Interpreter,
+    InvalidOperatorError,
+    LoxRuntimeError,
+    LoxInstance,
+    LoxRuntimeClass,
+    MAX_SHAPE_FIELDS,
+)
 
 
 class TestInterpreterClass(unittest.TestCase):
@@ -59,3 +79,117 @@ class TestInterpreterClass(unittest.TestCase):
         expr = Binary(Literal(10.0), Token(TokenType.FUN, None, 1), Literal(10.0))
         with self.assertRaises(InvalidOperatorError):
             Interpreter()._evaluate(expr)
+
+    def test_instances_share_shapes(self):
+        klass = LoxRuntimeClass("Point", None, dict())
+        first = LoxInstance(klass)
+        second = LoxInstance(klass)
+        for instance in (first, second):
+            instance.set("x", 1.0)
+            instance.set("y", 2.0)
+
+        self.assertIs(first._shape, second._shape)
+        self.assertEqual(first._shape.slots, {"x": 0, "y": 1})
+
+        second.set("x", 3.0)
+        self.assertIs(first._shape, second._shape)
+        self.assertEqual(second.get(Token(TokenType.IDENTIFIER, "x", 1)), 3.0)
+
+    def test_instance_with_many_fields(self):
+        klass = LoxRuntimeClass("Big", None, dict())
+        instance = LoxInstance(klass)
+        names = [f"field{i}" for i in range(MAX_SHAPE_FIELDS + 10)]
+        for i, name in enumerate(names):
+            instance.set(name, float(i))
+
+        self.assertFalse(instance._shape.shared)
+        for i, name in enumerate(names):
+            self.assertEqual(instance.get(Token(TokenType.IDENTIFIER, name, 1)), i)
+
+    def test_binary_quickens(self):
+        interpreter = Interpreter()
+        add = Binary(Literal(1.0), Token(TokenType.PLUS, None, 1), Literal(2.0))
+        self.assertEqual(interpreter._evaluate(add), 3.0)
+        self.assertIs(type(add), FloatBinary)
+        self.assertEqual(interpreter._evaluate(add), 3.0)
+
+        concat = Binary(Literal("a"), Token(TokenType.PLUS, None, 1), Literal("b"))
+        self.assertEqual(interpreter._evaluate(concat), "ab")
+        self.assertIs(type(concat), StringConcat)
+
+    def test_binary_deoptimizes(self):
+        interpreter = Interpreter()
+        add = Binary(Literal(1.0), Token(TokenType.PLUS, None, 1), Literal(2.0))
+        interpreter._evaluate(add)
+
+        add.right = Literal("x")
+        with self.assertRaises(InvalidOperatorError):
+            interpreter._evaluate(add)
+        self.assertIs(type(add), Binary)
+        self.assertTrue(add.deoptimized)
+
+        # Stays generic rather than flipping between specializations
+        add.right = Literal(2.0)
+        self.assertEqual(interpreter._evaluate(add), 3.0)
+        self.assertIs(type(add), Binary)
+
+    def test_invalid_operands_stay_generic(self):
+        expr = Binary(Literal(1.0), Token(TokenType.MINUS, None, 1), Literal("x"))
+        with self.assertRaises(InvalidOperatorError):
+            Interpreter()._evaluate(expr)
+        self.assertIs(type(expr), Binary)
+        self.assertFalse(expr.deoptimized)
+
+    def test_unary_and_logical_quicken(self):
+        interpreter = Interpreter()
+        negate = Unary(Token(TokenType.MINUS, None, 1), Literal(1.0))
+        self.assertEqual(interpreter._evaluate(negate), -1.0)
+        self.assertIs(type(negate), FloatNegate)
+
+        negate.right = Literal("x")
+        with self.assertRaises(InvalidOperatorError):
+            interpreter._evaluate(negate)
+        self.assertIs(type(negate), Unary)
+
+        bang = Unary(Token(TokenType.BANG, None, 1), Literal(None))
+        self.assertTrue(interpreter._evaluate(bang))
+        self.assertIs(type(bang), Not)
+
+        both = Logical(Literal(1.0), Token(TokenType.AND, None, 1), Literal(False))
+        self.assertFalse(interpreter._evaluate(both))
+        self.assertIs(type(both), And)
+
+    def test_break_and_continue_need_a_loop(self):
+        for source in [
+            "break;",
+            "fun f() { continue; }",
+            "while (true) { fun f() { break; } }",
+        ]:
+            statements = Parser(Scanner(source).scan_tokens().value).parse().value
+            with self.assertRaises(LoxRuntimeError):
+                Resolver(Interpreter())._resolve_stmts(statements)
+
+    def test_blocks_without_declarations_share_the_scope(self):
+        source = """
+            fun f() {
+                var total = 0;
+                for (var i = 0; i < 3; i = i + 1) { { total = total + i; } }
+                { var inner = total; total = inner * 2; }
+                return total;
+            }
+            assert(f() == 6);
+            """
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        interpreter = Interpreter()
+        Resolver(interpreter)._resolve_stmts(statements)
+
+        total, loop, inner, _ = statements[0].body
+        body = loop.body
+        self.assertFalse(body.needs_scope)
+        self.assertFalse(body.statements[0].needs_scope)
+        # Only the for loop's own scope sits between the assignment and total
+        assign = body.statements[0].statements[0].expression
+        self.assertEqual(assign.depth, 1)
+        self.assertTrue(inner.needs_scope)
+
+        interpreter.interpret(statements)
@@ -0,0 +1,240 @@
+import unittest
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from optimizer import ConstantFolder, Inliner, LoopInvariantCodeMotion, _Size
+from expr import Binary, Call, Literal, Unary, Variable
+from stmt import Block, Expression, For, If, Var, While
+
+
+class TestOptimizerClass(unittest.TestCase):
+    def _fold(self, source: str) -> list:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+        return ConstantFolder().transform(statements)
+
+    def _folded_expr(self, source: str):
+        (statement,) = self._fold(source)
+        return statement.expression
+
+    def test_fold_arithmetic(self):
+        self.assertEqual(self._folded_expr("60 * 60 * 24;"), Literal(86400.0))
+        self.assertEqual(self._folded_expr("(1 + 2) * -3;"), Literal(-9.0))
+
+    def test_fold_strings_and_bools(self):
+        self.assertEqual(self._folded_expr('"a" + "b" + "c";'), Literal("abc"))
+        self.assertEqual(self._folded_expr("!true;"), Literal(False))
+        self.assertEqual(self._folded_expr("1 < 2 == true;"), Literal(True))
+
+    def test_fold_logical(self):
+        self.assertEqual(self._folded_expr('nil or "x";'), Literal("x"))
+        self.assertEqual(self._folded_expr("false and missing;"), Literal(False))
+        folded = self._folded_expr("true and missing;")
+        self.assertEqual(type(folded), Variable)
+        self.assertEqual(folded.name.value, "missing")
+
+    def test_invalid_operands_are_not_folded(self):
+        self.assertEqual(type(self._folded_expr('1 - "x";')), Binary)
+        self.assertEqual(type(self._folded_expr("1 / 0;")), Binary)
+        self.assertEqual(type(self._folded_expr('-"x";')), Unary)
+
+    def test_propagate_constant_locals(self):
+        (fun,) = self._fold(
+            """
+            fun f() {
+                var a = 2 * 3;
+                var b;
+                var c = 1;
+                c = 2;
+                return a + c;
+            }
+            """
+        )
+        a, b, c, assign, ret = fun.body
+        self.assertEqual(a.initializer, Literal(6.0))
+        self.assertEqual(type(ret.value), Binary)
+        self.assertEqual(ret.value.left, Literal(6.0))
+        self.assertEqual(type(ret.value.right), Variable)
+
+    def test_globals_are_not_propagated(self):
+        _, statement = self._fold("var a = 1; a + 1;")
+        self.assertEqual(type(statement.expression), Binary)
+
+    def test_prune_dead_branches(self):
+        statements = self._fold(
+            """
+            if (false) print "dead";
+            if (1 > 2) print "dead"; else print "alive";
+            while (false) print "dead";
+            while (!true) { print "dead"; }
+            """
+        )
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(statements[0].expression, Literal("alive"))
+
+    def test_pruned_loop_body_keeps_a_statement(self):
+        (loop,) = self._fold("while (true) if (false) print 1;")
+        self.assertEqual(loop.body, Block([]))
+
+    def _hoist(self, source: str) -> list:
+        return LoopInvariantCodeMotion().transform(self._fold(source))
+
+    def test_hoist_invariant_expression(self):
+        (fun,) = self._hoist(
+            """
+            fun f(n, scale) {
+                var total = 0;
+                while (total < n) total = total + scale * 2;
+                return total;
+            }
+            """
+        )
+        peeled = fun.body[1]
+        self.assertEqual(type(peeled), If)
+        first_iteration, temp, loop = peeled.then_branch.statements
+        self.assertEqual(type(temp), Var)
+        self.assertEqual(temp.name.value, "$licm0")
+        self.assertEqual(type(temp.initializer), Binary)
+        self.assertEqual(type(loop), While)
+        self.assertEqual(loop.body.expression.value.right.name.value, "$licm0")
+
+    def test_variant_expressions_stay(self):
+        (fun,) = self._hoist(
+            """
+            fun f(n) {
+                var i = 0;
+                while (i < n) {
+                    var step = i * 2;
+                    i = i + step * 2 + 1;
+                    if (i > n) i = n * 2;
+                }
+            }
+            """
+        )
+        self.assertEqual(type(fun.body[1]), While)
+
+    def test_hoist_from_for_loop(self):
+        (fun,) = self._hoist(
+            """
+            fun f(n, scale) {
+                var total = 0;
+                for (var i = 0; i < n * scale; i = i + 1) total = total + i;
+                return total;
+            }
+            """
+        )
+        counter, peeled = fun.body[1].statements
+        self.assertEqual(counter.name.value, "i")
+        first_iteration, increment, temp, loop = peeled.then_branch.statements
+        self.assertEqual(type(increment), Expression)
+        self.assertEqual(temp.name.value, "$licm0")
+        self.assertEqual(type(loop), For)
+        self.assertEqual(loop.initializer, None)
+        self.assertEqual(loop.condition.right.name.value, "$licm0")
+
+    def test_loops_that_break_are_not_peeled(self):
+        (fun,) = self._hoist(
+            """
+            fun f(n, scale) {
+                var total = 0;
+                for (var i = 0; i < n; i = i + 1) {
+                    if (total > scale * 2) break;
+                    total = total + i;
+                }
+                while (total > 0) {
+                    total = total - scale * 2;
+                    if (total < n) continue;
+                }
+                return total;
+            }
+            """
+        )
+        self.assertEqual(type(fun.body[1]), For)
+        self.assertEqual(type(fun.body[2]), While)
+
+    def test_nested_loops_peel_once(self):
+        for loop in [
+            "var i{0} = 0;"
+            " while (i{0} < n) {{ t = t + s * {0}; {1} i{0} = i{0} + 1; }}",
+            "for (var i{0} = 0; i{0} < n; i{0} = i{0} + 1) {{ t = t + s * {0}; {1} }}",
+        ]:
+            body = "t = t + s * 2;"
+            for depth in range(12):
+                body = loop.format(depth, body)
+            source = f"fun f(n, s) {{ var t = 0; {body} return t; }}"
+            sizes = []
+            for statements in [self._fold(source), self._hoist(source)]:
+                size = _Size()
+                size._stmt(statements[0])
+                sizes.append(size.nodes)
+            original, hoisted = sizes
+            # Peeling every level would double the tree 12 times over
+            self.assertGreater(hoisted, original)
+            self.assertLess(hoisted, original * 2)
+
+    def test_resolver_finds_counted_loops(self):
+        (fun,) = self._fold(
+            """
+            fun f(n) {
+                for (var i = 0; i < n; i = i + 1) print i;
+                for (var i = n; i >= 0; i = i - 2) print i;
+                for (var i = 0; i < n; i = i + n) print i;
+                for (var i = 0; i < n; i = i + 1) i = i + 1;
+                for (var i = 0; n > i; i = i + 1) print i;
+                var j = 0;
+                for (; j < n; j = j + 1) print j;
+            }
+            """
+        )
+        Resolver(Interpreter())._resolve_stmts([fun])
+        loops = [stmt for stmt in fun.body if type(stmt) == For]
+        self.assertEqual(
+            [loop.counted for loop in loops], [True, True, False, False, False, True]
+        )
+
+    def _inline(self, source: str, inliner: Inliner = None) -> Inliner:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+        inliner = inliner if inliner != None else Inliner()
+        self._inlined = inliner.transform(statements)
+        return inliner
+
+    def test_inline_small_function(self):
+        inliner = self._inline("fun sq(x) { return x * x; } sq(3);")
+        self.assertEqual(inliner.inlined, [("sq", 1)])
+        inlined = self._inlined[1].expression
+        self.assertEqual(inlined, Binary(Literal(3.0), inlined.operator, Literal(3.0)))
+
+    def test_inline_thresholds(self):
+        source = "fun add(a, b) { return a + b; } add(1, 2); add(3, 4);"
+        self.assertEqual(self._inline(source, Inliner(max_size=2)).inlined, [])
+        self.assertEqual(len(self._inline(source, Inliner(max_sites=1)).inlined), 1)
+        self.assertEqual(type(self._inlined[2].expression), Call)
+
+    def test_functions_not_inlined(self):
+        inliner = self._inline(
+            """
+            early(1);
+            fun early(n) { return n; }
+            fun fact(n) { return n < 2 and 1 or n * fact(n - 1); }
+            fun twice(n) { return n; }
+            fun twice(n) { return n + n; }
+            fun reassigned(n) { return n; }
+            reassigned = nil;
+            fun long(n) { var m = n; return m; }
+            fact(3); twice(1); long(1);
+            """
+        )
+        self.assertEqual(inliner.inlined, [])
+
+    def test_argument_order(self):
+        inliner = self._inline(
+            """
+            fun sub(a, b) { return a - b; }
+            fun rev(a, b) { return b - a; }
+            fun sq(x) { return x * x; }
+            fun f(n) { sub(f(1), f(2)); rev(f(1), f(2)); sq(f(1)); sq(n); }
+            """
+        )
+        self.assertEqual(inliner.inlined, [("sub", 5), ("sq", 5)])
@@ -1,9 +1,10 @@
 from result import Result
-from stmt import Print, Block, Var, Stmt
+from stmt import Print, Block, Var, Stmt, For, Break, Continue, While
 from typing import Any
-from expr import Literal, Unary, Binary, Variable, Assign, Logical
+from expr import Literal, Unary, Binary, Variable, Assign, Logical, Call, Invoke
 from lox_token import Token, TokenType
 from lox_parser import Parser, ParseError
+from scanner import Scanner
 import unittest
 
 
@@ -132,6 +133,28 @@ class TestParserClass(unittest.TestCase):
         assign_stmt = result.value[0]
         self.assertTrue(isinstance(assign_stmt.expression, Assign))
 
+    def test_method_call_is_invoke(self):
+        tokens = [
+            self._token(TokenType.IDENTIFIER, "obj"),
+            self._token(TokenType.DOT),
+            self._token(TokenType.IDENTIFIER, "method"),
+            self._token(TokenType.LEFT_PAREN),
+            self._num_token,
+            self._token(TokenType.RIGHT_PAREN),
+            self._token(TokenType.LEFT_PAREN),
+            self._token(TokenType.RIGHT_PAREN),
+            self._eof_token,
+        ]
+        parser = Parser(tokens)
+        result = parser._expression()
+
+        # obj.method(25.25)() invokes the method and then calls what it returns
+        self.assertTrue(isinstance(result, Call))
+        invoke = result.callee
+        self.assertTrue(isinstance(invoke, Invoke))
+        self.assertEqual(invoke.name.value, "method")
+        self.assertEqual(len(invoke.arguments), 1)
+
     def test_assignment_no_var(self):
         tokens = [
             self._num_token,
@@ -195,6 +218,75 @@ class TestParserClass(unittest.TestCase):
 
         self._assert_result_stmt_type(result, Block)
 
+    def test_for_statement(self):
+        tokens = [
+            self._token(TokenType.FOR),
+            self._token(TokenType.LEFT_PAREN),
+            self._token(TokenType.SEMICOLON),
+            self._token(TokenType.SEMICOLON),
+            self._token(TokenType.IDENTIFIER, "i"),
+            self._token(TokenType.EQUAL),
+            self._num_token,
+            self._token(TokenType.RIGHT_PAREN),
+            self._token(TokenType.PRINT),
+            self._num_token,
+            self._token(TokenType.SEMICOLON),
+            self._eof_token,
+        ]
+        parser = Parser(tokens)
+        result = parser.parse()
+
+        self._assert_result_stmt_type(result, For)
+        loop = result.value[0]
+        self.assertEqual(loop.initializer, None)
+        self.assertEqual(loop.condition, Literal(True))
+        self.assertEqual(type(loop.increment), Assign)
+        self.assertEqual(type(loop.body), Print)
+
+    def test_break_and_continue(self):
+        tokens = [
+            self._token(TokenType.WHILE),
+            self._token(TokenType.LEFT_PAREN),
+            self._token(TokenType.TRUE),
+            self._token(TokenType.RIGHT_PAREN),
+            self._token(TokenType.LEFT_BRACE),
+            self._token(TokenType.CONTINUE),
+            self._token(TokenType.SEMICOLON),
+            self._token(TokenType.BREAK),
+            self._token(TokenType.SEMICOLON),
+            self._token(TokenType.RIGHT_BRACE),
+            self._eof_token,
+        ]
+        parser = Parser(tokens)
+        result = parser.parse()
+
+        self._assert_result_stmt_type(result, While)
+        continue_stmt, break_stmt = result.value[0].body.statements
+        self.assertEqual(type(continue_stmt), Continue)
+        self.assertEqual(type(break_stmt), Break)
+
+    def test_synchronize_stops_at_break_and_continue(self):
+        for keyword in [TokenType.BREAK, TokenType.CONTINUE]:
+            tokens = [
+                self._num_token,
+                self._num_token,
+                self._token(keyword),
+                self._num_token,
+                self._token(TokenType.SEMICOLON),
+                self._eof_token,
+            ]
+            parser = Parser(tokens)
+            result = parser.parse()
+
+            self.assertTrue(result.failure)
+            self.assertEqual(
+                [err.message for err in result.error],
+                [
+                    "Line 1: Expected ';' after expression",
+                    f"Line 1: Expected ';' after {keyword.value}",
+                ],
+            )
+
     def test_block_no_closing_brace(self):
         tokens = [
             self._token(TokenType.LEFT_BRACE),
@@ -247,3 +339,54 @@ class TestParserClass(unittest.TestCase):
         result = parser.parse()
 
         self._assert_result_parse_error(result)
+
+    def test_tokens_are_pulled_lazily(self):
+        pulled = []
+
+        def stream():
+            for token in [
+                self._token(TokenType.PRINT),
+                self._num_token,
+                self._token(TokenType.SEMICOLON),
+                self._eof_token,
+            ]:
+                pulled.append(token)
+                yield token
+
+        parser = Parser(stream())
+        self.assertEqual(len(pulled), 1)
+        self._assert_result_stmt_type(parser.parse(), Print)
+        self.assertEqual(len(pulled), 4)
+
+    def test_operator_precedence_and_associativity(self):
+        source = "a = -b - c - d * !e < 2 == f or g and h.i(1);"
+        (stmt,) = Parser(Scanner(source).scan_tokens().value).parse().value
+        assign = stmt.expression
+        self.assertEqual(type(assign), Assign)
+
+        either = assign.value
+        self.assertEqual(either.operator.token_type, TokenType.OR)
+        self.assertEqual(type(either), Logical)
+        self.assertEqual(either.right.operator.token_type, TokenType.AND)
+        self.assertEqual(type(either.right.right), Invoke)
+
+        equality = either.left
+        self.assertEqual(equality.operator.token_type, TokenType.EQUAL_EQUAL)
+        less = equality.left
+        self.assertEqual(less.operator.token_type, TokenType.LESS)
+        minus = less.left
+        self.assertEqual(minus.right.operator.token_type, TokenType.STAR)
+        self.assertEqual(type(minus.right.right), Unary)
+        self.assertEqual(minus.left.operator.token_type, TokenType.MINUS)
+        self.assertEqual(type(minus.left.left), Unary)
+        self.assertEqual(minus.left.right.name.value, "c")
+
+    def test_literals_share_nodes(self):
+        source = 'print 1 + 1; print "a" + "a"; print true == 1;'
+        one, text, truth = Parser(Scanner(source).scan_tokens().value).parse().value
+        self.assertIs(one.expression.left, one.expression.right)
+        self.assertIs(text.expression.left, text.expression.right)
+        self.assertIsNot(truth.expression.left, one.expression.left)
+        self.assertEqual(truth.expression.right.value, 1.0)
+        self.assertFalse(hasattr(one.expression, "__dict__"))
+        self.assertFalse(hasattr(one, "__dict__"))
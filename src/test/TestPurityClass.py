@@ -0,0 +1,108 @@
+import unittest
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter, MemoCache
+from resolver import Resolver
+from stmt import Fun
+from purity import PurityAnalyzer
+
+
+class TestPurityClass(unittest.TestCase):
+    def _pure_functions(self, source: str) -> set:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+        PurityAnalyzer().analyze(statements)
+        return {
+            stmt.name.value
+            for stmt in statements
+            if type(stmt) == Fun and stmt.is_pure
+        }
+
+    def _interpret(self, source: str, **kwargs) -> Interpreter:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        interpreter = Interpreter(**kwargs)
+        Resolver(interpreter)._resolve_stmts(statements)
+        PurityAnalyzer().analyze(statements)
+        interpreter.interpret(statements)
+        return interpreter
+
+    def test_recursive_functions_are_pure(self):
+        pure = self._pure_functions(
+            """
+            fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+            fun isEven(n) { if (n == 0) return true; return isOdd(n - 1); }
+            fun isOdd(n) { if (n == 0) return false; return isEven(n - 1); }
+            fun sum(n) { var total = 0; while (n > 0) { total = total + n; n = n - 1; } return total; }
+            """
+        )
+        self.assertEqual(pure, {"fib", "isEven", "isOdd", "sum"})
+
+    def test_side_effects_are_impure(self):
+        pure = self._pure_functions(
+            """
+            var count = 0;
+            fun printer(n) { print n; }
+            fun counter(n) { count = count + 1; return n; }
+            fun reader(n) { return count + n; }
+            fun setter(o) { o.field = 1; }
+            fun getter(o) { return o.field; }
+            fun timer() { return clock(); }
+            fun maker() { fun inner() {} return inner; }
+            fun caller(n) { return printer(n); }
+            """
+        )
+        self.assertEqual(pure, set())
+
+    def test_redeclared_or_reassigned_functions_are_impure(self):
+        pure = self._pure_functions(
+            """
+            fun a(n) { return n; }
+            fun a(n) { return n + 1; }
+            fun b(n) { return n; }
+            b = nil;
+            fun c(n) { return b(n); }
+            """
+        )
+        self.assertEqual(pure, set())
+
+    def test_memoized_calls(self):
+        interpreter = self._interpret(
+            "fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }"
+            "assert(fib(50) == 12586269025);"
+        )
+        (cache,) = interpreter.memo_caches
+        self.assertEqual(cache.name, "fib")
+        self.assertEqual(cache.misses, 51)
+        self.assertEqual(cache.hits, 48)
+
+    def test_memoization_off(self):
+        interpreter = self._interpret("fun f(n) { return n; } f(1);", memo_size=0)
+        self.assertEqual(interpreter.memo_caches, [])
+
+    def test_only_immutable_arguments_are_cached(self):
+        interpreter = self._interpret(
+            "fun id(x) { return x; } class A {}"
+            "assert(id(true) == true); assert(id(1) == 1); id(A); id(A);"
+            "id(0); id(-0);"
+        )
+        (cache,) = interpreter.memo_caches
+        self.assertEqual(cache.misses, 4)
+        self.assertEqual(cache.hits, 0)
+
+    def _evictions(self, policy: str) -> MemoCache:
+        interpreter = self._interpret(
+            "fun id(x) { return x; } id(1); id(2); id(1); id(3); id(1);",
+            memo_size=2,
+            memo_policy=policy,
+        )
+        return interpreter.memo_caches[0]
+
+    def test_lru_eviction(self):
+        # id(3) evicts id(2), the least recently used
+        cache = self._evictions("lru")
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+    def test_fifo_eviction(self):
+        # id(3) evicts id(1), the oldest
+        cache = self._evictions("fifo")
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
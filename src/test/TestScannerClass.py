@@ -1,4 +1,7 @@
+import io
+import os
 import unittest
+import scanner
 from scanner import Scanner, UnexpectedCharError, UnterminatedStringError
 from lox_token import TokenType
 
@@ -111,6 +114,66 @@ class TestScannerClass(unittest.TestCase):
         self.assertEqual(token.token_type, TokenType.RETURN)
         self.assertEqual(token.value, keyword_token)
 
+    def _scan_both(self, source: str) -> list:
+        results = []
+        for mode in ["regex", "chars"]:
+            result = Scanner(source, mode).scan_tokens()
+            if result.failure:
+                results.append([(type(e), e.line, e.message) for e in result.error])
+            else:
+                results.append([(t.token_type, t.value, t.line) for t in result.value])
+        return results
+
+    def test_modes_scan_scripts_alike(self):
+        script_dir = os.path.join(os.path.dirname(__file__), "test_scripts")
+        for file_name in sorted(os.listdir(script_dir)):
+            with open(os.path.join(script_dir, file_name)) as file:
+                regex, chars = self._scan_both(file.read())
+            self.assertEqual(regex, chars, file_name)
+
+    def test_modes_report_errors_alike(self):
+        for source in [
+            'var a = "one\ntwo";\n@ _x "three\n',
+            "1.\n.5 $ a\x0b\x1cb\n//\n/ /",
+            "caf\u00e9 = 1; x\u00a0= \"\u00e9\";",
+            "a \u0663 b\n\u00e9",
+        ]:
+            regex, chars = self._scan_both(source)
+            self.assertEqual(regex, chars, repr(source))
+
+    def test_stream_file_in_chunks(self):
+        source = 'var a = 12.5; // note\nprint "two\nlines" + a;\nab_c\u00e9.d @'
+        expected = Scanner(source, "chars")
+        expected_tokens = list(expected.stream())
+        chunk_size = scanner.CHUNK_SIZE
+        try:
+            for size in [1, 2, 3, 7]:
+                scanner.CHUNK_SIZE = size
+                streamed = Scanner(io.StringIO(source))
+                tokens = list(streamed.stream())
+                self.assertEqual(
+                    [(t.token_type, t.value, t.line) for t in tokens],
+                    [(t.token_type, t.value, t.line) for t in expected_tokens],
+                )
+                self.assertEqual(
+                    [err.message for err in streamed.errors],
+                    [err.message for err in expected.errors],
+                )
+        finally:
+            scanner.CHUNK_SIZE = chunk_size
+
+    def test_identifiers_are_interned(self):
+        for mode in ["regex", "chars"]:
+            tokens = Scanner("name name and", mode).scan_tokens().value
+            first, second, keyword, _ = tokens
+            self.assertIs(first.value, second.value)
+            self.assertIs(keyword.value, TokenType.AND.value)
+            self.assertFalse(hasattr(first, "__dict__"))
+
+    def test_multiline_string_has_its_last_line(self):
+        result = Scanner('\n"a\nb\n" x').scan_tokens()
+        self.assertEqual([token.line for token in result.value], [4, 4, 4])
+
 
 if __name__ == "__main__":
     unittest.main()
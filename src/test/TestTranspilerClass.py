@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter, LoxAssertFailedError
+from resolver import Resolver
+from runtime_errors import LoxRuntimeError, InvalidOperatorError
+from transpiler import Transpiler, TranspiledProgram, CodeCache
+
+
+class TestTranspilerClass(unittest.TestCase):
+    def _transpile(self, source: str) -> TranspiledProgram:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        interpreter = Interpreter()
+        Resolver(interpreter)._resolve_stmts(statements)
+        return Transpiler(interpreter._locals).transpile(statements)
+
+    def _run(self, source: str):
+        self._transpile(source).run()
+
+    def test_undefined_global_line(self):
+        with self.assertRaises(LoxRuntimeError) as ctx:
+            self._run("var a = 1;\nprint a +\n missing;")
+        self.assertEqual(ctx.exception.line, 3)
+        self.assertIn("missing", ctx.exception.message)
+
+    def test_operand_type_error_line(self):
+        with self.assertRaises(InvalidOperatorError) as ctx:
+            self._run('var a = 1;\nvar b = a -\n "x";')
+        self.assertEqual(ctx.exception.line, 2)
+
+    def test_operands_evaluated_before_type_error(self):
+        with self.assertRaises(LoxAssertFailedError):
+            self._run("var a = nil - assert(false);")
+
+    def test_wrong_arity(self):
+        with self.assertRaises(LoxRuntimeError):
+            self._run("fun f(a) { return a; } f(1, 2);")
+        with self.assertRaises(LoxRuntimeError):
+            self._run("class A { init(a) {} } A();")
+
+    def test_assert_line(self):
+        with self.assertRaises(LoxAssertFailedError) as ctx:
+            self._run("\n\nassert(false);")
+        self.assertEqual(ctx.exception.line, 3)
+
+    def test_closures_capture_per_iteration(self):
+        self._run(
+            """
+            var saved;
+            var i = 0;
+            while (i < 3) {
+                var j = i;
+                fun get() { return j; }
+                if (i == 1) saved = get;
+                i = i + 1;
+            }
+            assert(saved() == 1);
+            """
+        )
+
+    def test_closures_share_assigned_variable(self):
+        self._run(
+            """
+            fun counter() {
+                var count = 0;
+                fun inc() { count = count + 1; return count; }
+                return inc;
+            }
+            var inc = counter();
+            inc();
+            assert(inc() == 2);
+            """
+        )
+
+    def test_program_round_trips_through_bytes(self):
+        program = self._transpile("var a = 1;\nassert(a == 2);")
+        loaded = TranspiledProgram.from_bytes(program.to_bytes())
+
+        with self.assertRaises(LoxAssertFailedError) as ctx:
+            loaded.run()
+        self.assertEqual(ctx.exception.line, 2)
+
+    def test_code_cache(self):
+        source = "var a = 1;"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = CodeCache(os.path.join(cache_dir, "nested"))
+            self.assertEqual(cache.get(source), None)
+
+            cache.put(source, self._transpile(source))
+            self.assertNotEqual(cache.get(source), None)
+            self.assertEqual(cache.get(source + " "), None)
+            other_settings = CodeCache(cache.cache_dir, (16, 0))
+            self.assertEqual(other_settings.get(source), None)
+
+    def test_corrupt_cache_entry_is_a_miss(self):
+        source = "var a = 1;"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = CodeCache(cache_dir)
+            with open(cache._path(source), "wb") as file:
+                file.write(b"not marshal data")
+            self.assertEqual(cache.get(source), None)
@@ -0,0 +1,137 @@
+import unittest
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from optimizer import ASTTransformer
+from runtime_errors import LoxRuntimeError
+from type_inference import TypeInference
+
+
+class _Operators(ASTTransformer):
+    """Collects the operator and operand_type of every Binary and Unary."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.types = []
+
+    def visit_binary_expr(self, expr):
+        super().visit_binary_expr(expr)
+        self.types.append((expr.operator.token_type.value, expr.operand_type))
+        return expr
+
+    def visit_unary_expr(self, expr):
+        super().visit_unary_expr(expr)
+        self.types.append((expr.operator.token_type.value, expr.operand_type))
+        return expr
+
+
+class TestTypeInferenceClass(unittest.TestCase):
+    def _parse(self, source: str) -> list:
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+        TypeInference().infer(statements)
+        return statements
+
+    def _operand_types(self, source: str) -> list:
+        operators = _Operators()
+        operators.transform(self._parse(source))
+        return operators.types
+
+    def test_literals_and_arithmetic(self):
+        types = self._operand_types(
+            """
+            fun f() {
+                var a = 1;
+                var s = "a";
+                return -(a * 2 + 3) < 4 and s + "b";
+            }
+            """
+        )
+        self.assertEqual(
+            types,
+            [("*", float), ("+", float), ("-", float), ("<", float), ("+", str)],
+        )
+
+    def test_checked_operands_are_refined(self):
+        types = self._operand_types(
+            """
+            fun fib(n) {
+                if (n < 2) return n;
+                return fib(n - 1) + fib(n - 2);
+            }
+            """
+        )
+        self.assertEqual(types, [("<", None), ("-", float), ("-", float), ("+", None)])
+
+    def test_loops_reach_a_fixed_point(self):
+        types = self._operand_types(
+            """
+            fun f(n) {
+                var i = 0;
+                var x = 0;
+                while (i < 10) {
+                    i = i + 1;
+                    n = x - 1;
+                    x = "s";
+                }
+            }
+            """
+        )
+        self.assertEqual(types, [("<", float), ("+", float), ("-", None)])
+
+    def test_breaks_and_continues_join(self):
+        types = self._operand_types(
+            """
+            fun f(c) {
+                var x = 1;
+                var y = 1;
+                var z = 1;
+                while (c) {
+                    if (c) { x = "s"; break; }
+                    if (c) { y = "s"; continue; }
+                    y = 2;
+                }
+                return (x - 1) + (y - 1) + (z - 1);
+            }
+            """
+        )
+        self.assertEqual(
+            types,
+            [("-", None), ("-", None), ("+", float), ("-", float), ("+", float)],
+        )
+
+    def test_branches_join(self):
+        types = self._operand_types(
+            """
+            fun f(c) {
+                var x = 1;
+                var y = 1;
+                if (c) x = "s"; else y = 2;
+                return (x - 1) + (y - 1);
+            }
+            """
+        )
+        self.assertEqual(types, [("-", None), ("-", float), ("+", float)])
+
+    def test_closure_assigned_locals_stay_checked(self):
+        types = self._operand_types(
+            """
+            fun f() {
+                var x = 1;
+                fun g() { x = "s"; }
+                g();
+                return x - 1;
+            }
+            """
+        )
+        self.assertEqual(types, [("-", None)])
+
+    def test_unproven_operands_still_raise(self):
+        statements = self._parse(
+            'fun f(a) { var b = a - 1; return b; } f(1); f("x");'
+        )
+        interpreter = Interpreter()
+        Resolver(interpreter)._resolve_stmts(statements)
+        with self.assertRaises(LoxRuntimeError):
+            interpreter.interpret(statements)
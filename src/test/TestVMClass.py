@@ -0,0 +1,87 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from scanner import Scanner
+from lox_parser import Parser
+from interpreter import Interpreter, LoxAssertFailedError
+from resolver import Resolver
+from compiler import Compiler
+from optimizer import optimize
+from bytecode import OP_ADD, OP_CONSTANT, OP_RETURN
+from runtime_errors import LoxRuntimeError, InvalidOperatorError
+from vm import VM
+
+
+class TestVMClass(unittest.TestCase):
+    def _compile(self, source: str):
+        statements = Parser(Scanner(source).scan_tokens().value).parse().value
+        Resolver(Interpreter())._resolve_stmts(statements)
+        return Compiler().compile(statements)
+
+    def _run(self, source: str, max_frames: int = 1000):
+        VM(max_frames).interpret(self._compile(source))
+
+    def test_constants_are_pooled(self):
+        script = self._compile("1 + 1;")
+        chunk = script.chunk
+
+        self.assertEqual(chunk.constants, [1.0])
+        self.assertEqual(chunk.code[0], OP_CONSTANT)
+        self.assertIn(OP_ADD, chunk.code)
+        self.assertEqual(chunk.code[-1], OP_RETURN)
+        self.assertEqual(len(chunk.lines), len(chunk.code))
+
+    def test_constants_keep_the_sign_of_zero(self):
+        statements = Parser(Scanner("print 0; print -0;").scan_tokens().value).parse()
+        statements = optimize(statements.value)
+        Resolver(Interpreter())._resolve_stmts(statements)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            VM(1000).interpret(Compiler().compile(statements))
+
+        self.assertEqual(out.getvalue(), "0.0\n-0.0\n")
+
+    def test_operand_type_error_line(self):
+        with self.assertRaises(InvalidOperatorError) as ctx:
+            self._run('var a = 1;\nvar b = a -\n "x";')
+        self.assertEqual(ctx.exception.line, 2)
+
+    def test_undefined_global(self):
+        with self.assertRaises(LoxRuntimeError):
+            self._run("print missing;")
+
+    def test_wrong_arity(self):
+        with self.assertRaises(LoxRuntimeError):
+            self._run("fun f(a) { return a; } f(1, 2);")
+
+    def test_assert_line(self):
+        with self.assertRaises(LoxAssertFailedError) as ctx:
+            self._run("\n\nassert(false);")
+        self.assertEqual(ctx.exception.line, 3)
+
+    def test_closures_capture_per_iteration(self):
+        self._run(
+            """
+            var saved;
+            for (var i = 0; i < 3; i = i + 1) {
+                var j = i;
+                fun get() { return j; }
+                if (i == 1) saved = get;
+            }
+            assert(saved() == 1);
+            """
+        )
+
+    def test_stack_overflow(self):
+        with self.assertRaises(LoxRuntimeError):
+            self._run("fun f(n) { return 1 + f(n + 1); } f(0);", max_frames=50)
+
+    def test_tail_calls_reuse_frames(self):
+        self._run(
+            "fun f(n) { if (n == 0) return 0; return f(n - 1); } assert(f(1000) == 0);",
+            max_frames=50,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,972 @@
+import os
+import re
+import marshal
+import hashlib
+import importlib.util
+from types import CodeType, FunctionType, MethodType
+from typing import Any
+from expr import (
+    ExprVisitor,
+    Expr,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Expression,
+    Print,
+    Stmt,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+from interpreter import (
+    LoxCallable,
+    LoxAssertFailedError,
+    ClockFn,
+    AssertFn,
+    AssertFalseFn,
+)
+from lox_token import Token, TokenType
+from runtime_errors import LoxRuntimeError, InvalidOperatorError
+
+
+# Bump whenever the generated code changes shape so stale cache entries are ignored
+_CACHE_VERSION = 1
+_FILENAME = "<lox>"
+_INDENT = "    "
+
+_NUM_OPERATORS = {
+    TokenType.MINUS,
+    TokenType.STAR,
+    TokenType.SLASH,
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+}
+
+
+# Runtime support, the generated code reaches all of these through its globals
+
+
+class TranspiledClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str, superclass: "TranspiledClass", methods: dict):
+        self.name = name
+        # Copied down from the superclass so lookups are a single dict access
+        self.methods = dict(superclass.methods) if superclass != None else dict()
+        self.methods.update(methods)
+
+
+class TranspiledInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: TranspiledClass) -> None:
+        self.klass = klass
+        self.fields = dict()
+
+    def __str__(self) -> str:
+        return self.klass.name
+
+
+def _token(line: int, type: TokenType = TokenType.EOF) -> Token:
+    return Token(type, None, line)
+
+
+def _arity_error(expected: int, received: int, line: int) -> LoxRuntimeError:
+    return LoxRuntimeError(
+        f"Wrong number of args, expected {expected} but recieved {received}",
+        _token(line),
+    )
+
+
+def _lox_op_error(operator: str, line: int, *values: Any):
+    raise InvalidOperatorError(_token(line, TokenType(operator)), *values)
+
+
+def _lox_call(callee: Any, line: int, *args: Any) -> Any:
+    callee_type = type(callee)
+    if callee_type is FunctionType:
+        arity = callee.__code__.co_argcount
+        if arity != len(args):
+            raise _arity_error(arity, len(args), line)
+        return callee(*args)
+
+    if callee_type is MethodType:
+        arity = callee.__func__.__code__.co_argcount - 1
+        if arity != len(args):
+            raise _arity_error(arity, len(args), line)
+        return callee(*args)
+
+    if callee_type is TranspiledClass:
+        instance = TranspiledInstance(callee)
+        initializer = callee.methods.get("init")
+        if initializer != None:
+            arity = initializer.__code__.co_argcount - 1
+            if arity != len(args):
+                raise _arity_error(arity, len(args), line)
+            initializer(instance, *args)
+        elif len(args) != 0:
+            raise _arity_error(0, len(args), line)
+        return instance
+
+    if isinstance(callee, LoxCallable):
+        if callee.arity() != len(args):
+            raise _arity_error(callee.arity(), len(args), line)
+        try:
+            return callee.call(None, list(args))
+        except LoxAssertFailedError as err:
+            err.line = line
+            raise err
+
+    raise LoxRuntimeError("Can only call functions and classes", _token(line))
+
+
+def _lox_invoke(obj: Any, name: str, line: int, *args: Any) -> Any:
+    if type(obj) is not TranspiledInstance:
+        raise LoxRuntimeError("Can only call propertes on objects", _token(line))
+
+    if name in obj.fields:
+        return _lox_call(obj.fields[name], line, *args)
+
+    method = obj.klass.methods.get(name)
+    if method == None:
+        raise LoxRuntimeError(f"Undefined property: {name}.", _token(line))
+    if method.__code__.co_argcount != len(args) + 1:
+        raise _arity_error(method.__code__.co_argcount - 1, len(args), line)
+    return method(obj, *args)
+
+
+def _lox_get(obj: Any, name: str, line: int) -> Any:
+    if type(obj) is not TranspiledInstance:
+        raise LoxRuntimeError("Can only call propertes on objects", _token(line))
+
+    fields = obj.fields
+    if name in fields:
+        return fields[name]
+
+    method = obj.klass.methods.get(name)
+    if method == None:
+        raise LoxRuntimeError(f"Undefined property: {name}.", _token(line))
+    return MethodType(method, obj)
+
+
+def _lox_instance(obj: Any, line: int) -> TranspiledInstance:
+    if type(obj) is not TranspiledInstance:
+        raise LoxRuntimeError("Only instances have fields", _token(line))
+    return obj
+
+
+def _lox_set_field(obj: TranspiledInstance, name: str, value: Any) -> Any:
+    obj.fields[name] = value
+    return value
+
+
+def _lox_super(superclass: TranspiledClass, this: Any, name: str, line: int) -> Any:
+    method = superclass.methods.get(name)
+    if method == None:
+        raise LoxRuntimeError(f"Undefined property {name}", _token(line))
+    return MethodType(method, this)
+
+
+def _lox_superclass(value: Any, line: int) -> TranspiledClass:
+    if type(value) is not TranspiledClass:
+        raise LoxRuntimeError("Superclass must be a class.", _token(line))
+    return value
+
+
+def _lox_store(box: list, value: Any) -> Any:
+    box[0] = value
+    return value
+
+
+_RUNTIME = {
+    "_lox_function": FunctionType,
+    "_lox_op_error": _lox_op_error,
+    "_lox_call": _lox_call,
+    "_lox_invoke": _lox_invoke,
+    "_lox_get": _lox_get,
+    "_lox_instance": _lox_instance,
+    "_lox_set_field": _lox_set_field,
+    "_lox_super": _lox_super,
+    "_lox_superclass": _lox_superclass,
+    "_lox_store": _lox_store,
+    "_lox_class": TranspiledClass,
+}
+
+
+class TranspiledProgram:
+    code: CodeType
+    # Indexed by python line - 1, holds the Lox line of that python line and the
+    # Lox line of each global read on it so a NameError can be reported like Lox would
+    line_map: list[tuple[int, dict[str, int]]]
+
+    def __init__(self, code: CodeType, line_map: list) -> None:
+        self.code = code
+        self.line_map = line_map
+
+    def to_bytes(self) -> bytes:
+        return marshal.dumps((self.code, self.line_map))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TranspiledProgram":
+        code, line_map = marshal.loads(data)
+        return cls(code, line_map)
+
+    def run(self) -> None:
+        namespace = dict(_RUNTIME)
+        namespace["g_clock"] = ClockFn()
+        namespace["g_assert"] = AssertFn()
+        namespace["g_assertFalse"] = AssertFalseFn()
+
+        def global_set(name: str, value: Any, line: int) -> Any:
+            if name not in namespace:
+                raise LoxRuntimeError(
+                    f"Variable {name[2:]} not initialized before assignment",
+                    _token(line),
+                )
+            namespace[name] = value
+            return value
+
+        namespace["_lox_global_set"] = global_set
+
+        try:
+            exec(self.code, namespace)
+        except NameError as err:
+            lox_err = self._translate_name_error(err)
+            if lox_err == None:
+                raise err
+            raise lox_err from None
+        except RecursionError as err:
+            # Transpiled calls are plain python calls, so python's recursion limit
+            # is the Lox call depth limit
+            lineno = self._innermost_lineno(err)
+            if lineno == None:
+                raise err
+            line = self.line_map[lineno - 1][0]
+            raise LoxRuntimeError("Stack overflow.", _token(line)) from None
+
+    def _innermost_lineno(self, err: Exception) -> int:
+        lineno = None
+        tb = err.__traceback__
+        while tb != None:
+            if tb.tb_frame.f_code.co_filename == _FILENAME:
+                lineno = tb.tb_lineno
+            tb = tb.tb_next
+        return lineno
+
+    def _translate_name_error(self, err: NameError) -> LoxRuntimeError:
+        if isinstance(err, UnboundLocalError):
+            return None
+        match = re.search(r"name '(g_\w+)' is not defined", str(err))
+        if match == None:
+            return None
+
+        lineno = self._innermost_lineno(err)
+        if lineno == None:
+            return None
+
+        name = match.group(1)[2:]
+        line, global_lines = self.line_map[lineno - 1]
+        line = global_lines.get(name, line)
+        return LoxRuntimeError(f"Variable {name} not found", _token(line))
+
+
+class CodeCache:
+    """
+    On disk cache of transpiled programs keyed by a hash of the Lox source and the
+    settings the program was compiled with, a hit skips scanning, parsing,
+    resolving and code generation entirely.
+    """
+
+    cache_dir: str
+    # Everything besides the source that changes the generated code, like the
+    # optimizer's thresholds
+    settings: tuple
+
+    def __init__(self, cache_dir: str, settings: tuple = ()) -> None:
+        self.cache_dir = cache_dir
+        self.settings = settings
+
+    def _path(self, source: str) -> str:
+        digest = hashlib.sha256()
+        # Marshalled code objects are only valid for the python version that made them
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(f"{_CACHE_VERSION}:{self.settings!r}:".encode())
+        digest.update(source.encode())
+        return os.path.join(self.cache_dir, digest.hexdigest() + ".loxc")
+
+    def get(self, source: str) -> TranspiledProgram:
+        try:
+            with open(self._path(source), "rb") as file:
+                return TranspiledProgram.from_bytes(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def put(self, source: str, program: TranspiledProgram) -> None:
+        path = self._path(source)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(program.to_bytes())
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only an optimization, failing to write it isn't an error
+            pass
+
+
+# Codegen
+
+
+class _Decl:
+    py_name: str
+    function_level: int
+    in_loop: bool
+    captured: bool
+
+    def __init__(self, py_name: str, function_level: int, in_loop: bool) -> None:
+        self.py_name = py_name
+        self.function_level = function_level
+        self.in_loop = in_loop
+        self.captured = False
+
+    @property
+    def boxed(self) -> bool:
+        # Python closures share one cell per call, but a Lox block inside a loop makes
+        # a fresh variable every iteration. Those get a list box bound at def time instead.
+        return self.captured and self.in_loop
+
+
+class _FunctionInfo:
+    # Outer declarations read or written anywhere inside the function, and the ones
+    # assigned directly in it which need a nonlocal statement
+    free: list[_Decl]
+    assigned: list[_Decl]
+
+    def __init__(self) -> None:
+        self.free = []
+        self.assigned = []
+
+
+class _ScopeAnalysis(ExprVisitor, StmtVisitor):
+    """
+    First pass over the resolved tree that maps every variable reference to the
+    declaration it resolves to and works out which locals are captured by closures.
+    Its scope stack mirrors Resolver's so the resolved depths index straight into it.
+    """
+
+    _locals: dict[Token, int]
+    _scopes: list[dict[str, _Decl]]
+    _functions: list[_FunctionInfo]
+    _loop_depths: list[int]
+    _counter: int
+
+    refs: dict[Token, _Decl]
+    decls: dict[Token, _Decl]
+    functions: dict[int, _FunctionInfo]
+    supers: dict[int, _Decl]
+
+    def __init__(self, locals: dict[Token, int]) -> None:
+        super().__init__()
+        self._locals = locals
+        self._scopes = []
+        self._functions = []
+        self._loop_depths = [0]
+        self._counter = 0
+        self.refs = dict()
+        self.decls = dict()
+        self.functions = dict()
+        self.supers = dict()
+
+    def analyze(self, statements: list[Stmt]) -> None:
+        self._walk_stmts(statements)
+
+    def _walk_stmts(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def _walk(self, node: Any) -> None:
+        node.accept(self)
+
+    def _declare(self, name: str, token: Token, py_name: str = None) -> _Decl:
+        if len(self._scopes) == 0:
+            return None
+
+        if py_name == None:
+            self._counter += 1
+            # Optimizer temporaries like $licm0 aren't python identifiers
+            py_name = f"l_{name.replace('$', '_')}_{self._counter}"
+        decl = _Decl(py_name, len(self._functions), self._loop_depths[-1] > 0)
+        self._scopes[-1][name] = decl
+        if token != None:
+            self.decls[token] = decl
+        return decl
+
+    def _reference(self, name: Token, is_assign: bool = False) -> None:
+        depth = self._locals.get(name)
+        if depth == None:
+            return
+
+        decl = self._scopes[-1 - depth][name.value]
+        self.refs[name] = decl
+        level = len(self._functions)
+        if decl.function_level < level:
+            decl.captured = True
+            for function in self._functions[decl.function_level :]:
+                if decl not in function.free:
+                    function.free.append(decl)
+            if is_assign and decl not in self._functions[-1].assigned:
+                self._functions[-1].assigned.append(decl)
+
+    def _function(self, stmt: Fun, is_method: bool) -> None:
+        info = _FunctionInfo()
+        self.functions[id(stmt)] = info
+        self._functions.append(info)
+        self._loop_depths.append(0)
+        self._scopes.append(dict())
+        if is_method:
+            self._declare("this", None, "this")
+        for param in stmt.params:
+            self._declare(param.value, param)
+
+        self._walk_stmts(stmt.body)
+
+        self._scopes.pop()
+        self._loop_depths.pop()
+        self._functions.pop()
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> None:
+        self._walk(expr.value)
+        self._reference(expr.name, True)
+
+    def visit_binary_expr(self, expr: "Binary") -> None:
+        self._walk(expr.left)
+        self._walk(expr.right)
+
+    def visit_call_expr(self, expr: "Call") -> None:
+        self._walk(expr.callee)
+        for arg in expr.arguments:
+            self._walk(arg)
+
+    def visit_get_expr(self, expr: "Get") -> None:
+        self._walk(expr.obj)
+
+    def visit_grouping_expr(self, expr: "Grouping") -> None:
+        self._walk(expr.expression)
+
+    def visit_invoke_expr(self, expr: "Invoke") -> None:
+        self._walk(expr.obj)
+        for arg in expr.arguments:
+            self._walk(arg)
+
+    def visit_literal_expr(self, expr: "Literal") -> None:
+        pass
+
+    def visit_logical_expr(self, expr: "Logical") -> None:
+        self._walk(expr.left)
+        self._walk(expr.right)
+
+    def visit_set_expr(self, expr: "Set") -> None:
+        self._walk(expr.object)
+        self._walk(expr.value)
+
+    def visit_super_expr(self, expr: "Super") -> None:
+        self._reference(expr.name)
+
+    def visit_this_expr(self, expr: "This") -> None:
+        self._reference(expr.name)
+
+    def visit_unary_expr(self, expr: "Unary") -> None:
+        self._walk(expr.right)
+
+    def visit_variable_expr(self, expr: "Variable") -> None:
+        self._reference(expr.name)
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> None:
+        self._walk(stmt.expression)
+
+    def visit_print_stmt(self, stmt: "Print") -> None:
+        self._walk(stmt.expression)
+
+    def visit_var_stmt(self, stmt: "Var") -> None:
+        if stmt.initializer != None:
+            self._walk(stmt.initializer)
+        self._declare(stmt.name.value, stmt.name)
+
+    def visit_block_stmt(self, stmt: "Block") -> None:
+        if not stmt.needs_scope:
+            self._walk_stmts(stmt.statements)
+            return
+        self._scopes.append(dict())
+        self._walk_stmts(stmt.statements)
+        self._scopes.pop()
+
+    def visit_if_stmt(self, stmt: "If") -> None:
+        self._walk(stmt.condition)
+        self._walk(stmt.then_branch)
+        if stmt.else_branch != None:
+            self._walk(stmt.else_branch)
+
+    def visit_while_stmt(self, stmt: "While") -> None:
+        self._loop_depths[-1] += 1
+        self._walk(stmt.condition)
+        self._walk(stmt.body)
+        self._loop_depths[-1] -= 1
+
+    def visit_for_stmt(self, stmt: "For") -> None:
+        # The initializer runs once, a counter it declares is one variable
+        needs_scope = type(stmt.initializer) == Var
+        if needs_scope:
+            self._scopes.append(dict())
+        if stmt.initializer != None:
+            self._walk(stmt.initializer)
+        self._loop_depths[-1] += 1
+        self._walk(stmt.condition)
+        self._walk(stmt.body)
+        if stmt.increment != None:
+            self._walk(stmt.increment)
+        self._loop_depths[-1] -= 1
+        if needs_scope:
+            self._scopes.pop()
+
+    def visit_break_stmt(self, stmt: "Break") -> None:
+        pass
+
+    def visit_continue_stmt(self, stmt: "Continue") -> None:
+        pass
+
+    def visit_fun_stmt(self, stmt: "Fun") -> None:
+        self._declare(stmt.name.value, stmt.name)
+        self._function(stmt, False)
+
+    def visit_return_stmt(self, stmt: "Return") -> None:
+        if stmt.value != None:
+            self._walk(stmt.value)
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> None:
+        self._declare(stmt.name.value, stmt.name)
+
+        if stmt.superclass != None:
+            self._walk(stmt.superclass)
+            self._scopes.append(dict())
+            self._counter += 1
+            # Methods bind super as a default argument, so it never needs a box
+            super_decl = self._declare("super", None, f"_super_{self._counter}")
+            super_decl.in_loop = False
+            self.supers[id(stmt)] = super_decl
+
+        for method in stmt.methods:
+            self._function(method, True)
+
+        if stmt.superclass != None:
+            self._scopes.pop()
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    """
+    Emits python source for a resolved program. Lox functions become python functions,
+    resolved locals become python locals or closure cells, and return is a real return.
+    Runtime errors are raised with the same messages and Lox line numbers as the
+    tree-walker through the helpers in _RUNTIME.
+    """
+
+    _analysis: _ScopeAnalysis
+    _lines: list[str]
+    _line_map: list[tuple[int, dict[str, int]]]
+    _line_globals: dict[str, int]
+    _indent: int
+    _line: int
+    _temp_counter: int
+    _is_initializer: bool
+    _globals: list[str]
+    # The increment of every loop being emitted, None for while loops. A continue
+    # in a for loop has to run it before jumping back to the condition
+    _loop_increments: list[Expr]
+
+    def __init__(self, locals: dict[Token, int]) -> None:
+        super().__init__()
+        self._analysis = _ScopeAnalysis(locals)
+        self._lines = []
+        self._line_map = []
+        self._line_globals = dict()
+        self._indent = 0
+        self._line = 0
+        self._temp_counter = 0
+        self._is_initializer = False
+        self._globals = []
+        self._loop_increments = []
+
+    def transpile(self, statements: list[Stmt]) -> TranspiledProgram:
+        return TranspiledProgram(self._compile(self.generate(statements)), self._line_map)
+
+    def _compile(self, source: str) -> CodeType:
+        return compile(source, _FILENAME, "exec")
+
+    def generate(self, statements: list[Stmt]) -> str:
+        self._analysis.analyze(statements)
+
+        self._emit("def _lox_main():")
+        self._indent += 1
+        globals_line = len(self._lines)
+        self._emit("pass")
+        self._emit_stmts(statements)
+        self._indent -= 1
+        self._emit("_lox_main()")
+
+        # Lox globals are python globals, _lox_main needs to declare the ones it defines
+        if len(self._globals) > 0:
+            self._lines[globals_line] = f"{_INDENT}global {', '.join(self._globals)}"
+
+        return "\n".join(self._lines) + "\n"
+
+    # Emitting
+
+    def _emit(self, text: str) -> None:
+        self._lines.append(_INDENT * self._indent + text)
+        self._line_map.append((self._line, self._line_globals))
+        self._line_globals = dict()
+
+    def _emit_stmts(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def _emit_suite(self, statements: list[Stmt]) -> None:
+        self._indent += 1
+        start = len(self._lines)
+        self._emit_stmts(statements)
+        if len(self._lines) == start:
+            self._emit("pass")
+        self._indent -= 1
+
+    def _temp(self) -> str:
+        self._temp_counter += 1
+        return f"_t{self._temp_counter}"
+
+    def _expr(self, expr: Expr) -> str:
+        return expr.accept(self)
+
+    def _set_line(self, token: Token) -> None:
+        self._line = token.line
+
+    def _read(self, name: Token) -> str:
+        decl = self._analysis.refs.get(name)
+        if decl == None:
+            self._line_globals.setdefault(name.value, name.line)
+            return f"g_{name.value}"
+        if decl.boxed:
+            return f"{decl.py_name}[0]"
+        return decl.py_name
+
+    def _target(self, name: Token) -> _Decl:
+        return self._analysis.decls.get(name)
+
+    def _define(self, name: Token, value: str) -> None:
+        decl = self._target(name)
+        if decl == None:
+            if f"g_{name.value}" not in self._globals:
+                self._globals.append(f"g_{name.value}")
+            self._emit(f"g_{name.value} = {value}")
+        elif decl.boxed:
+            self._emit(f"{decl.py_name} = [{value}]")
+        else:
+            self._emit(f"{decl.py_name} = {value}")
+
+    def _def_header(
+        self, py_name: str, params: list[str], info: _FunctionInfo, extra: list[str]
+    ) -> None:
+        defaults = [f"{decl.py_name}={decl.py_name}" for decl in info.free if decl.boxed]
+        defaults += extra
+        signature = ", ".join(params)
+        if len(defaults) > 0:
+            signature += (", " if signature else "") + "*, " + ", ".join(defaults)
+        self._emit(f"def {py_name}({signature}):")
+
+        nonlocals = [decl.py_name for decl in info.assigned if not decl.boxed]
+        if len(nonlocals) > 0:
+            self._emit(f"{_INDENT}nonlocal {', '.join(nonlocals)}")
+
+    def _function_body(self, stmt: Fun, is_initializer: bool) -> None:
+        enclosing = self._is_initializer
+        self._is_initializer = is_initializer
+        self._indent += 1
+        start = len(self._lines)
+        self._emit_stmts(stmt.body)
+        if is_initializer:
+            self._emit("return this")
+        elif len(self._lines) == start:
+            self._emit("pass")
+        self._indent -= 1
+        self._is_initializer = enclosing
+
+    def _params(self, stmt: Fun) -> list[str]:
+        return [self._target(param).py_name for param in stmt.params]
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> str:
+        value = self._expr(expr.value)
+        self._set_line(expr.name)
+        decl = self._analysis.refs.get(expr.name)
+        if decl == None:
+            return f'_lox_global_set("g_{expr.name.value}", {value}, {expr.name.line})'
+        if decl.boxed:
+            return f"_lox_store({decl.py_name}, {value})"
+        return f"({decl.py_name} := {value})"
+
+    def visit_binary_expr(self, expr: "Binary") -> str:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        self._set_line(expr.operator)
+        op_type = expr.operator.token_type
+        op = op_type.value
+        line = expr.operator.line
+
+        # Equality takes any operands, and TypeInference proved the operand types of
+        # the rest, python's operator is enough for both
+        if op_type == TokenType.EQUAL_EQUAL or op_type == TokenType.BANG_EQUAL:
+            return f"({left} {op} {right})"
+        if expr.operand_type != None:
+            return f"({left} {op} {right})"
+
+        lhs = self._temp()
+        rhs = self._temp()
+        error = f"_lox_op_error({op!r}, {line}, {lhs}, {rhs})"
+
+        if op_type == TokenType.PLUS:
+            check = (
+                f"type({lhs} := {left}) is type({rhs} := {right})"
+                f" and (type({lhs}) is float or type({lhs}) is str)"
+            )
+            return f"({lhs} + {rhs} if {check} else {error})"
+
+        if op_type in _NUM_OPERATORS:
+            # & rather than and so the right operand is always evaluated before erroring
+            check = (
+                f"(type({lhs} := {left}) is float) & (type({rhs} := {right}) is float)"
+            )
+            return f"({lhs} {op} {rhs} if {check} else {error})"
+
+        return f"_lox_op_error({op!r}, {line}, {left}, {right})"
+
+    def visit_call_expr(self, expr: "Call") -> str:
+        function = self._expr(expr.callee)
+        args = [self._expr(arg) for arg in expr.arguments]
+        self._set_line(expr.paren)
+        line = expr.paren.line
+        temp = self._temp()
+        arg_list = ", ".join(args)
+        slow_args = ", ".join([temp, str(line)] + args)
+
+        # Plain Lox functions are called directly, everything else goes through _lox_call
+        check = (
+            f"type({temp} := {function}) is _lox_function"
+            f" and {temp}.__code__.co_argcount == {len(args)}"
+        )
+        return f"({temp}({arg_list}) if {check} else _lox_call({slow_args}))"
+
+    def visit_get_expr(self, expr: "Get") -> str:
+        obj = self._expr(expr.obj)
+        self._set_line(expr.name)
+        return f"_lox_get({obj}, {expr.name.value!r}, {expr.name.line})"
+
+    def visit_grouping_expr(self, expr: "Grouping") -> str:
+        return self._expr(expr.expression)
+
+    def visit_invoke_expr(self, expr: "Invoke") -> str:
+        obj = self._expr(expr.obj)
+        args = [self._expr(arg) for arg in expr.arguments]
+        self._set_line(expr.paren)
+        all_args = ", ".join([obj, repr(expr.name.value), str(expr.paren.line)] + args)
+        return f"_lox_invoke({all_args})"
+
+    def visit_literal_expr(self, expr: "Literal") -> str:
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr: "Logical") -> str:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        if expr.operator.token_type == TokenType.OR:
+            return f"({left} or {right})"
+        return f"({left} and {right})"
+
+    def visit_set_expr(self, expr: "Set") -> str:
+        obj = self._expr(expr.object)
+        value = self._expr(expr.value)
+        self._set_line(expr.name)
+        instance = f"_lox_instance({obj}, {expr.name.line})"
+        return f"_lox_set_field({instance}, {expr.name.value!r}, {value})"
+
+    def visit_super_expr(self, expr: "Super") -> str:
+        self._set_line(expr.name)
+        superclass = self._read(expr.name)
+        method = expr.method.value
+        return f"_lox_super({superclass}, this, {method!r}, {expr.name.line})"
+
+    def visit_this_expr(self, expr: "This") -> str:
+        self._set_line(expr.name)
+        return self._read(expr.name)
+
+    def visit_unary_expr(self, expr: "Unary") -> str:
+        right = self._expr(expr.right)
+        self._set_line(expr.operator)
+        op_type = expr.operator.token_type
+        line = expr.operator.line
+
+        if op_type == TokenType.BANG:
+            return f"(not {right})"
+        if op_type == TokenType.MINUS and expr.operand_type != None:
+            return f"(-{right})"
+        if op_type == TokenType.MINUS:
+            temp = self._temp()
+            error = f"_lox_op_error('-', {line}, {temp})"
+            return f"(-{temp} if type({temp} := {right}) is float else {error})"
+
+        return f"_lox_op_error({op_type.value!r}, {line}, {right})"
+
+    def visit_variable_expr(self, expr: "Variable") -> str:
+        self._set_line(expr.name)
+        return self._read(expr.name)
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> None:
+        self._emit(self._expr(stmt.expression))
+
+    def visit_print_stmt(self, stmt: "Print") -> None:
+        self._emit(f"print({self._expr(stmt.expression)})")
+
+    def visit_var_stmt(self, stmt: "Var") -> None:
+        value = "None"
+        if stmt.initializer != None:
+            value = self._expr(stmt.initializer)
+        self._set_line(stmt.name)
+        self._define(stmt.name, value)
+
+    def visit_block_stmt(self, stmt: "Block") -> None:
+        self._emit_stmts(stmt.statements)
+
+    def visit_if_stmt(self, stmt: "If") -> None:
+        self._emit(f"if {self._expr(stmt.condition)}:")
+        self._emit_suite([stmt.then_branch])
+        if stmt.else_branch != None:
+            self._emit("else:")
+            self._emit_suite([stmt.else_branch])
+
+    def visit_while_stmt(self, stmt: "While") -> None:
+        self._emit(f"while {self._expr(stmt.condition)}:")
+        self._loop_increments.append(None)
+        self._emit_suite([stmt.body])
+        self._loop_increments.pop()
+
+    def visit_for_stmt(self, stmt: "For") -> None:
+        if stmt.initializer != None:
+            stmt.initializer.accept(self)
+        self._emit(f"while {self._expr(stmt.condition)}:")
+        body = [stmt.body]
+        if stmt.increment != None:
+            body.append(Expression(stmt.increment))
+        self._loop_increments.append(stmt.increment)
+        self._emit_suite(body)
+        self._loop_increments.pop()
+
+    def visit_break_stmt(self, stmt: "Break") -> None:
+        self._set_line(stmt.keyword)
+        self._emit("break")
+
+    def visit_continue_stmt(self, stmt: "Continue") -> None:
+        self._set_line(stmt.keyword)
+        increment = self._loop_increments[-1]
+        if increment != None:
+            self._emit(self._expr(increment))
+        self._emit("continue")
+
+    def visit_fun_stmt(self, stmt: "Fun") -> None:
+        self._set_line(stmt.name)
+        info = self._analysis.functions[id(stmt)]
+        decl = self._target(stmt.name)
+
+        if decl == None:
+            py_name = f"g_{stmt.name.value}"
+            if py_name not in self._globals:
+                self._globals.append(py_name)
+        elif decl.boxed:
+            # The box has to exist before the def so a recursive function can bind it
+            self._emit(f"{decl.py_name} = [None]")
+            py_name = self._temp()
+        else:
+            py_name = decl.py_name
+
+        self._def_header(py_name, self._params(stmt), info, [])
+        self._function_body(stmt, False)
+
+        if decl != None and decl.boxed:
+            self._emit(f"{decl.py_name}[0] = {py_name}")
+
+    def visit_return_stmt(self, stmt: "Return") -> None:
+        self._set_line(stmt.keyword)
+        if self._is_initializer:
+            self._emit("return this")
+        elif stmt.value == None:
+            self._emit("return None")
+        else:
+            self._emit(f"return {self._expr(stmt.value)}")
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> None:
+        superclass = "None"
+        super_decl = self._analysis.supers.get(id(stmt))
+        if super_decl != None:
+            value = self._expr(stmt.superclass)
+            self._set_line(stmt.name)
+            self._emit(f"{super_decl.py_name} = _lox_superclass({value}, {stmt.name.line})")
+            superclass = super_decl.py_name
+
+        self._set_line(stmt.name)
+        self._define(stmt.name, "None")
+
+        methods = []
+        for method in stmt.methods:
+            py_name = self._temp()
+            extra = []
+            if super_decl != None:
+                extra.append(f"{super_decl.py_name}={super_decl.py_name}")
+
+            self._set_line(method.name)
+            info = self._analysis.functions[id(method)]
+            self._def_header(py_name, ["this"] + self._params(method), info, extra)
+            self._function_body(method, method.name.value == "init")
+            methods.append(f"{method.name.value!r}: {py_name}")
+
+        self._set_line(stmt.name)
+        klass = f"_lox_class({stmt.name.value!r}, {superclass}, {{{', '.join(methods)}}})"
+        decl = self._target(stmt.name)
+        if decl == None:
+            self._emit(f"g_{stmt.name.value} = {klass}")
+        elif decl.boxed:
+            self._emit(f"{decl.py_name}[0] = {klass}")
+        else:
+            self._emit(f"{decl.py_name} = {klass}")
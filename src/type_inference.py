@@ -0,0 +1,305 @@
+from typing import Any
+from expr import (
+    ExprVisitor,
+    Expr,
+    Assign,
+    Binary,
+    Unary,
+    Call,
+    Get,
+    Grouping,
+    Invoke,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Variable,
+)
+from stmt import (
+    StmtVisitor,
+    Stmt,
+    Expression,
+    Print,
+    Var,
+    Block,
+    If,
+    While,
+    For,
+    Break,
+    Continue,
+    Fun,
+    Return,
+    LoxClass,
+)
+from lox_token import TokenType
+from optimizer import ClosureAssigned
+
+
+_NUMBER_OPERATORS = {
+    TokenType.MINUS,
+    TokenType.STAR,
+    TokenType.SLASH,
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+}
+_RESULT_TYPES = {
+    TokenType.MINUS: float,
+    TokenType.STAR: float,
+    TokenType.SLASH: float,
+}
+
+
+def _join(a: dict[int, type], b: dict[int, type]) -> dict[int, type]:
+    # The types two paths agree on, None is a path that never gets here
+    if a == None:
+        return b
+    if b == None:
+        return a
+    return {key: value for key, value in a.items() if b.get(key) is value}
+
+
+class TypeInference(ExprVisitor, StmtVisitor):
+    """
+    Works out which locals hold a number or a string at each point of a resolved
+    tree and sets operand_type on the Binary and Unary nodes whose operands are
+    proven to have the types the operator needs, the backends skip the runtime
+    check for those.
+
+    The analysis is flow sensitive. A local has the type of the last value
+    assigned to it, if and and/or join to the types both paths agree on, and a
+    while loop is analyzed until the types at its top stop changing. A local an
+    operator checked is known to have the checked type afterwards, the operator
+    would have raised otherwise. Parameters, globals and locals a closure assigns
+    are never known, and neither is anything read inside a function that was
+    declared outside it.
+    """
+
+    # Declaration to the type the local is known to have, None where no path
+    # reaches the code being analyzed
+    _env: dict[int, type]
+    _closure_assigned: set[int]
+    # The types where the innermost loop's break and continue statements leave it
+    _breaks: list[dict[int, type]]
+    _continues: list[dict[int, type]]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._env = dict()
+        self._closure_assigned = set()
+        self._breaks = []
+        self._continues = []
+
+    def infer(self, statements: list[Stmt]) -> None:
+        closure_assigned = ClosureAssigned()
+        closure_assigned.transform(statements)
+        self._closure_assigned = closure_assigned.assigned
+        self._stmts(statements)
+
+    def _expr(self, expr: Expr) -> type:
+        return expr.accept(self)
+
+    def _stmts(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            if self._env == None:
+                # Nothing after a return runs, its nodes keep their checks
+                return
+            statement.accept(self)
+
+    def _set_type(self, declaration: Any, value_type: type) -> None:
+        if declaration == None or id(declaration) in self._closure_assigned:
+            return
+        if value_type == None:
+            self._env.pop(id(declaration), None)
+        else:
+            self._env[id(declaration)] = value_type
+
+    def _refine(self, operand: Expr, operand_type: type) -> None:
+        if type(operand) == Variable:
+            self._set_type(operand.declaration, operand_type)
+
+    # Expr
+
+    def visit_assign_expr(self, expr: "Assign") -> type:
+        value_type = self._expr(expr.value)
+        self._set_type(expr.declaration, value_type)
+        return value_type
+
+    def visit_binary_expr(self, expr: "Binary") -> type:
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        op_type = expr.operator.token_type
+        expr.operand_type = None
+
+        if op_type == TokenType.PLUS:
+            if left is right and (left is float or left is str):
+                expr.operand_type = left
+                return left
+            # + raises unless both operands have the type of the one known
+            known = left if left != None else right
+            self._refine(expr.left, known)
+            self._refine(expr.right, known)
+            return known
+
+        if op_type in _NUMBER_OPERATORS:
+            if left is float and right is float:
+                expr.operand_type = float
+            self._refine(expr.left, float)
+            self._refine(expr.right, float)
+        return _RESULT_TYPES.get(op_type)
+
+    def visit_call_expr(self, expr: "Call") -> type:
+        self._expr(expr.callee)
+        for arg in expr.arguments:
+            self._expr(arg)
+        return None
+
+    def visit_get_expr(self, expr: "Get") -> type:
+        self._expr(expr.obj)
+        return None
+
+    def visit_grouping_expr(self, expr: "Grouping") -> type:
+        return self._expr(expr.expression)
+
+    def visit_invoke_expr(self, expr: "Invoke") -> type:
+        self._expr(expr.obj)
+        for arg in expr.arguments:
+            self._expr(arg)
+        return None
+
+    def visit_literal_expr(self, expr: "Literal") -> type:
+        if type(expr.value) is float or type(expr.value) is str:
+            return type(expr.value)
+        return None
+
+    def visit_logical_expr(self, expr: "Logical") -> type:
+        left = self._expr(expr.left)
+        after_left = self._env
+        self._env = dict(after_left)
+        right = self._expr(expr.right)
+        self._env = _join(after_left, self._env)
+        return left if left is right else None
+
+    def visit_set_expr(self, expr: "Set") -> type:
+        self._expr(expr.object)
+        return self._expr(expr.value)
+
+    def visit_super_expr(self, expr: "Super") -> type:
+        return None
+
+    def visit_this_expr(self, expr: "This") -> type:
+        return None
+
+    def visit_unary_expr(self, expr: "Unary") -> type:
+        right = self._expr(expr.right)
+        expr.operand_type = None
+        if expr.operator.token_type != TokenType.MINUS:
+            return None
+        if right is float:
+            expr.operand_type = float
+        self._refine(expr.right, float)
+        return float
+
+    def visit_variable_expr(self, expr: "Variable") -> type:
+        if expr.declaration == None:
+            return None
+        return self._env.get(id(expr.declaration))
+
+    # Stmt
+
+    def visit_expression_stmt(self, stmt: "Expression") -> None:
+        self._expr(stmt.expression)
+
+    def visit_print_stmt(self, stmt: "Print") -> None:
+        self._expr(stmt.expression)
+
+    def visit_var_stmt(self, stmt: "Var") -> None:
+        value_type = None
+        if stmt.initializer != None:
+            value_type = self._expr(stmt.initializer)
+        if stmt.slot != None:
+            self._set_type(stmt, value_type)
+
+    def visit_block_stmt(self, stmt: "Block") -> None:
+        self._stmts(stmt.statements)
+
+    def visit_if_stmt(self, stmt: "If") -> None:
+        self._expr(stmt.condition)
+        after_condition = self._env
+        self._env = dict(after_condition)
+        stmt.then_branch.accept(self)
+        after_then = self._env
+        self._env = dict(after_condition)
+        if stmt.else_branch != None:
+            stmt.else_branch.accept(self)
+        self._env = _join(after_then, self._env)
+
+    def visit_while_stmt(self, stmt: "While") -> None:
+        self._loop(stmt.condition, stmt.body, None)
+
+    def _loop(self, condition: Expr, body: Stmt, increment: Expr) -> None:
+        # Types only ever get dropped from the top of the loop, so this stops
+        enclosing_breaks = self._breaks
+        enclosing_continues = self._continues
+        before = self._env
+        top = before
+        while True:
+            self._breaks = []
+            self._continues = []
+            self._env = dict(top)
+            self._expr(condition)
+            after_condition = self._env
+            self._env = dict(after_condition)
+            body.accept(self)
+            for env in self._continues:
+                self._env = _join(self._env, env)
+            if self._env != None and increment != None:
+                self._expr(increment)
+            next_top = _join(before, self._env)
+            if next_top == top:
+                break
+            top = next_top
+
+        self._env = after_condition
+        for env in self._breaks:
+            self._env = _join(self._env, env)
+        self._breaks = enclosing_breaks
+        self._continues = enclosing_continues
+
+    def visit_break_stmt(self, stmt: "Break") -> None:
+        self._breaks.append(self._env)
+        self._env = None
+
+    def visit_continue_stmt(self, stmt: "Continue") -> None:
+        self._continues.append(self._env)
+        self._env = None
+
+    def visit_for_stmt(self, stmt: "For") -> None:
+        if stmt.initializer != None:
+            stmt.initializer.accept(self)
+
+        self._loop(stmt.condition, stmt.body, stmt.increment)
+
+    def visit_fun_stmt(self, stmt: "Fun") -> None:
+        self._set_type(stmt, None)
+        self._function(stmt)
+
+    def _function(self, stmt: Fun) -> None:
+        enclosing = self._env
+        self._env = dict()
+        self._stmts(stmt.body)
+        self._env = enclosing
+
+    def visit_return_stmt(self, stmt: "Return") -> None:
+        if stmt.value != None:
+            self._expr(stmt.value)
+        self._env = None
+
+    def visit_class_stmt(self, stmt: "LoxClass") -> None:
+        if stmt.superclass != None:
+            self._expr(stmt.superclass)
+        self._set_type(stmt, None)
+        for method in stmt.methods:
+            self._function(method)
@@ -0,0 +1,548 @@
+from typing import Any
+from bytecode import (
+    FunctionProto,
+    OP_CONSTANT,
+    OP_NIL,
+    OP_TRUE,
+    OP_FALSE,
+    OP_POP,
+    OP_GET_LOCAL,
+    OP_SET_LOCAL,
+    OP_GET_GLOBAL,
+    OP_DEFINE_GLOBAL,
+    OP_SET_GLOBAL,
+    OP_GET_UPVALUE,
+    OP_SET_UPVALUE,
+    OP_GET_PROPERTY,
+    OP_SET_PROPERTY,
+    OP_GET_SUPER,
+    OP_EQUAL,
+    OP_NOT_EQUAL,
+    OP_GREATER,
+    OP_GREATER_EQUAL,
+    OP_LESS,
+    OP_LESS_EQUAL,
+    OP_ADD,
+    OP_SUBTRACT,
+    OP_MULTIPLY,
+    OP_DIVIDE,
+    OP_NOT,
+    OP_NEGATE,
+    OP_PRINT,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_JUMP_IF_TRUE,
+    OP_POP_JUMP_IF_FALSE,
+    OP_LOOP,
+    OP_CALL,
+    OP_INVOKE,
+    OP_SUPER_INVOKE,
+    OP_TAIL_CALL,
+    OP_TAIL_INVOKE,
+    OP_CLOSURE,
+    OP_CLOSE_UPVALUE,
+    OP_RETURN,
+    OP_CLASS,
+    OP_INHERIT,
+    OP_METHOD,
+)
+from interpreter import (
+    LoxCallable,
+    LoxAssertFailedError,
+    ClockFn,
+    AssertFn,
+    AssertFalseFn,
+)
+from lox_token import Token, TokenType
+from runtime_errors import LoxRuntimeError, InvalidOperatorError
+
+
+_DEFAULT_MAX_FRAMES = 100000
+_CALL_OPS = frozenset(
+    {OP_CALL, OP_INVOKE, OP_SUPER_INVOKE, OP_TAIL_CALL, OP_TAIL_INVOKE}
+)
+
+_OPERATOR_TOKENS = {
+    OP_ADD: TokenType.PLUS,
+    OP_SUBTRACT: TokenType.MINUS,
+    OP_MULTIPLY: TokenType.STAR,
+    OP_DIVIDE: TokenType.SLASH,
+    OP_GREATER: TokenType.GREATER,
+    OP_GREATER_EQUAL: TokenType.GREATER_EQUAL,
+    OP_LESS: TokenType.LESS,
+    OP_LESS_EQUAL: TokenType.LESS_EQUAL,
+    OP_NEGATE: TokenType.MINUS,
+}
+
+_MISSING = object()
+
+
+class VMClosure:
+    __slots__ = ("function", "upvalues")
+
+    def __init__(self, function: FunctionProto, upvalues: list["VMUpvalue"]) -> None:
+        self.function = function
+        self.upvalues = upvalues
+
+    def __repr__(self) -> str:
+        return repr(self.function)
+
+
+class VMUpvalue:
+    # While the variable is still on the stack cells is the VM stack itself,
+    # closing it moves the value into a list of its own so reads are always cells[index]
+    __slots__ = ("cells", "index")
+
+    def __init__(self, cells: list, index: int) -> None:
+        self.cells = cells
+        self.index = index
+
+
+class VMClass:
+    __slots__ = ("name", "methods")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.methods = dict()
+
+
+class VMInstance:
+    __slots__ = ("klass", "fields")
+
+    def __init__(self, klass: VMClass) -> None:
+        self.klass = klass
+        self.fields = dict()
+
+    def __str__(self) -> str:
+        return self.klass.name
+
+
+class VMBoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver: Any, method: VMClosure) -> None:
+        self.receiver = receiver
+        self.method = method
+
+
+class VM:
+    """
+    Runs the bytecode produced by compiler.Compiler.
+    Everything happens in a single dispatch loop, Lox calls push a frame onto a list
+    instead of recursing in python.
+    """
+
+    _globals: dict[str, Any]
+    _stack: list[Any]
+    _open_upvalues: dict[int, VMUpvalue]
+    _max_frames: int
+
+    def __init__(self, max_frames: int = _DEFAULT_MAX_FRAMES) -> None:
+        self._globals = {
+            "clock": ClockFn(),
+            "assert": AssertFn(),
+            "assertFalse": AssertFalseFn(),
+        }
+        self._stack = []
+        self._open_upvalues = dict()
+        self._max_frames = max_frames
+
+    def interpret(self, script: FunctionProto) -> None:
+        self._stack = []
+        self._open_upvalues = dict()
+        self._run(VMClosure(script, []))
+
+    def _capture_upvalue(self, slot: int) -> VMUpvalue:
+        upvalue = self._open_upvalues.get(slot)
+        if upvalue == None:
+            upvalue = VMUpvalue(self._stack, slot)
+            self._open_upvalues[slot] = upvalue
+        return upvalue
+
+    def _close_upvalues(self, last: int) -> None:
+        stack = self._stack
+        for slot in [slot for slot in self._open_upvalues if slot >= last]:
+            upvalue = self._open_upvalues.pop(slot)
+            upvalue.cells = [stack[slot]]
+            upvalue.index = 0
+
+    def _error(self, closure: VMClosure, ip: int, message: str) -> LoxRuntimeError:
+        line = closure.function.chunk.lines[ip - 1]
+        return LoxRuntimeError(message, Token(TokenType.EOF, None, line))
+
+    def _operator_error(
+        self, closure: VMClosure, ip: int, op: int, *values: Any
+    ) -> InvalidOperatorError:
+        line = closure.function.chunk.lines[ip - 1]
+        return InvalidOperatorError(Token(_OPERATOR_TOKENS[op], None, line), *values)
+
+    def _run(self, closure: VMClosure) -> None:
+        stack = self._stack
+        push = stack.append
+        pop = stack.pop
+        globals_ = self._globals
+        frames = []
+        max_frames = self._max_frames
+
+        stack.append(closure)
+        code = closure.function.chunk.code
+        consts = closure.function.chunk.constants
+        upvalues = closure.upvalues
+        ip = 0
+        base = 0
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            # Roughly ordered by how often they show up in hot loops
+            if op == OP_GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+
+            elif op == OP_CONSTANT:
+                push(consts[(code[ip] << 8) | code[ip + 1]])
+                ip += 2
+
+            elif op == OP_POP_JUMP_IF_FALSE:
+                if pop():
+                    ip += 2
+                else:
+                    ip += 2 + ((code[ip] << 8) | code[ip + 1])
+
+            elif op == OP_GET_GLOBAL:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                try:
+                    push(globals_[name])
+                except KeyError:
+                    raise self._error(closure, ip, f"Variable {name} not found")
+
+            elif op == OP_ADD:
+                right = pop()
+                left = stack[-1]
+                left_type = type(left)
+                if left_type is type(right) and (
+                    left_type is float or left_type is str
+                ):
+                    stack[-1] = left + right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left - right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_LESS:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left < right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+
+            elif op == OP_POP:
+                pop()
+
+            elif op == OP_LOOP:
+                ip = ip + 2 - ((code[ip] << 8) | code[ip + 1])
+
+            elif op == OP_GET_UPVALUE:
+                upvalue = upvalues[code[ip]]
+                push(upvalue.cells[upvalue.index])
+                ip += 1
+
+            elif op in _CALL_OPS:
+                if op == OP_CALL or op == OP_TAIL_CALL:
+                    arg_count = code[ip]
+                    ip += 1
+                    callee = stack[-1 - arg_count]
+                else:
+                    name = consts[(code[ip] << 8) | code[ip + 1]]
+                    arg_count = code[ip + 2]
+                    ip += 3
+
+                    if op == OP_INVOKE or op == OP_TAIL_INVOKE:
+                        receiver = stack[-1 - arg_count]
+                        if type(receiver) is not VMInstance:
+                            raise self._error(
+                                closure, ip, "Can only call propertes on objects"
+                            )
+
+                        callee = receiver.fields.get(name, _MISSING)
+                        if callee is _MISSING:
+                            callee = receiver.klass.methods.get(name)
+                            if callee == None:
+                                raise self._error(
+                                    closure, ip, f"Undefined property: {name}."
+                                )
+                        else:
+                            # A field holding a callable shadows the method, call it plainly
+                            stack[-1 - arg_count] = callee
+                    else:
+                        superclass = pop()
+                        callee = superclass.methods.get(name)
+                        if callee == None:
+                            raise self._error(
+                                closure, ip, f"Undefined property {name}"
+                            )
+
+                callee_type = type(callee)
+                if callee_type is VMBoundMethod:
+                    stack[-1 - arg_count] = callee.receiver
+                    callee = callee.method
+                    callee_type = VMClosure
+                elif callee_type is VMClass:
+                    stack[-1 - arg_count] = VMInstance(callee)
+                    callee = callee.methods.get("init")
+                    if callee == None:
+                        if arg_count != 0:
+                            raise self._error(
+                                closure,
+                                ip,
+                                f"Wrong number of args, expected 0 but recieved {arg_count}",
+                            )
+                        continue
+                    callee_type = VMClosure
+
+                if callee_type is VMClosure:
+                    function = callee.function
+                    if function.arity != arg_count:
+                        raise self._error(
+                            closure,
+                            ip,
+                            f"Wrong number of args, expected {function.arity} but recieved {arg_count}",
+                        )
+                    if op == OP_TAIL_CALL or op == OP_TAIL_INVOKE:
+                        # The caller is finished with its frame, slide the callee
+                        # and its args down over it and reuse it
+                        if self._open_upvalues:
+                            self._close_upvalues(base)
+                        del stack[base : len(stack) - arg_count - 1]
+                    else:
+                        if len(frames) >= max_frames:
+                            raise self._error(closure, ip, "Stack overflow.")
+                        frames.append((closure, code, consts, upvalues, ip, base))
+
+                    closure = callee
+                    code = function.chunk.code
+                    consts = function.chunk.constants
+                    upvalues = callee.upvalues
+                    ip = 0
+                    base = len(stack) - arg_count - 1
+
+                elif isinstance(callee, LoxCallable):
+                    if callee.arity() != arg_count:
+                        raise self._error(
+                            closure,
+                            ip,
+                            f"Wrong number of args, expected {callee.arity()} but recieved {arg_count}",
+                        )
+                    arguments = stack[len(stack) - arg_count :]
+                    del stack[len(stack) - arg_count - 1 :]
+                    try:
+                        push(callee.call(self, arguments))
+                    except LoxAssertFailedError as err:
+                        err.line = closure.function.chunk.lines[ip - 1]
+                        raise err
+
+                else:
+                    raise self._error(
+                        closure, ip, "Can only call functions and classes"
+                    )
+
+            elif op == OP_RETURN:
+                result = pop()
+                if self._open_upvalues:
+                    self._close_upvalues(base)
+
+                if len(frames) == 0:
+                    del stack[:]
+                    return
+
+                del stack[base:]
+                push(result)
+                closure, code, consts, upvalues, ip, base = frames.pop()
+
+            elif op == OP_MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left * right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left / right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left <= right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_GREATER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left > right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left >= right
+                else:
+                    raise self._operator_error(closure, ip, op, left, right)
+
+            elif op == OP_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+
+            elif op == OP_NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+
+            elif op == OP_GET_PROPERTY:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise self._error(closure, ip, "Can only call propertes on objects")
+
+                value = instance.fields.get(name, _MISSING)
+                if value is _MISSING:
+                    method = instance.klass.methods.get(name)
+                    if method == None:
+                        raise self._error(closure, ip, f"Undefined property: {name}.")
+                    value = VMBoundMethod(instance, method)
+                stack[-1] = value
+
+            elif op == OP_SET_PROPERTY:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                value = pop()
+                instance = stack[-1]
+                if type(instance) is not VMInstance:
+                    raise self._error(closure, ip, "Only instances have fields")
+                instance.fields[name] = value
+                stack[-1] = value
+
+            elif op == OP_SET_UPVALUE:
+                upvalue = upvalues[code[ip]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 1
+
+            elif op == OP_SET_GLOBAL:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                if name not in globals_:
+                    raise self._error(
+                        closure,
+                        ip,
+                        f"Variable {name} not initialized before assignment",
+                    )
+                globals_[name] = stack[-1]
+
+            elif op == OP_JUMP_IF_FALSE:
+                if stack[-1]:
+                    ip += 2
+                else:
+                    ip += 2 + ((code[ip] << 8) | code[ip + 1])
+
+            elif op == OP_JUMP_IF_TRUE:
+                if stack[-1]:
+                    ip += 2 + ((code[ip] << 8) | code[ip + 1])
+                else:
+                    ip += 2
+
+            elif op == OP_JUMP:
+                ip += 2 + ((code[ip] << 8) | code[ip + 1])
+
+            elif op == OP_NOT:
+                stack[-1] = not stack[-1]
+
+            elif op == OP_NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise self._operator_error(closure, ip, op, value)
+                stack[-1] = -value
+
+            elif op == OP_NIL:
+                push(None)
+
+            elif op == OP_TRUE:
+                push(True)
+
+            elif op == OP_FALSE:
+                push(False)
+
+            elif op == OP_PRINT:
+                print(pop())
+
+            elif op == OP_DEFINE_GLOBAL:
+                globals_[consts[(code[ip] << 8) | code[ip + 1]]] = pop()
+                ip += 2
+
+            elif op == OP_CLOSURE:
+                function = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                captured = []
+                for _ in range(function.upvalue_count):
+                    if code[ip]:
+                        captured.append(self._capture_upvalue(base + code[ip + 1]))
+                    else:
+                        captured.append(upvalues[code[ip + 1]])
+                    ip += 2
+                push(VMClosure(function, captured))
+
+            elif op == OP_CLOSE_UPVALUE:
+                self._close_upvalues(len(stack) - 1)
+                pop()
+
+            elif op == OP_GET_SUPER:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                superclass = pop()
+                method = superclass.methods.get(name)
+                if method == None:
+                    raise self._error(closure, ip, f"Undefined property {name}")
+                stack[-1] = VMBoundMethod(stack[-1], method)
+
+            elif op == OP_CLASS:
+                push(VMClass(consts[(code[ip] << 8) | code[ip + 1]]))
+                ip += 2
+
+            elif op == OP_INHERIT:
+                klass = pop()
+                superclass = stack[-1]
+                if type(superclass) is not VMClass:
+                    raise self._error(closure, ip, "Superclass must be a class.")
+                # Copy down so method lookups never have to walk the superclass chain
+                klass.methods.update(superclass.methods)
+
+            elif op == OP_METHOD:
+                name = consts[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                method = pop()
+                stack[-1].methods[name] = method
+
+            else:
+                raise self._error(closure, ip, f"Unknown opcode {op}")